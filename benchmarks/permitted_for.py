@@ -0,0 +1,142 @@
+"""
+Benchmark the resolver overhead of the @permittedFor directive.
+
+The benchmark builds schemas with an increasing number of fields, all protected by
+the directive, and reports the time per field for a query requesting all fields.
+For comparison, the time is also reported for the same schema without the
+directive and for a directive converting its arguments on every resolution, as
+the directive did before its arguments were precomputed.
+
+Run the benchmark from the root folder:
+
+    python -m benchmarks.permitted_for [number of queries]
+"""
+import asyncio
+import itertools
+import sys
+import time
+from typing import Any, Dict, Optional, Type
+
+from ariadne import QueryType, SchemaDirectiveVisitor, make_executable_schema
+from graphql import GraphQLSchema, default_field_resolver, execute, parse
+from starlette.authentication import AuthCredentials
+from starlette.requests import Request
+
+from saltapi.auth import authorization
+from saltapi.auth.authorization import (
+    AuthenticatedUser,
+    AuthorizationIndex,
+    Permission,
+    Role,
+)
+from saltapi.graphql.directives import PermittedForDirective
+from saltapi.repository.user_repository import User
+
+USER = User(
+    id=42,
+    username="jane",
+    first_name="Jane",
+    last_name="Doe",
+    email="jane@example.com",
+    roles=[],
+    permissions=[],
+)
+
+FIELD_COUNTS = (10, 100, 1000)
+
+
+class PerCallPermittedForDirective(SchemaDirectiveVisitor):
+    """The directive converting its arguments on every field resolution."""
+
+    def visit_field_definition(self, field: Any, object_type: Any) -> Any:
+        """Check authorization and execute query."""
+        original_resolver = field.resolve or default_field_resolver
+
+        async def new_resolver(*args: Any, **kwargs: Any) -> Any:
+            roles = [Role.from_name(r) for r in self.args.get("roles")]
+            permissions = [
+                Permission.from_name(p) for p in self.args.get("permissions")
+            ]
+            user = args[1].context["request"].user
+            mask = authorization.grant_mask(itertools.chain(roles, permissions))
+            if not authorization.authorization_index.has_any(user.id, mask):
+                raise Exception("Not authorized.")
+            return await original_resolver(*args, **kwargs)
+
+        field.resolve = new_resolver
+        return field
+
+
+def build_schema(
+    fields: int, directive: Optional[Type[SchemaDirectiveVisitor]]
+) -> GraphQLSchema:
+    """Return a schema with the given number of protected fields."""
+    annotation = (
+        " @permittedFor(roles: [ADMINISTRATOR], permissions: [SUBMIT_PROPOSAL])"
+        if directive
+        else ""
+    )
+    type_defs = f"""
+    enum Permission {{ SUBMIT_PROPOSAL VIEW_PROPOSAL }}
+    enum Role {{ ADMINISTRATOR }}
+    directive @permittedFor(roles: [Role!], permissions: [Permission!])
+        on FIELD_DEFINITION
+    type Query {{
+        {" ".join(f"field{i}: Int{annotation}" for i in range(fields))}
+    }}
+    """
+    query = QueryType()
+
+    async def resolve(*_: Any) -> int:
+        return 1
+
+    for i in range(fields):
+        query.set_field(f"field{i}", resolve)
+    directives: Dict[str, Type[SchemaDirectiveVisitor]] = (
+        {"permittedFor": directive} if directive else {}
+    )
+    return make_executable_schema(type_defs, query, directives=directives)
+
+
+async def seconds_per_field(schema: GraphQLSchema, fields: int, queries: int) -> float:
+    """Return the mean time for resolving a field, excluding query parsing."""
+    document = parse("{ " + " ".join(f"field{i}" for i in range(fields)) + " }")
+    user = AuthenticatedUser(USER)
+    start = time.perf_counter()
+    for _ in range(queries):
+        request = Request(
+            {"type": "http", "user": user, "auth": AuthCredentials(["authenticated"])}
+        )
+        result = await execute(schema, document, context_value={"request": request})
+        assert not result.errors, result.errors
+    return (time.perf_counter() - start) / (queries * fields)
+
+
+async def run(queries: int) -> None:
+    """Run the benchmark."""
+    index = AuthorizationIndex(refresh_interval=0)
+    index.update([(USER.id, "RightAdmin")])
+    authorization.authorization_index = index
+
+    directives = (
+        ("no directive", None),
+        ("per-call arguments", PerCallPermittedForDirective),
+        ("precomputed arguments", PermittedForDirective),
+    )
+    for fields in FIELD_COUNTS:
+        for label, directive in directives:
+            schema = build_schema(fields, directive)
+            n = max(1, queries * FIELD_COUNTS[0] // fields)
+            seconds = await seconds_per_field(schema, fields, n)
+            print(  # noqa: T001
+                f"{fields} fields, {label}: {1e6 * seconds:.1f} µs per field"
+            )
+
+
+def main(queries: int) -> None:
+    """Run the benchmark."""
+    asyncio.get_event_loop().run_until_complete(run(queries))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
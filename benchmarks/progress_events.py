@@ -0,0 +1,142 @@
+"""
+Benchmark the cost of sending submission progress updates to a client.
+
+The benchmark sends the same progress updates through the GraphQL subscription
+(executing the subscription document for every update and encoding the result as
+JSON, as the websocket transport does) and as server-sent events. It reports the
+time per update and the size of the message sent for it.
+
+Run the benchmark from the root folder:
+
+    python -m benchmarks.progress_events [number of updates]
+"""
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, List, Tuple
+
+from graphql import parse, subscribe
+
+from saltapi.app import schema
+from saltapi.graphql import resolvers
+from saltapi.repository.submission_repository import (
+    LogMessageType,
+    SubmissionLog,
+    SubmissionProgress,
+    SubmissionStatus,
+)
+from saltapi.submission.events import progress_event
+
+SUBMISSION_ID = "a1b2c3"
+
+LOG_ENTRIES_PER_UPDATE = (1, 10)
+
+SUBSCRIPTION = parse(
+    """
+    subscription Progress($submissionId: ID!) {
+        submissionProgress(submissionId: $submissionId) {
+            submissionId
+            status
+            latestEntry
+            logEntries { messageType message timestamp }
+        }
+    }
+    """
+)
+
+
+def progress_updates(updates: int, log_entries: int) -> List[SubmissionProgress]:
+    """Return progress updates with the given number of log entries each."""
+    result = []
+    for i in range(updates):
+        log = SubmissionLog(SUBMISSION_ID)
+        for j in range(log_entries):
+            log.append(
+                entry_number=i * log_entries + j + 1,
+                message_type=LogMessageType.INFO,
+                message=f"Log entry {j + 1} of update {i + 1}",
+                logged_at=datetime(2021, 1, 1),
+            )
+        result.append(
+            SubmissionProgress(
+                submission_identifier=SUBMISSION_ID,
+                status=SubmissionStatus.IN_PROGRESS,
+                log_entries=log,
+            )
+        )
+    return result
+
+
+class FakeHub:
+    """A progress hub generating prepared updates."""
+
+    def __init__(self, updates: List[SubmissionProgress]):
+        self.updates = updates
+
+    async def subscribe(
+        self, submission_identifier: str, after_entry: int = 0
+    ) -> AsyncIterator[SubmissionProgress]:
+        """Generate the prepared updates."""
+        for update in self.updates:
+            yield update
+
+
+async def graphql_messages(updates: List[SubmissionProgress]) -> int:
+    """Send the updates through the GraphQL subscription."""
+    resolvers.progress_hub = FakeHub(updates)  # type: ignore
+    results = await subscribe(
+        schema,
+        SUBSCRIPTION,
+        context_value={},
+        variable_values={"submissionId": SUBMISSION_ID},
+    )
+    size = 0
+    async for result in results:  # type: ignore
+        assert not result.errors, result.errors
+        size += len(json.dumps({"data": result.data}).encode("utf-8"))
+    return size
+
+
+async def event_messages(updates: List[SubmissionProgress]) -> int:
+    """Send the updates as server-sent events."""
+    size = 0
+    latest_entry = 0
+    for progress in updates:
+        latest_entry = progress.log_entries.entry_numbers[-1]
+        size += len(progress_event(progress, latest_entry))
+    return size
+
+
+async def measure(
+    send: Callable[[List[SubmissionProgress]], Awaitable[int]],
+    updates: List[SubmissionProgress],
+) -> Tuple[float, float]:
+    """Return the time (in seconds) and the message size (in bytes) per update."""
+    start = time.perf_counter()
+    size = await send(updates)
+    seconds = time.perf_counter() - start
+    return seconds / len(updates), size / len(updates)
+
+
+async def run(updates: int) -> None:
+    """Run the benchmark."""
+    transports = (("GraphQL", graphql_messages), ("server-sent events", event_messages))
+    for log_entries in LOG_ENTRIES_PER_UPDATE:
+        prepared = progress_updates(updates, log_entries)
+        for label, send in transports:
+            seconds, size = await measure(send, prepared)
+            print(  # noqa: T001
+                f"{log_entries} log entries per update, {label}: "
+                f"{1e6 * seconds:.1f} µs, {size:.0f} bytes per update"
+            )
+
+
+def main(updates: int) -> None:
+    """Run the benchmark."""
+    asyncio.get_event_loop().run_until_complete(run(updates))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,87 @@
+"""
+Benchmark extracting the proposal code from proposal files of different sizes.
+
+The benchmark creates synthetic proposal files with an increasing number of blocks
+and reports the time and the peak memory allocation for extracting the proposal
+code, both for the proposal repository and for parsing the whole Proposal.xml file.
+
+Run the benchmark from the root folder:
+
+    python -m benchmarks.proposal_code
+"""
+import time
+import tracemalloc
+from io import BytesIO
+from typing import Callable, Optional, Tuple
+from zipfile import ZIP_DEFLATED, ZipFile
+
+from defusedxml.ElementTree import parse
+
+from saltapi.repository.proposal_repository import get_proposal_code
+
+BLOCK = b"""
+    <Block>
+        <Name>Block</Name>
+        <ObservingTime>1200</ObservingTime>
+        <Priority>2</Priority>
+        <Pointing>
+            <Target><Name>Target</Name><RA>12:00:00</RA><Dec>-60:00:00</Dec></Target>
+            <Instrument><Rss><Mode>Spectroscopy</Mode></Rss></Instrument>
+        </Pointing>
+    </Block>"""
+
+
+def create_proposal(blocks: int) -> bytes:
+    """Create a proposal zip file with a given number of blocks."""
+    xml = b'<?xml version="1.0" encoding="UTF-8" standalone="yes" ?>\n'
+    xml += b'<ns2:Proposal xmlns:ns2="http://www.salt.ac.za/PIPT/Proposal/Shared/2.7"'
+    xml += b' code="2021-1-SCI-001">'
+    xml += BLOCK * blocks
+    xml += b"</ns2:Proposal>"
+    archive = BytesIO()
+    with ZipFile(archive, "w", compression=ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("Proposal.xml", xml)
+    return archive.getvalue()
+
+
+def get_proposal_code_from_tree(proposal_zip: BytesIO) -> Optional[str]:
+    """Extract the proposal code by parsing the whole Proposal.xml file."""
+    with ZipFile(proposal_zip, "r") as archive:
+        with archive.open("Proposal.xml") as file:
+            return str(parse(file).getroot().attrib["code"])
+
+
+def measure(
+    extract: Callable[[BytesIO], Optional[str]], proposal: bytes
+) -> Tuple[float, int]:
+    """Return the time (in seconds) and the peak memory (in bytes) for extracting."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    extract(BytesIO(proposal))
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duration, peak
+
+
+def main() -> None:
+    """Run the benchmark."""
+    print(  # noqa: T001
+        f"{'blocks':>8} {'xml (kB)':>10} {'stream (ms)':>12} {'stream (kB)':>12} "
+        f"{'tree (ms)':>10} {'tree (kB)':>10}"
+    )
+    for blocks in (10, 100, 1000, 10000):
+        proposal = create_proposal(blocks)
+        with ZipFile(BytesIO(proposal)) as archive:
+            xml_size = archive.getinfo("Proposal.xml").file_size
+        stream_time, stream_memory = measure(get_proposal_code, proposal)
+        tree_time, tree_memory = measure(get_proposal_code_from_tree, proposal)
+        print(  # noqa: T001
+            f"{blocks:>8} {xml_size / 1000:>10.0f} {1000 * stream_time:>12.2f} "
+            f"{stream_memory / 1000:>12.0f} {1000 * tree_time:>10.2f} "
+            f"{tree_memory / 1000:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Benchmark decoding a submission log.
+
+The benchmark decodes a submission log with 10,000 entries, reading the rows from
+memory rather than the database. It reports
+
+* the time taken by find_submission_log_entries, both with the reverse lookup maps
+  for the log message types and with a loop over the enum members for every row,
+  and
+* the time and peak memory allocation for decoding the rows and converting them to
+  the dictionaries returned by the GraphQL resolver, both for the columnar
+  submission log and for a frozen dataclass instance per entry, with every
+  datetime localized with pytz.
+
+Run the benchmark from the root folder:
+
+    python -m benchmarks.submission_log [number of rows]
+"""
+import asyncio
+import dataclasses
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+from pytz import timezone
+
+from saltapi.graphql.resolvers import log_entry_dicts
+from saltapi.repository import submission_repository
+from saltapi.repository.database import database
+from saltapi.repository.submission_repository import (
+    LogMessageType,
+    find_submission_log_entries,
+)
+
+MESSAGE_TYPES = ("Info", "Info", "Info", "Warning", "Error")
+
+Row = Tuple[int, str, str, datetime]
+
+
+@dataclasses.dataclass(frozen=True)
+class DataclassLogEntry:
+    """A log entry as it was represented before the columnar log."""
+
+    submission_identifier: str
+    entry_number: int
+    message_type: LogMessageType
+    message: str
+    logged_at: datetime
+
+
+def log_rows(count: int) -> List[Row]:
+    """Return synthetic rows of a submission log."""
+    start = datetime(2021, 3, 4, 5, 6, 7)
+    return [
+        (
+            i + 1,
+            MESSAGE_TYPES[i % len(MESSAGE_TYPES)],
+            f"Processed block {i + 1}.",
+            start + timedelta(seconds=i),
+        )
+        for i in range(count)
+    ]
+
+
+class LoopLookup:
+    """A lookup of log message types looping over the enum members."""
+
+    def by_value(self, value: Any) -> LogMessageType:
+        """Return the log message type with a value."""
+        for lmt in LogMessageType:
+            if lmt.value == value:
+                return lmt
+        raise ValueError(f"Unknown log message type value: {value}")
+
+
+def use_rows(rows: List[Row]) -> None:
+    """Serve the rows instead of the database."""
+
+    async def fetch_all(query: Any) -> List[Any]:
+        return rows
+
+    database.fetch_all = fetch_all  # type: ignore
+
+
+async def columnar_dicts(rows: List[Row]) -> List[Dict[str, Any]]:
+    """Decode the rows into a columnar log and convert it to dictionaries."""
+    return log_entry_dicts(await find_submission_log_entries("benchmark", 0))
+
+
+async def dataclass_dicts(rows: List[Row]) -> List[Dict[str, Any]]:
+    """Decode the rows into dataclass instances and convert them to dictionaries."""
+    database_timezone = timezone(os.environ["DATABASE_TIMEZONE"])
+    entries = [
+        DataclassLogEntry(
+            submission_identifier="benchmark",
+            entry_number=row[0],
+            message_type=LogMessageType.from_value(row[1]),
+            message=row[2],
+            logged_at=database_timezone.localize(row[3]),
+        )
+        for row in rows
+    ]
+    return [
+        {
+            "messageType": le.message_type.name,
+            "message": le.message,
+            "timestamp": le.logged_at,
+        }
+        for le in entries
+    ]
+
+
+async def seconds_for_lookups(rows: List[Row], repeats: int) -> float:
+    """Return the mean time for find_submission_log_entries."""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        entries = await find_submission_log_entries("benchmark", 0)
+        assert len(entries) == len(rows)
+    return (time.perf_counter() - start) / repeats
+
+
+async def measure(
+    convert: Callable[[List[Row]], Any], rows: List[Row], repeats: int
+) -> Tuple[float, int]:
+    """Return the mean time and the peak memory allocation for a conversion."""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        await convert(rows)
+    seconds = (time.perf_counter() - start) / repeats
+
+    tracemalloc.start()
+    dicts = await convert(rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(dicts) == len(rows)
+    return seconds, peak
+
+
+async def run(count: int) -> None:
+    """Run the benchmark."""
+    rows = log_rows(count)
+    use_rows(rows)
+
+    lookup = submission_repository._log_message_types
+    for label, message_types in (("lookup map", lookup), ("member loop", LoopLookup())):
+        submission_repository._log_message_types = message_types  # type: ignore
+        seconds = await seconds_for_lookups(rows, 20)
+        print(f"{label}: {1000 * seconds:.2f} ms for {count} rows")  # noqa: T001
+    submission_repository._log_message_types = lookup
+
+    for label, convert in (
+        ("columnar log", columnar_dicts),
+        ("dataclass entries", dataclass_dicts),
+    ):
+        seconds, peak = await measure(convert, rows, 10)
+        print(  # noqa: T001
+            f"{label}: {1000 * seconds:.2f} ms and {peak / 1024 ** 2:.1f} MiB peak "
+            f"allocation for {count} rows"
+        )
+
+
+def main(count: int) -> None:
+    """Run the benchmark."""
+    asyncio.get_event_loop().run_until_complete(run(count))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,79 @@
+"""
+Benchmark authenticated requests with and without the token cache.
+
+The benchmark sends authenticated requests to the GraphQL endpoint and reports the
+number of requests per second, once with the token cache enabled and once with it
+disabled. For comparison, the number of parse_token calls per second is reported as
+well. Users are not looked up in the database.
+
+Run the benchmark from the root folder:
+
+    python -m benchmarks.token_cache [number of requests]
+"""
+import sys
+import time
+from typing import Optional
+
+from starlette.testclient import TestClient
+
+from saltapi.app import app
+from saltapi.auth.token import create_token, parse_token, token_cache
+from saltapi.repository import user_repository
+from saltapi.repository.user_repository import User
+
+USER = User(
+    id=42,
+    username="jane",
+    first_name="Jane",
+    last_name="Doe",
+    email="jane@example.com",
+    roles=[],
+    permissions=[],
+)
+
+
+async def find_user_by_id(user_id: int) -> Optional[User]:
+    """Return the benchmark user."""
+    return USER if user_id == USER.id else None
+
+
+def requests_per_second(client: TestClient, token: str, requests: int) -> float:
+    """Return the number of authenticated requests per second."""
+    headers = {"Authorization": f"Bearer {token}"}
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get("/graphql", headers=headers)
+        assert response.status_code == 200
+    return requests / (time.perf_counter() - start)
+
+
+def parses_per_second(token: str, parses: int) -> float:
+    """Return the number of parse_token calls per second."""
+    start = time.perf_counter()
+    for _ in range(parses):
+        parse_token(token)
+    return parses / (time.perf_counter() - start)
+
+
+def main(requests: int) -> None:
+    """Run the benchmark."""
+    user_repository.find_user_by_id = find_user_by_id  # type: ignore
+    client = TestClient(app)
+    token = create_token(USER)
+    max_size = token_cache.max_size
+
+    for label, enabled in (("cache on", True), ("cache off", False)):
+        token_cache.clear()
+        token_cache.max_size = max_size if enabled else 0
+        rate = requests_per_second(client, token, requests)
+        parse_rate = parses_per_second(token, 10 * requests)
+        print(  # noqa: T001
+            f"{label}: {rate:.0f} requests per second, "
+            f"{parse_rate:.0f} token parses per second"
+        )
+
+    token_cache.max_size = max_size
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
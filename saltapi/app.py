@@ -5,12 +5,12 @@ from typing import Any, Dict
 import dotenv
 from ariadne import (
     MutationType,
+    QueryType,
     ScalarType,
     SubscriptionType,
     load_schema_from_path,
     make_executable_schema,
 )
-from ariadne.asgi import GraphQL
 from pydantic import ValidationError
 from starlette.applications import Starlette
 from starlette.exceptions import HTTPException
@@ -21,11 +21,21 @@ from starlette.responses import JSONResponse, Response
 from starlette.routing import Route
 
 from saltapi import routes
-from saltapi.auth.authorization import TokenAuthenticationBackend
+from saltapi.auth.authorization import TokenAuthenticationBackend, authorization_index
+from saltapi.auth.keys import install_reload_signal_handler
 from saltapi.graphql import resolvers, scalars
 from saltapi.graphql.directives import PermittedForDirective
-from saltapi.repository.database import database
+from saltapi.graphql.loaders import graphql_context
+from saltapi.graphql.server import GRAPHQL_DEBUG, CachingGraphQL
+from saltapi.repository.database import DatabaseTimeoutError, database
+from saltapi.repository.query_registry import query_registry
+from saltapi.repository.user_repository import user_cache
+from saltapi.submission.inspection import proposal_inspector
+from saltapi.submission.progress import progress_hub
+from saltapi.submission.queue import submission_queue
+from saltapi.submission.storage import storage_service
 from saltapi.util.error import UsageError
+from saltapi.util.stats import stats_registry
 import logging
 dotenv.load_dotenv()
 
@@ -50,6 +60,11 @@ async def usage_error(request: Request, e: UsageError) -> Response:
     return error_response(str(e), e.status_code)
 
 
+async def database_timeout_error(request: Request, e: DatabaseTimeoutError) -> Response:
+    """Handle a database timeout."""
+    return error_response(str(e), 503)
+
+
 async def validation_error(request: Request, e: ValidationError) -> Response:
     """Handle a validation error raised by pydantic."""
     return error_response(str(e), 400)
@@ -58,6 +73,7 @@ async def validation_error(request: Request, e: ValidationError) -> Response:
 exception_handlers: Dict[Any, Any] = {
     HTTPException: http_exception,
     UsageError: usage_error,
+    DatabaseTimeoutError: database_timeout_error,
     ValidationError: validation_error,
 }
 
@@ -84,6 +100,9 @@ proposal_code_scalar = ScalarType("ProposalCode")
 proposal_code_scalar.set_serializer(scalars.serialize_proposal_code)
 proposal_code_scalar.set_value_parser(scalars.parse_proposal_code)
 
+query = QueryType()
+query.set_field("proposalSubmission", resolvers.resolve_proposal_submission)
+
 mutation = MutationType()
 mutation.set_field("submitProposal", resolvers.resolve_submit_proposal)
 
@@ -95,6 +114,7 @@ schema = make_executable_schema(
     type_defs,
     datetime_scalar,
     proposal_code_scalar,
+    query,
     mutation,
     subscription,
     directives={"permittedFor": PermittedForDirective},
@@ -114,9 +134,23 @@ async def public_key(request: Request) -> Response:
     return await routes.public_key(request)
 
 
+async def submission_progress(request: Request) -> Response:
+    """Request the progress of a submission as server-sent events."""
+    return await routes.submission_progress(request)
+
+
+async def stats(request: Request) -> Response:
+    """Request the statistics collected by the server."""
+    return await routes.stats(request)
+
+
 non_graphql_routes = [
     Route("/token", token, methods=["POST"]),
     Route("/public-key", public_key, methods=["GET"]),
+    Route(
+        "/submissions/{submission_id}/progress", submission_progress, methods=["GET"]
+    ),
+    Route("/stats", stats, methods=["GET"]),
 ]
 
 
@@ -126,7 +160,31 @@ app = Starlette(
     middleware=middleware,
     exception_handlers=exception_handlers,
     routes=non_graphql_routes,
-    on_startup=[database.connect],
-    on_shutdown=[database.disconnect],
+    on_startup=[
+        database.connect,
+        authorization_index.start,
+        storage_service.start,
+        submission_queue.start,
+        install_reload_signal_handler,
+    ],
+    on_shutdown=[
+        authorization_index.stop,
+        submission_queue.stop,
+        database.disconnect,
+        storage_service.close,
+        proposal_inspector.shutdown,
+    ],
 )
-app.mount("/graphql", GraphQL(schema))
+graphql_app = CachingGraphQL(schema, context_value=graphql_context, debug=GRAPHQL_DEBUG)
+app.mount("/graphql", graphql_app)
+
+
+# statistics
+
+stats_registry.register("progress_polling", progress_hub.stats)
+stats_registry.register("user_cache", user_cache.stats)
+stats_registry.register("storage_service", storage_service.stats)
+stats_registry.register("database_pool", database.pool_stats)
+stats_registry.register("query_latencies", query_registry.latencies)
+stats_registry.register("submission_queue", submission_queue.stats)
+stats_registry.register("graphql_documents", graphql_app.documents.stats)
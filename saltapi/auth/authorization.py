@@ -1,6 +1,10 @@
 """User roles relevant for authorization."""
+import asyncio
 import enum
-from typing import Any, List, Optional, Tuple
+import functools
+import itertools
+import os
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Tuple, Union
 import logging
 from starlette.authentication import (
     AuthCredentials,
@@ -12,11 +16,19 @@ from starlette.requests import HTTPConnection
 
 from saltapi.auth.token import parse_token
 from saltapi.repository import user_repository
-from saltapi.repository.user_repository import User, is_user_pc, is_user_pi
+from saltapi.repository.user_repository import (
+    ProposalRole,
+    find_cached_proposal_roles,
+)
+from saltapi.util.enum_lookup import EnumLookup
 
 
 logger = logging.getLogger(__name__)
 
+AUTHORIZATION_INDEX_REFRESH_INTERVAL = float(
+    os.environ.get("AUTHORIZATION_INDEX_REFRESH_INTERVAL", "300")
+)
+
 
 class Permission(enum.Enum):
     """A permission."""
@@ -27,11 +39,10 @@ class Permission(enum.Enum):
     @staticmethod
     def from_name(name: str) -> "Permission":
         """Return the permission for a name."""
-        for _name, member in Permission.__members__.items():
-            if _name == name:
-                return member
-        logger.error(msg=f"Unknown permission: {name}")
-        raise ValueError(f"Unknown permission: {name}")
+        return _permissions.by_name(name)
+
+
+_permissions = EnumLookup(Permission, "permission")
 
 
 class Role(enum.Enum):
@@ -41,12 +52,153 @@ class Role(enum.Enum):
 
     @staticmethod
     def from_name(name: str) -> "Role":
-        """Return the permission for a name."""
-        for _name, member in Role.__members__.items():
-            if _name == name:
-                return member
-        logger.error(msg=f"Unknown role: {name}")
-        raise ValueError(f"Unknown role: {name}")
+        """Return the role for a name."""
+        return _roles.by_name(name)
+
+
+_roles = EnumLookup(Role, "role")
+
+
+Grant = Union[Role, Permission]
+
+# The bit representing a role or permission in a set of grants.
+GRANT_BITS: Dict[Grant, int] = {
+    grant: 1 << i for i, grant in enumerate(itertools.chain(Role, Permission))
+}
+
+# The roles and permissions conferred by the PIPT user settings.
+USER_SETTING_GRANTS: Dict[str, Grant] = {"RightAdmin": Role.ADMINISTRATOR}
+
+
+def grant_mask(grants: Iterable[Grant]) -> int:
+    """Return the bitset for a collection of roles and permissions."""
+    mask = 0
+    for grant in grants:
+        mask |= GRANT_BITS[grant]
+    return mask
+
+
+@functools.lru_cache(maxsize=None)
+def grants_in_mask(mask: int) -> FrozenSet[Grant]:
+    """Return the roles and permissions in a bitset."""
+    return frozenset(grant for grant, bit in GRANT_BITS.items() if mask & bit)
+
+
+class AuthorizationIndex:
+    """
+    An in-memory index of the roles and permissions of all users.
+
+    The roles and permissions of a user are stored as a bitset (see GRANT_BITS), so
+    that checking whether a user has any of a set of roles and permissions is a
+    dictionary lookup and a bitwise and.
+
+    The index is loaded with a single query by the start method, and then refreshed
+    in a background task at regular intervals until the stop method is called. Only
+    the users whose grants have changed are updated by a refresh, and the version of
+    the index is incremented if there are any. If a refresh fails, the previous
+    index is kept. A refresh interval of 0 disables the background refreshes.
+    """
+
+    def __init__(self, refresh_interval: float = AUTHORIZATION_INDEX_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._grants: Dict[int, int] = {}
+        self.version = 0
+        self._refresh_task: Optional["asyncio.Task[None]"] = None
+
+    def __len__(self) -> int:
+        """Return the number of users with any role or permission."""
+        return len(self._grants)
+
+    def grants(self, user_id: int) -> int:
+        """Return the bitset of the roles and permissions of a user."""
+        return self._grants.get(user_id, 0)
+
+    def has_any(self, user_id: int, mask: int) -> bool:
+        """Check whether a user has any of the grants in a bitset."""
+        return bool(self._grants.get(user_id, 0) & mask)
+
+    def grant_set(self, user_id: int) -> FrozenSet[Grant]:
+        """Return the set of the roles and permissions of a user."""
+        return grants_in_mask(self.grants(user_id))
+
+    def roles(self, user_id: int) -> FrozenSet[Role]:
+        """Return the roles of a user."""
+        return frozenset(
+            grant for grant in self.grant_set(user_id) if isinstance(grant, Role)
+        )
+
+    def permissions(self, user_id: int) -> FrozenSet[Permission]:
+        """Return the permissions of a user."""
+        return frozenset(
+            grant for grant in self.grant_set(user_id) if isinstance(grant, Permission)
+        )
+
+    def update(self, user_settings: Iterable[Tuple[int, str]]) -> int:
+        """
+        Update the index from the settings granted to all users.
+
+        Settings which don't confer any role or permission are ignored. Users who are
+        missing from the user settings lose all their roles and permissions.
+
+        The number of users whose grants have changed is returned.
+        """
+        grants: Dict[int, int] = {}
+        for user_id, setting in user_settings:
+            grant = USER_SETTING_GRANTS.get(setting)
+            if grant is not None:
+                grants[user_id] = grants.get(user_id, 0) | GRANT_BITS[grant]
+
+        changed = 0
+        for user_id in [u for u in self._grants if u not in grants]:
+            del self._grants[user_id]
+            changed += 1
+        for user_id, mask in grants.items():
+            if self._grants.get(user_id) != mask:
+                self._grants[user_id] = mask
+                changed += 1
+        if changed:
+            self.version += 1
+        return changed
+
+    async def refresh(self) -> int:
+        """
+        Reload the roles and permissions of all users from the database.
+
+        The number of users whose grants have changed is returned.
+        """
+        return self.update(await user_repository.find_user_grants())
+
+    async def start(self) -> None:
+        """Load the index and start refreshing it in the background."""
+        try:
+            await self.refresh()
+        except Exception:
+            logger.exception(msg="The authorization index could not be loaded.")
+        if self.refresh_interval > 0 and self._refresh_task is None:
+            self._refresh_task = asyncio.ensure_future(self._run_refreshes())
+
+    async def stop(self) -> None:
+        """Stop refreshing the index."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    async def _run_refreshes(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                changed = await self.refresh()
+                if changed:
+                    logger.info(msg=f"The grants of {changed} users have changed.")
+            except Exception:
+                logger.exception(msg="The authorization index could not be refreshed.")
+
+
+authorization_index = AuthorizationIndex()
 
 
 class AuthenticatedUser(BaseUser):
@@ -101,7 +253,7 @@ class TokenAuthenticationBackend(AuthenticationBackend):
             logger.exception(msg=f"Invalid or expired authentication token.")
             raise AuthenticationError("Invalid or expired authentication token.")
 
-        user = await user_repository.find_user_by_id(int(payload.user_id))
+        user = await user_repository.find_cached_user_by_id(int(payload.user_id))
 
         if not user:
             logger.error(msg=f"No user found for id {payload.user_id}.")
@@ -110,38 +262,30 @@ class TokenAuthenticationBackend(AuthenticationBackend):
         return AuthCredentials(["authenticated"]), AuthenticatedUser(user)
 
 
-def has_permission(
-    user: User, auth: AuthCredentials, permission: Permission, **kwargs: Any
-) -> bool:
-    """Check whether the user has a role."""
-    return False
-
-
-def has_role(user: User, auth: AuthCredentials, role: Role, **kwargs: Any) -> bool:
-    """Check whether the user has a role."""
-    return False
-
-
-def has_any_of_roles_or_permissions(
-    user: User,
-    auth: AuthCredentials,
-    roles: List[Role],
-    permissions: List[Permission],
-    **kwargs: Any,
-) -> bool:
-    """Check whether the user has any of a list of roles and permissions."""
-    for permission in permissions:
-        if has_permission(user, auth, permission, **kwargs):
-            return True
-
-    for role in roles:
-        if has_role(user, auth, role, **kwargs):
-            return True
-
-    return False
-
+def operation_grants(context: Dict[str, Any]) -> FrozenSet[Grant]:
+    """
+    Return the roles and permissions of the user executing a GraphQL operation.
 
-def can_re_submit_proposal(proposal_code: str, username: str) -> bool:
+    The grants are looked up once per operation and stored in the operation's
+    context, together with the version of the authorization index. They are only
+    looked up again if the index has changed since, so that the fields resolved for
+    a long-running subscription are checked against the current grants. An
+    unauthenticated user has no grants.
+    """
+    version = authorization_index.version
+    cached: Optional[Tuple[int, FrozenSet[Grant]]] = context.get("grants")
+    if cached is None or cached[0] != version:
+        user = context["request"].user
+        if user.is_authenticated:
+            grants = authorization_index.grant_set(user.id)
+        else:
+            grants = frozenset()
+        cached = (version, grants)
+        context["grants"] = cached
+    return cached[1]
+
+
+async def can_re_submit_proposal(proposal_code: str, username: str) -> bool:
     """
     Check whether a user can resubmit a proposal.
 
@@ -158,8 +302,7 @@ def can_re_submit_proposal(proposal_code: str, username: str) -> bool:
         If the the user can re submit the proposal.
 
     """
-    if is_user_pi(username, proposal_code):
-        return True
-    if is_user_pc(username, proposal_code):
-        return True
-    return False
+    roles = await find_cached_proposal_roles(username, proposal_code)
+    return bool(
+        roles & {ProposalRole.PRINCIPAL_INVESTIGATOR, ProposalRole.PRINCIPAL_CONTACT}
+    )
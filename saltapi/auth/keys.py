@@ -0,0 +1,152 @@
+"""Keys for signing and validating authentication tokens."""
+import asyncio
+import hashlib
+import os
+import signal
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple
+
+import logging
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.serialization import (
+    load_pem_private_key,
+    load_pem_public_key,
+)
+
+logger = logging.getLogger(__name__)
+
+KEY_RELOAD_INTERVAL = float(os.environ.get("KEY_RELOAD_INTERVAL", "60"))
+
+
+class KeyFile:
+    """
+    A PEM key read from a file.
+
+    The key is read and parsed when it is first requested. Afterwards the file's
+    modification time is checked at most once per reload interval, and the key is
+    read and parsed again if the file has changed. If this fails, the previous key is
+    kept. The key can also be reloaded explicitly with the reload method.
+
+    The path of the file is the value of an environment variable, which is only
+    looked up when the key is loaded.
+    """
+
+    def __init__(
+        self,
+        path_variable: str,
+        parse: Callable[[bytes], Any],
+        reload_interval: float = KEY_RELOAD_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.path_variable = path_variable
+        self.reload_interval = reload_interval
+        self._parse = parse
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pem: Optional[bytes] = None
+        self._key: Any = None
+        self._etag = ""
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+
+    @property
+    def key(self) -> Any:
+        """Return the parsed key."""
+        return self._current()[1]
+
+    @property
+    def pem(self) -> bytes:
+        """Return the key in PEM format."""
+        return self._current()[0]
+
+    @property
+    def etag(self) -> str:
+        """Return an entity tag for the key."""
+        return self._current()[2]
+
+    def reload(self) -> None:
+        """Read and parse the key file again."""
+        with self._lock:
+            self._load()
+
+    def _current(self) -> Tuple[bytes, Any, str]:
+        with self._lock:
+            now = self._clock()
+            if self._pem is None:
+                self._load()
+            elif now - self._checked_at >= self.reload_interval:
+                self._checked_at = now
+                try:
+                    mtime = os.stat(self._path()).st_mtime
+                except OSError:
+                    logger.exception(msg="Cannot access the key file.")
+                    mtime = self._mtime
+                if mtime != self._mtime:
+                    # Keep the previous key if the file is invalid, for example
+                    # because it is being written. As the modification time isn't
+                    # updated, loading is tried again after the reload interval.
+                    try:
+                        self._load()
+                    except Exception:
+                        logger.exception(
+                            msg=f"The key from {self.path_variable} could not be "
+                            f"reloaded."
+                        )
+            assert self._pem is not None
+            return self._pem, self._key, self._etag
+
+    def _path(self) -> str:
+        return os.environ[self.path_variable]
+
+    def _load(self) -> None:
+        path = self._path()
+        mtime = os.stat(path).st_mtime
+        with open(path, "rb") as f:
+            pem = f.read()
+        key = self._parse(pem)
+        self._pem = pem
+        self._key = key
+        self._etag = f'"{hashlib.sha256(pem).hexdigest()}"'
+        self._mtime = mtime
+        self._checked_at = self._clock()
+        logger.info(msg=f"Loaded the key from {self.path_variable}.")
+
+
+def _parse_private_key(pem: bytes) -> Any:
+    return load_pem_private_key(pem, password=None, backend=default_backend())
+
+
+def _parse_public_key(pem: bytes) -> Any:
+    return load_pem_public_key(pem, backend=default_backend())
+
+
+rs256_private_key = KeyFile("RS256_SECRET_KEY_FILE", _parse_private_key)
+
+rs256_public_key = KeyFile("RS256_PUBLIC_KEY_FILE", _parse_public_key)
+
+
+def reload_keys() -> None:
+    """Reload the keys for the RS256 algorithm."""
+    for key_file in (rs256_private_key, rs256_public_key):
+        try:
+            key_file.reload()
+        except Exception:
+            logger.exception(
+                msg=f"The key from {key_file.path_variable} could not be reloaded."
+            )
+
+
+def install_reload_signal_handler() -> None:
+    """
+    Reload the keys for the RS256 algorithm whenever a SIGHUP signal is received.
+
+    Nothing is done if signal handlers cannot be installed, for example because the
+    platform doesn't support SIGHUP or because the event loop isn't running in the
+    main thread.
+    """
+    try:
+        asyncio.get_event_loop().add_signal_handler(signal.SIGHUP, reload_keys)
+    except (AttributeError, NotImplementedError, RuntimeError, ValueError):
+        logger.info(msg="No signal handler for reloading keys could be installed.")
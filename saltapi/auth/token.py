@@ -1,17 +1,27 @@
 """Create and parse authentication tokens."""
+import asyncio
 import dataclasses
+import functools
+import hashlib
 import os
 from time import time
-from typing import List, Optional
+from typing import Any, Callable, List, Optional, Tuple
 import logging
 
 import jwt
 
+from saltapi.auth.keys import rs256_private_key, rs256_public_key
 from saltapi.repository.user_repository import User
+from saltapi.util.cache import TTLCache
 from saltapi.util.error import UsageError
+from saltapi.util.loop_local import LoopLocal
 
 logger = logging.getLogger(__name__)
 
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", "1000"))
+
+TOKEN_CACHE_TTL = float(os.environ.get("TOKEN_CACHE_TTL", "300"))
+
 
 @dataclasses.dataclass(frozen=True)
 class TokenPayload:
@@ -21,6 +31,16 @@ class TokenPayload:
     roles: List[str]
 
 
+# Cache of the payloads of tokens whose signature has been verified, together with
+# the tokens' expiry time (if any). The cache keys are the algorithm, the entity tag
+# of the key used for verifying the signature (or an empty string for the HS256
+# secret key, which doesn't change while the server is running) and the SHA-256
+# digest of the token. So tokens cached for a replaced key aren't used any longer.
+token_cache: "TTLCache[Tuple[str, str, str], Tuple[TokenPayload, Optional[float]]]" = (
+    TTLCache(max_size=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+)
+
+
 def create_token(
     user: User, expiry: Optional[int] = None, algorithm: str = "HS256"
 ) -> str:
@@ -36,10 +56,9 @@ def create_token(
     if expiry:
         payload["exp"] = time() + expiry
     if algorithm == "HS256":
-        key = os.environ["HS256_SECRET_KEY"]
+        key: Any = os.environ["HS256_SECRET_KEY"]
     elif algorithm == "RS256":
-        with open(os.environ["RS256_SECRET_KEY_FILE"]) as f:
-            key = f.read()
+        key = rs256_private_key.key
     else:
         logger.error(msg=f"Unsupported algorithm: {algorithm}")
         raise ValueError(f"Unsupported algorithm: {algorithm}")
@@ -53,21 +72,106 @@ def parse_token(token: str, algorithm: str = "HS256") -> TokenPayload:
     The algorithm must be HS256 or RS256.
 
     An exception is raised if the token is invalid or expired.
+
+    The payloads of valid tokens are cached, so that the signature of a token need
+    not be verified again when the token is parsed again. A cached payload is never
+    used once the token has expired, or once the key for verifying it has changed.
     """
     if algorithm == "HS256":
-        key = os.environ["HS256_SECRET_KEY"]
+        key: Any = os.environ["HS256_SECRET_KEY"]
+        key_etag = ""
     elif algorithm == "RS256":
-        with open(os.environ["RS256_PUBLIC_KEY_FILE"]) as f:
-            key = f.read()
+        # The entity tag is read before the key, so that a token verified with a
+        # replaced key is never cached for the new key.
+        key_etag = rs256_public_key.etag
+        key = rs256_public_key.key
     else:
         logger.error(msg=f"Unsupported algorithm: {algorithm}")
         raise ValueError(f"Unsupported algorithm: {algorithm}")
+
+    cache_key = (
+        algorithm,
+        key_etag,
+        hashlib.sha256(token.encode("utf-8")).hexdigest(),
+    )
+    cached = token_cache.get(cache_key)
+    if cached is not None:
+        cached_payload, expires_at = cached
+        if expires_at is None or time() < expires_at:
+            return cached_payload
+        token_cache.invalidate(cache_key)
+        logger.info(msg="The authentication token has expired.")
+        raise UsageError("The authentication token has expired.")
+
     try:
         payload = jwt.decode(token, key, algorithms=[algorithm])
-        return TokenPayload(user_id=payload["user_id"], roles=payload.get("roles", []))
+        token_payload = TokenPayload(
+            user_id=payload["user_id"], roles=payload.get("roles", [])
+        )
     except jwt.ExpiredSignatureError:
         logger.info(msg=f"The authentication token has expired.")
         raise UsageError("The authentication token has expired.")
     except Exception:
         logger.exception(msg="Invalid authentication token.")
         raise UsageError("Invalid authentication token.")
+
+    expires_at = payload.get("exp")
+    if expires_at is None:
+        token_cache.set(cache_key, (token_payload, None))
+    else:
+        ttl = min(float(expires_at) - time(), TOKEN_CACHE_TTL)
+        if ttl > 0:
+            token_cache.set(cache_key, (token_payload, float(expires_at)), ttl=ttl)
+    return token_payload
+
+
+class ServiceTokenProvider:
+    """
+    A provider of authentication tokens for calls to other services.
+
+    A token is created when it is first requested and is then reused until shortly
+    before it expires. Tokens are signed in a worker thread, so that signing does not
+    block the event loop. Concurrent requests for a new token share a single token.
+    """
+
+    def __init__(
+        self,
+        user: User,
+        lifetime: int = 300,
+        refresh_margin: int = 60,
+        algorithm: str = "RS256",
+        clock: Callable[[], float] = time,
+    ):
+        if refresh_margin >= lifetime:
+            raise ValueError("The refresh margin must be less than the token lifetime.")
+        self.user = user
+        self.lifetime = lifetime
+        self.refresh_margin = refresh_margin
+        self.algorithm = algorithm
+        self._clock = clock
+        self._token: Optional[str] = None
+        self._refresh_at = 0.0
+        self._lock = LoopLocal(asyncio.Lock)
+
+    async def token(self) -> str:
+        """Return a token which remains valid for at least the refresh margin."""
+        if self._token is not None and self._clock() < self._refresh_at:
+            return self._token
+
+        async with self._lock.get():
+            # another call may have refreshed the token while this one was waiting
+            if self._token is not None and self._clock() < self._refresh_at:
+                return self._token
+            issued_at = self._clock()
+            token = await asyncio.get_event_loop().run_in_executor(
+                None,
+                functools.partial(
+                    create_token,
+                    user=self.user,
+                    expiry=self.lifetime,
+                    algorithm=self.algorithm,
+                ),
+            )
+            self._token = token
+            self._refresh_at = issued_at + self.lifetime - self.refresh_margin
+            return token
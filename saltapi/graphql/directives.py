@@ -1,23 +1,32 @@
 """GraphQL schema directives."""
 import logging
-from typing import Any, Union
+from inspect import isawaitable
+from typing import Any, FrozenSet, Union
 
 from ariadne import SchemaDirectiveVisitor
 from graphql import (
     GraphQLField,
     GraphQLInterfaceType,
     GraphQLObjectType,
+    GraphQLResolveInfo,
     default_field_resolver,
 )
 
 from saltapi.auth import authorization
-from saltapi.auth.authorization import Permission, Role
+from saltapi.auth.authorization import Grant, Permission, Role
 
 logger = logging.getLogger(__name__)
 
 
 class PermittedForDirective(SchemaDirectiveVisitor):
-    """Directive for handling permissions."""
+    """
+    Directive for handling permissions.
+
+    The roles and permissions of the directive are converted to enum members once,
+    when the schema is built. A field resolution then only requires a set
+    intersection with the grants of the user making the request, which are looked up
+    once per operation.
+    """
 
     def visit_field_definition(
         self,
@@ -26,22 +35,23 @@ class PermittedForDirective(SchemaDirectiveVisitor):
     ) -> GraphQLField:
         """Check authorization and execute query."""
         original_resolver = field.resolve or default_field_resolver
-
-        async def new_resolver(*args: Any, **kwargs: Any) -> Any:
-            roles = [Role.from_name(r) for r in self.args.get("roles")]
-            permissions = [
-                Permission.from_name(p) for p in self.args.get("permissions")
-            ]
-            user = args[1].context["request"].user
-            auth = args[1].context["request"].auth
-
-            if not authorization.has_any_of_roles_or_permissions(
-                user=user, auth=auth, roles=roles, permissions=permissions, **kwargs
-            ):
+        roles = frozenset(Role.from_name(r) for r in self.args.get("roles") or [])
+        permissions = frozenset(
+            Permission.from_name(p) for p in self.args.get("permissions") or []
+        )
+        permitted_for: FrozenSet[Grant] = roles | permissions
+
+        async def new_resolver(
+            obj: Any, info: GraphQLResolveInfo, **kwargs: Any
+        ) -> Any:
+            if not permitted_for & authorization.operation_grants(info.context):
                 logger.info(msg="Not authorized")
                 raise Exception("Not authorized.")
 
-            return await original_resolver(*args, **kwargs)
+            result = original_resolver(obj, info, **kwargs)
+            if isawaitable(result):
+                result = await result
+            return result
 
         field.resolve = new_resolver
         return field
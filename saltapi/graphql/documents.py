@@ -0,0 +1,137 @@
+"""A cache of parsed and validated GraphQL documents."""
+import dataclasses
+import hashlib
+import math
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from ariadne.graphql import parse_query, validate_query
+from graphql import DocumentNode, GraphQLError, GraphQLSchema
+
+from saltapi.util.cache import CacheStats, TTLCache
+
+DOCUMENT_CACHE_SIZE = int(os.environ.get("DOCUMENT_CACHE_SIZE", "100"))
+
+PERSISTED_QUERY_CACHE_SIZE = int(os.environ.get("PERSISTED_QUERY_CACHE_SIZE", "1000"))
+
+PERSISTED_QUERY_VERSION = 1
+
+
+class PersistedQueryNotFound(GraphQLError):
+    """An error indicating that a persisted query hash is unknown."""
+
+    def __init__(self) -> None:
+        super().__init__(
+            "PersistedQueryNotFound",
+            extensions={"code": "PERSISTED_QUERY_NOT_FOUND"},
+        )
+
+
+@dataclasses.dataclass(frozen=True)
+class CompiledDocument:
+    """A parsed document and the errors found when validating it."""
+
+    document: DocumentNode
+    errors: Tuple[GraphQLError, ...]
+
+
+@dataclasses.dataclass(frozen=True)
+class DocumentCacheStats:
+    """Statistics for the caches of a document cache."""
+
+    documents: CacheStats
+    persisted_queries: CacheStats
+
+
+def query_hash(query: str) -> str:
+    """Return the SHA-256 hash of a query, as used for persisted queries."""
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+class DocumentCache:
+    """
+    A bounded cache of parsed and validated documents for a schema.
+
+    Documents are cached by their query string, so that a repeated query is neither
+    parsed nor validated again. Documents which can't be parsed aren't cached, but
+    documents failing validation are cached with their validation errors.
+
+    The cache also supports automatic persisted queries, as implemented by the
+    Apollo client. A client may send the SHA-256 hash of a query in the
+    persistedQuery request extension instead of the query. If the hash is unknown, a
+    PersistedQueryNotFound error is raised, and the client sends the query along
+    with its hash, which are then stored. Queries can be persisted up front with the
+    persist method.
+
+    Both caches evict their least recently used entries when they are full.
+    """
+
+    def __init__(
+        self,
+        schema: GraphQLSchema,
+        max_size: int = DOCUMENT_CACHE_SIZE,
+        persisted_query_max_size: int = PERSISTED_QUERY_CACHE_SIZE,
+    ):
+        self.schema = schema
+        self._documents: "TTLCache[str, CompiledDocument]" = TTLCache(
+            max_size=max_size, ttl=math.inf
+        )
+        self._persisted_queries: "TTLCache[str, str]" = TTLCache(
+            max_size=persisted_query_max_size, ttl=math.inf
+        )
+
+    def persist(self, query: str) -> str:
+        """Persist a query and return its hash."""
+        sha256_hash = query_hash(query)
+        self._persisted_queries.set(sha256_hash, query)
+        return sha256_hash
+
+    def resolve_query(self, data: Dict[str, Any]) -> Any:
+        """
+        Return the query of the operation data.
+
+        If the data has a persistedQuery extension, the query is looked up by its
+        hash or, if it is included, persisted. Otherwise the query is returned as
+        it is.
+        """
+        query = data.get("query")
+        extensions = data.get("extensions")
+        if not isinstance(extensions, dict) or "persistedQuery" not in extensions:
+            return query
+
+        persisted_query = extensions["persistedQuery"]
+        if not isinstance(persisted_query, dict):
+            raise GraphQLError("The persistedQuery extension must be an object.")
+        if persisted_query.get("version") != PERSISTED_QUERY_VERSION:
+            raise GraphQLError("Unsupported persisted query version.")
+        sha256_hash = persisted_query.get("sha256Hash")
+        if not isinstance(sha256_hash, str):
+            raise GraphQLError("The persisted query hash must be a string.")
+
+        if query is None:
+            query = self._persisted_queries.get(sha256_hash)
+            if query is None:
+                raise PersistedQueryNotFound()
+            return query
+
+        if not isinstance(query, str) or query_hash(query) != sha256_hash:
+            raise GraphQLError("The persisted query hash does not match the query.")
+        self._persisted_queries.set(sha256_hash, query)
+        return query
+
+    def compile(self, query: str) -> CompiledDocument:
+        """Return the parsed document for a query and its validation errors."""
+        compiled: Optional[CompiledDocument] = self._documents.get(query)
+        if compiled is None:
+            document = parse_query(query)
+            errors = validate_query(self.schema, document)
+            compiled = CompiledDocument(document=document, errors=tuple(errors))
+            self._documents.set(query, compiled)
+        return compiled
+
+    def stats(self) -> DocumentCacheStats:
+        """Return the statistics for the document and persisted query caches."""
+        return DocumentCacheStats(
+            documents=self._documents.stats(),
+            persisted_queries=self._persisted_queries.stats(),
+        )
@@ -0,0 +1,35 @@
+"""Data loaders for the GraphQL resolvers."""
+from typing import Any, Dict
+
+from saltapi.repository import user_repository
+from saltapi.repository.user_repository import User
+from saltapi.util.dataloader import DataLoader, DataLoaderStats
+
+
+class Loaders:
+    """
+    The data loaders for a GraphQL request.
+
+    A new instance must be created for every request, and it is available as
+    context["loaders"] in the resolvers. Resolvers should load their data with the
+    loaders rather than by calling repository functions directly, so that the loads
+    for the fields of a query are batched.
+    """
+
+    def __init__(self) -> None:
+        self.user_by_id: "DataLoader[int, User]" = DataLoader(
+            user_repository.find_users_by_ids
+        )
+
+    def stats(self) -> Dict[str, DataLoaderStats]:
+        """Return the statistics for all loaders."""
+        return {
+            name: loader.stats()
+            for name, loader in vars(self).items()
+            if isinstance(loader, DataLoader)
+        }
+
+
+def graphql_context(request: Any) -> Dict[str, Any]:
+    """Return the context for a GraphQL request."""
+    return {"request": request, "loaders": Loaders()}
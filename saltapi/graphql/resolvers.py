@@ -1,16 +1,13 @@
 """Resolvers for submitting content."""
-import asyncio
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional
 
 from ariadne import convert_kwargs_to_snake_case
 from starlette.datastructures import UploadFile
 
-from saltapi.repository.submission_repository import (
-    SubmissionStatus,
-    find_submission_log_entries,
-    find_submission_status,
-)
-from saltapi.submission.submit import submit_proposal
+from saltapi.repository.submission_repository import SubmissionLog
+from saltapi.submission.inspection import proposal_inspector
+from saltapi.submission.progress import progress_hub
+from saltapi.submission.queue import submission_queue
 
 
 def username(info: Any) -> str:
@@ -22,8 +19,14 @@ def username(info: Any) -> str:
 async def resolve_submit_proposal(
     root: Any, info: Any, proposal: UploadFile, proposal_code: Optional[str] = None
 ) -> str:
-    """Submit a proposal."""
-    return await submit_proposal(
+    """
+    Queue a proposal submission and return its tracking id.
+
+    The proposal file is inspected in a worker pool before it is queued, so that a
+    file with the wrong proposal code is rejected at once.
+    """
+    await proposal_inspector.check_proposal_code(proposal.file, proposal_code)
+    return await submission_queue.enqueue(
         proposal=proposal,
         proposal_code=proposal_code,
         submitter=username(info),
@@ -31,46 +34,59 @@ async def resolve_submit_proposal(
 
 
 @convert_kwargs_to_snake_case
-async def submission_progress_generator(root: Any, info: Any, submission_id: str):
-    """Generate content for the submission progress resolver."""
-    latest_entry_number = 0
-    previous_status: Optional[SubmissionStatus] = None
-    while True:
-        log_entries = await find_submission_log_entries(
-            submission_id, latest_entry_number
-        )
-        status = await find_submission_status(submission_id)
-        if len(log_entries):
-            latest_entry_number = log_entries[-1].entry_number
+def resolve_proposal_submission(
+    root: Any, info: Any, tracking_id: str
+) -> Optional[Dict[str, Any]]:
+    """Return a queued proposal submission of the user."""
+    job = submission_queue.job(tracking_id)
+    if job is None or job.submitter != username(info):
+        return None
+    return {
+        "trackingId": job.tracking_id,
+        "status": job.status.name,
+        "attempts": job.attempts,
+        "submissionId": job.submission_id,
+        "error": job.error,
+    }
 
-        progress = {
-            "submissionId": submission_id,
-            "logEntries": [
-                {
-                    "messageType": le.message_type.name,
-                    "message": le.message,
-                    "timestamp": le.logged_at,
-                }
-                for le in log_entries
-            ],
-            "status": status.name,
-        }
 
-        if status != previous_status or len(log_entries):
-            yield progress
+def log_entry_dicts(log: SubmissionLog) -> List[Dict[str, Any]]:
+    """
+    Convert submission log entries to the format expected by GraphQL.
 
-        if status in [
-            SubmissionStatus.FAILED,
-            SubmissionStatus.SUCCESSFUL,
-        ]:
-            return
+    The dictionaries are created from the columns of the log, without creating a
+    SubmissionLogEntry for every entry.
+    """
+    return [
+        {"messageType": message_type.name, "message": message, "timestamp": t}
+        for message_type, message, t in zip(
+            log.message_types, log.messages, log.timestamps()
+        )
+    ]
 
-        previous_status = status
 
-        await asyncio.sleep(5)
+@convert_kwargs_to_snake_case
+async def submission_progress_generator(
+    root: Any, info: Any, submission_id: str, after_entry: int = 0
+):
+    """Generate content for the submission progress resolver."""
+    if after_entry < 0:
+        raise ValueError("The entry number afterEntry must not be negative.")
+    latest_entry = after_entry
+    async for progress in progress_hub.subscribe(submission_id, after_entry):
+        if len(progress.log_entries):
+            latest_entry = progress.log_entries.entry_numbers[-1]
+        yield {
+            "submissionId": submission_id,
+            "logEntries": log_entry_dicts(progress.log_entries),
+            "status": progress.status.name,
+            "latestEntry": latest_entry,
+        }
 
 
 @convert_kwargs_to_snake_case
-def resolve_submission_progress(progress: Any, info: Any, submission_id: str):
+def resolve_submission_progress(
+    progress: Any, info: Any, submission_id: str, after_entry: int = 0
+):
     """Return the progress details."""
     return progress
@@ -0,0 +1,183 @@
+"""The ASGI application serving the GraphQL API."""
+import asyncio
+import dataclasses
+import logging
+import os
+from inspect import isawaitable
+from typing import Any, AsyncGenerator, Dict, List, cast
+
+from ariadne.asgi import GQL_ERROR, GraphQL
+from ariadne.exceptions import HttpError
+from ariadne.graphql import (
+    handle_graphql_errors,
+    handle_query_result,
+    validate_operation_name,
+    validate_query_body,
+    validate_variables,
+)
+from ariadne.logger import log_error
+from ariadne.types import GraphQLResult, SubscriptionResult
+from graphql import ExecutionResult, GraphQLError, GraphQLSchema, execute, subscribe
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.websockets import WebSocket
+
+from saltapi.graphql.documents import (
+    DOCUMENT_CACHE_SIZE,
+    PERSISTED_QUERY_CACHE_SIZE,
+    CompiledDocument,
+    DocumentCache,
+)
+
+logger = logging.getLogger(__name__)
+
+GRAPHQL_DEBUG = os.environ.get("GRAPHQL_DEBUG", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+
+class CachingGraphQL(GraphQL):
+    """
+    An ASGI application for the GraphQL API with a cache of parsed documents.
+
+    Queries, mutations and subscriptions are executed like by ariadne's GraphQL
+    application, but their documents are taken from a document cache, which also
+    handles persisted queries. See saltapi.graphql.documents.DocumentCache for
+    details.
+
+    Root values, custom validation rules, extensions and middleware are not
+    supported, and introspection is always enabled.
+
+    If the context has data loaders (see saltapi.graphql.loaders), their statistics
+    are logged at debug level after a query or mutation. In debug mode they are
+    also included in the dataLoaders response extension.
+    """
+
+    def __init__(
+        self,
+        schema: GraphQLSchema,
+        *,
+        document_cache_size: int = DOCUMENT_CACHE_SIZE,
+        persisted_query_cache_size: int = PERSISTED_QUERY_CACHE_SIZE,
+        **kwargs: Any,
+    ):
+        super().__init__(schema, **kwargs)
+        self.documents = DocumentCache(
+            schema,
+            max_size=document_cache_size,
+            persisted_query_max_size=persisted_query_cache_size,
+        )
+
+    async def graphql_http_server(self, request: Request) -> Response:
+        """Execute a query or mutation sent in an HTTP request."""
+        try:
+            data = await self.extract_data_from_request(request)
+        except HttpError as error:
+            return PlainTextResponse(error.message or error.status, status_code=400)
+
+        context_value = await self.get_context_for_request(request)
+        success, response = await self.execute(data, context_value)
+        status_code = 200 if success else 400
+        return JSONResponse(response, status_code=status_code)
+
+    async def start_websocket_subscription(
+        self,
+        data: Any,
+        operation_id: str,
+        websocket: WebSocket,
+        subscriptions: Dict[str, AsyncGenerator],
+    ) -> None:
+        """Start a subscription sent over a websocket."""
+        context_value = await self.get_context_for_request(websocket)
+        success, results = await self.subscribe(data, context_value)
+        if not success:
+            results = cast(List[dict], results)
+            await websocket.send_json(
+                {"type": GQL_ERROR, "id": operation_id, "payload": results[0]}
+            )
+        else:
+            results = cast(AsyncGenerator, results)
+            subscriptions[operation_id] = results
+            asyncio.ensure_future(
+                self.observe_async_results(results, operation_id, websocket)
+            )
+
+    async def execute(self, data: Any, context_value: Any) -> GraphQLResult:
+        """Execute a query or mutation."""
+        try:
+            compiled = self._compile(data)
+            if compiled.errors:
+                return handle_graphql_errors(
+                    compiled.errors,
+                    logger=self.logger,
+                    error_formatter=self.error_formatter,
+                    debug=self.debug,
+                )
+            result = execute(
+                self.schema,
+                compiled.document,
+                context_value=context_value,
+                variable_values=data.get("variables"),
+                operation_name=data.get("operationName"),
+            )
+            if isawaitable(result):
+                result = await cast(Any, result)
+        except GraphQLError as error:
+            return handle_graphql_errors(
+                [error],
+                logger=self.logger,
+                error_formatter=self.error_formatter,
+                debug=self.debug,
+            )
+        success, response = handle_query_result(
+            result,
+            logger=self.logger,
+            error_formatter=self.error_formatter,
+            debug=self.debug,
+        )
+        self._add_loader_stats(context_value, response)
+        return success, response
+
+    async def subscribe(self, data: Any, context_value: Any) -> SubscriptionResult:
+        """Subscribe to a subscription."""
+        try:
+            compiled = self._compile(data)
+            errors: List[GraphQLError] = list(compiled.errors)
+            if not errors:
+                result = await subscribe(
+                    self.schema,
+                    compiled.document,
+                    context_value=context_value,
+                    variable_values=data.get("variables"),
+                    operation_name=data.get("operationName"),
+                )
+                if not isinstance(result, ExecutionResult):
+                    return True, cast(AsyncGenerator, result)
+                errors = list(result.errors or [])
+        except GraphQLError as error:
+            errors = [error]
+        for error in errors:
+            log_error(error, self.logger)
+        return False, [self.error_formatter(error, self.debug) for error in errors]
+
+    def _add_loader_stats(self, context_value: Any, response: Dict[str, Any]) -> None:
+        if not isinstance(context_value, dict) or "loaders" not in context_value:
+            return
+        stats = {
+            name: dataclasses.asdict(loader_stats)
+            for name, loader_stats in context_value["loaders"].stats().items()
+        }
+        logger.debug(msg=f"Data loader statistics: {stats}")
+        if self.debug:
+            response.setdefault("extensions", {})["dataLoaders"] = stats
+
+    def _compile(self, data: Any) -> CompiledDocument:
+        if not isinstance(data, dict):
+            raise GraphQLError("Operation data should be a JSON object")
+        query = self.documents.resolve_query(data)
+        validate_query_body(query)
+        validate_variables(data.get("variables"))
+        validate_operation_name(data.get("operationName"))
+        return self.documents.compile(query)
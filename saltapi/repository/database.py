@@ -1,12 +1,311 @@
 """The database."""
 
+import asyncio
+import dataclasses
 import os
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, TypeVar
 
 import databases as databases
+import databases.core
 import dotenv
+import logging
+from databases.backends.mysql import MySQLBackend, MySQLConnection
+from sqlalchemy.sql import ClauseElement
 
 dotenv.load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 DATABASE_DSN = os.environ["DATABASE_URL"]
 
-database = databases.Database(DATABASE_DSN)
+# Connection pool options, with the environment variables overriding them and their
+# default values.
+POOL_OPTIONS = (
+    ("min_size", "DATABASE_POOL_MIN_SIZE", 1),
+    ("max_size", "DATABASE_POOL_MAX_SIZE", 10),
+    ("pool_recycle", "DATABASE_POOL_RECYCLE", 3600),
+)
+
+DATABASE_ACQUIRE_TIMEOUT = float(os.environ.get("DATABASE_ACQUIRE_TIMEOUT", "10"))
+
+DATABASE_STATEMENT_TIMEOUT = float(os.environ.get("DATABASE_STATEMENT_TIMEOUT", "30"))
+
+DATABASE_HEALTH_CHECK_INTERVAL = float(
+    os.environ.get("DATABASE_HEALTH_CHECK_INTERVAL", "60")
+)
+
+T = TypeVar("T")
+
+
+def pool_options(dsn: str, environ: Mapping[str, str] = os.environ) -> Dict[str, int]:
+    """
+    Return the options for the database connection pool.
+
+    An option is taken from its environment variable if this is set, from the query
+    string of the DSN otherwise, and it has its default value if it is set in
+    neither.
+    """
+    dsn_options = databases.DatabaseURL(dsn).options
+    options = {}
+    for option, variable, default in POOL_OPTIONS:
+        value = environ.get(variable, dsn_options.get(option, default))
+        options[option] = int(value)
+    return options
+
+
+class DatabaseTimeoutError(Exception):
+    """An exception indicating that a database operation took too long."""
+
+
+@dataclasses.dataclass(frozen=True)
+class DatabasePoolStats:
+    """Gauges and counters for a database connection pool."""
+
+    size: int
+    max_size: int
+    in_use: int
+    idle: int
+    waiting: int
+    acquire_timeouts: int
+    statement_timeouts: int
+    evicted_connections: int
+
+
+class MonitoredMySQLConnection(MySQLConnection):
+    """
+    A MySQL connection with an acquire timeout and a statement timeout.
+
+    A DatabaseTimeoutError is raised if no connection can be acquired from the pool
+    or if a statement doesn't finish in time. A connection whose statement has timed
+    out is closed, so that it isn't reused.
+    """
+
+    _database: "MonitoredMySQLBackend"
+
+    async def acquire(self) -> None:
+        """Acquire a connection from the pool."""
+        backend = self._database
+        assert backend._pool is not None, "DatabaseBackend is not running"
+        backend.waiting += 1
+        try:
+            self._connection = await asyncio.wait_for(
+                backend._pool.acquire(), backend.acquire_timeout or None
+            )
+        except asyncio.TimeoutError:
+            backend.acquire_timeouts += 1
+            logger.error(
+                msg=f"No database connection could be acquired within "
+                f"{backend.acquire_timeout} seconds: {backend.stats()}"
+            )
+            raise DatabaseTimeoutError(
+                "No database connection is available. Please try again later."
+            ) from None
+        finally:
+            backend.waiting -= 1
+
+    async def fetch_all(self, query: ClauseElement) -> List[Mapping]:
+        """Execute a query and return all rows."""
+        return await self._with_timeout(super().fetch_all, query)
+
+    async def fetch_one(self, query: ClauseElement) -> Optional[Mapping]:
+        """Execute a query and return the first row."""
+        return await self._with_timeout(super().fetch_one, query)
+
+    async def execute(self, query: ClauseElement) -> Any:
+        """Execute a statement."""
+        return await self._with_timeout(super().execute, query)
+
+    async def execute_many(self, queries: List[ClauseElement]) -> None:
+        """Execute several statements."""
+        return await self._with_timeout(super().execute_many, queries)
+
+    async def _with_timeout(
+        self, execute: Callable[[Any], Awaitable[T]], query: Any
+    ) -> T:
+        timeout = self._database.statement_timeout
+        connection = self._connection
+        if not timeout or connection is None:
+            return await execute(query)
+
+        # Closing the connection makes the pending read fail immediately, whereas
+        # cancelling the statement would leave the connection in an unknown state.
+        timed_out = False
+
+        def close() -> None:
+            nonlocal timed_out
+            timed_out = True
+            connection.close()
+
+        timer = asyncio.get_event_loop().call_later(timeout, close)
+        try:
+            return await execute(query)
+        except Exception:
+            if timed_out:
+                self._database.statement_timeouts += 1
+                logger.error(
+                    msg=f"A database statement took longer than {timeout} seconds."
+                )
+                raise DatabaseTimeoutError(
+                    "The database query took too long."
+                ) from None
+            raise
+        finally:
+            timer.cancel()
+
+
+class MonitoredMySQLBackend(MySQLBackend):
+    """
+    A MySQL backend with timeouts, pool statistics and health checks.
+
+    The options acquire_timeout, statement_timeout and health_check_interval (all
+    in seconds) are used by the backend. All other options are passed on to the
+    aiomysql pool. A timeout or interval of 0 disables the timeout or health checks.
+
+    While the backend is connected, a background task checks the idle connections
+    in the pool at regular intervals and closes the connections which don't respond
+    to a ping.
+    """
+
+    def __init__(self, database_url: Any, **options: Any) -> None:
+        self.acquire_timeout: float = options.pop(
+            "acquire_timeout", DATABASE_ACQUIRE_TIMEOUT
+        )
+        self.statement_timeout: float = options.pop(
+            "statement_timeout", DATABASE_STATEMENT_TIMEOUT
+        )
+        self.health_check_interval: float = options.pop(
+            "health_check_interval", DATABASE_HEALTH_CHECK_INTERVAL
+        )
+        super().__init__(database_url, **options)
+        self.waiting = 0
+        self.acquire_timeouts = 0
+        self.statement_timeouts = 0
+        self.evicted_connections = 0
+        self._health_check_task: Optional["asyncio.Task[None]"] = None
+
+    async def connect(self) -> None:
+        """Create the connection pool and start the health checks."""
+        await super().connect()
+        if self.health_check_interval > 0:
+            self._health_check_task = asyncio.ensure_future(self._run_health_checks())
+
+    async def disconnect(self) -> None:
+        """Stop the health checks and close the connection pool."""
+        if self._health_check_task is not None:
+            self._health_check_task.cancel()
+            try:
+                await self._health_check_task
+            except asyncio.CancelledError:
+                pass
+            self._health_check_task = None
+        await super().disconnect()
+
+    def connection(self) -> MonitoredMySQLConnection:
+        """Return a new connection."""
+        return MonitoredMySQLConnection(self, self._dialect)
+
+    def stats(self) -> DatabasePoolStats:
+        """Return the statistics for the connection pool."""
+        pool = self._pool
+        size = pool.size if pool is not None else 0
+        idle = pool.freesize if pool is not None else 0
+        max_size = pool.maxsize if pool is not None else 0
+        return DatabasePoolStats(
+            size=size,
+            max_size=max_size,
+            in_use=size - idle,
+            idle=idle,
+            waiting=self.waiting,
+            acquire_timeouts=self.acquire_timeouts,
+            statement_timeouts=self.statement_timeouts,
+            evicted_connections=self.evicted_connections,
+        )
+
+    async def check_idle_connections(self) -> None:
+        """Close the idle connections which don't respond to a ping."""
+        pool = self._pool
+        if pool is None:
+            return
+        # Released connections are put at the end of the queue of idle connections,
+        # so that every idle connection is checked once.
+        for _ in range(pool.freesize):
+            if pool.freesize == 0:
+                break
+            connection = await pool.acquire()
+            try:
+                await connection.ping(reconnect=False)
+            except Exception:
+                logger.warning(msg="Closing a dead database connection.")
+                connection.close()
+                self.evicted_connections += 1
+            finally:
+                await pool.release(connection)
+
+    async def _run_health_checks(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                await self.check_idle_connections()
+                stats = self.stats()
+                if stats.waiting > 0:
+                    logger.warning(msg=f"The database pool is saturated: {stats}")
+            except Exception:
+                logger.exception(msg="The database health check failed.")
+
+
+class Connection(databases.core.Connection):
+    """
+    A connection which isn't left marked as acquired if acquiring it fails.
+
+    The connection of the databases package counts how often it has been entered
+    before acquiring a backend connection. If acquiring fails, for example because
+    of an acquire timeout, the count wouldn't be reset, and all later queries in the
+    same task would fail because no backend connection is acquired.
+    """
+
+    async def __aenter__(self) -> "Connection":
+        """Acquire a backend connection, unless one is acquired already."""
+        async with self._connection_lock:
+            self._connection_counter += 1
+            if self._connection_counter == 1:
+                try:
+                    await self._connection.acquire()
+                except BaseException:
+                    self._connection_counter -= 1
+                    raise
+        return self
+
+
+class Database(databases.Database):
+    """A database whose MySQL connections are monitored."""
+
+    SUPPORTED_BACKENDS = {
+        **databases.Database.SUPPORTED_BACKENDS,
+        "mysql": "saltapi.repository.database:MonitoredMySQLBackend",
+    }
+
+    def connection(self) -> databases.core.Connection:
+        """Return the connection of the current task."""
+        if self._global_connection is not None:
+            return self._global_connection
+        try:
+            return self._connection_context.get()
+        except LookupError:
+            connection = Connection(self._backend)
+            self._connection_context.set(connection)
+            return connection
+
+    def pool_stats(self) -> Optional[DatabasePoolStats]:
+        """Return the statistics of the connection pool, if there are any."""
+        if isinstance(self._backend, MonitoredMySQLBackend):
+            return self._backend.stats()
+        return None
+
+
+database = Database(
+    DATABASE_DSN,
+    **pool_options(DATABASE_DSN),
+    acquire_timeout=DATABASE_ACQUIRE_TIMEOUT,
+    statement_timeout=DATABASE_STATEMENT_TIMEOUT,
+    health_check_interval=DATABASE_HEALTH_CHECK_INTERVAL,
+)
@@ -4,11 +4,16 @@ import zipfile
 from typing import BinaryIO, Optional, Union
 from zipfile import ZipFile
 
-from defusedxml.ElementTree import parse
+from defusedxml.ElementTree import iterparse
 
 
 def get_proposal_code(proposal_zip: Union[str, BinaryIO]) -> Optional[str]:
-    """Extract the proposal code from a proposal file."""
+    """
+    Extract the proposal code from a proposal file.
+
+    Only the start tag of the root element of Proposal.xml is parsed; the rest of
+    the file is never read.
+    """
     if not zipfile.is_zipfile(proposal_zip):
         raise ValueError("The file supplied is not a zip file")
 
@@ -18,8 +23,8 @@ def get_proposal_code(proposal_zip: Union[str, BinaryIO]) -> Optional[str]:
     except KeyError:
         raise KeyError("The zip file contains no file Proposal.xml.") from None
 
-    tree = parse(file)
-    proposal = tree.getroot()
+    with file:
+        _, proposal = next(iter(iterparse(file, events=("start",))))
     if "code" not in proposal.attrib:
         raise ValueError("No proposal code supplied in the file Proposal.xml.")
 
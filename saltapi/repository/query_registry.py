@@ -0,0 +1,160 @@
+"""A registry of the SQL statements used by the repositories."""
+import bisect
+import dataclasses
+import time
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import databases
+from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
+
+from saltapi.repository.database import database
+
+# Upper bounds (in seconds) of the buckets of the latency histograms. The last
+# bucket has no upper bound.
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5)
+
+
+@dataclasses.dataclass(frozen=True)
+class Statement:
+    """A named SQL statement."""
+
+    name: str
+    sql: str
+    clause: TextClause
+
+
+@dataclasses.dataclass(frozen=True)
+class LatencyHistogram:
+    """
+    A histogram of the latencies of a statement.
+
+    The counts are per bucket. The i-th bucket contains the latencies less than or
+    equal to the i-th bucket bound and greater than the previous bound.
+    """
+
+    name: str
+    bucket_bounds: Tuple[float, ...]
+    counts: Tuple[int, ...]
+    total_seconds: float
+
+    @property
+    def count(self) -> int:
+        """Return the number of executions."""
+        return sum(self.counts)
+
+    @property
+    def mean_seconds(self) -> float:
+        """Return the mean latency."""
+        return self.total_seconds / self.count if self.count else 0
+
+    def quantile_bound(self, q: float) -> float:
+        """
+        Return the upper bound of the bucket containing the quantile q.
+
+        Infinity is returned if the quantile lies in the last bucket.
+        """
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.bucket_bounds + (float("inf"),), self.counts):
+            cumulative += count
+            if cumulative >= rank and cumulative > 0:
+                return bound
+        return float("inf")
+
+
+class QueryRegistry:
+    """
+    A registry of named SQL statements.
+
+    Statements are declared once with the register method, which parses them into
+    SQLAlchemy text clauses. They are then executed by name, and the latency of
+    every execution is recorded in a histogram for the statement.
+
+    The aiomysql driver only supports MySQL's text protocol, so statements cannot be
+    prepared on the database server.
+    """
+
+    def __init__(
+        self,
+        db: databases.Database,
+        bucket_bounds: Tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self._database = db
+        self.bucket_bounds = bucket_bounds
+        self._statements: Dict[str, Statement] = {}
+        self._counts: Dict[str, List[int]] = {}
+        self._total_seconds: Dict[str, float] = {}
+
+    def register(self, name: str, sql: str) -> Statement:
+        """Register an SQL statement with a unique name."""
+        if name in self._statements:
+            raise ValueError(f"A statement is registered already as {name}.")
+        statement = Statement(name=name, sql=sql, clause=text(sql))
+        self._statements[name] = statement
+        self._counts[name] = [0] * (len(self.bucket_bounds) + 1)
+        self._total_seconds[name] = 0
+        return statement
+
+    def statement(self, name: str) -> Statement:
+        """Return the statement registered with a name."""
+        try:
+            return self._statements[name]
+        except KeyError:
+            raise KeyError(f"No statement is registered as {name}.") from None
+
+    async def fetch_all(
+        self, name: str, values: Optional[Mapping[str, Any]] = None
+    ) -> List[Mapping]:
+        """Execute a registered query and return all rows."""
+        start = time.perf_counter()
+        try:
+            return await self._database.fetch_all(query=self._bind(name, values))
+        finally:
+            self._record(name, time.perf_counter() - start)
+
+    async def fetch_one(
+        self, name: str, values: Optional[Mapping[str, Any]] = None
+    ) -> Optional[Mapping]:
+        """Execute a registered query and return the first row."""
+        start = time.perf_counter()
+        try:
+            return await self._database.fetch_one(query=self._bind(name, values))
+        finally:
+            self._record(name, time.perf_counter() - start)
+
+    async def execute(
+        self, name: str, values: Optional[Mapping[str, Any]] = None
+    ) -> Any:
+        """Execute a registered statement."""
+        start = time.perf_counter()
+        try:
+            return await self._database.execute(query=self._bind(name, values))
+        finally:
+            self._record(name, time.perf_counter() - start)
+
+    def latencies(self) -> Dict[str, LatencyHistogram]:
+        """Return the latency histograms of all registered statements."""
+        return {
+            name: LatencyHistogram(
+                name=name,
+                bucket_bounds=self.bucket_bounds,
+                counts=tuple(self._counts[name]),
+                total_seconds=self._total_seconds[name],
+            )
+            for name in self._statements
+        }
+
+    def _bind(self, name: str, values: Optional[Mapping[str, Any]]) -> TextClause:
+        clause = self.statement(name).clause
+        return clause.bindparams(**values) if values else clause
+
+    def _record(self, name: str, seconds: float) -> None:
+        counts = self._counts.get(name)
+        if counts is None:
+            return
+        counts[bisect.bisect_left(self.bucket_bounds, seconds)] += 1
+        self._total_seconds[name] += seconds
+
+
+query_registry = QueryRegistry(database)
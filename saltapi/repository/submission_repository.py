@@ -1,16 +1,132 @@
 """Database access for submission related content."""
+import bisect
 import dataclasses
 import enum
+import functools
 import os
-from datetime import datetime
-from typing import List
+from datetime import datetime, tzinfo
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+)
 import logging
 from pytz import timezone
 
-from saltapi.repository.database import database
+from saltapi.repository.query_registry import query_registry
+from saltapi.util.enum_lookup import EnumLookup
 
 logger = logging.getLogger(__name__)
 
+# The timezone of the datetimes stored in the database.
+DATABASE_TIMEZONE = timezone(os.environ["DATABASE_TIMEZONE"])
+
+# Default maximum number of log entries read with a single query.
+MAX_LOG_ENTRIES = 100000
+
+# Maximum number of submission identifiers for which the database id is cached.
+SUBMISSION_ID_CACHE_SIZE = 1000
+
+# Cache of database ids for submission identifiers. Identifiers never change, so
+# cached ids don't become stale.
+_submission_ids: Dict[str, int] = {}
+
+# Numbers of submissions for which a statement for reading new log entries has been
+# registered.
+_new_log_entries_statement_sizes: Set[int] = set()
+
+query_registry.register(
+    "find_submission_status",
+    """
+SELECT SubmissionStatus
+FROM SubmissionStatus status
+JOIN Submission s ON status.SubmissionStatus_Id=s.SubmissionStatus_Id
+WHERE s.Identifier = :identifier
+    """,
+)
+
+query_registry.register(
+    "find_submission_log_entries",
+    """
+SELECT SubmissionLogEntryNumber, SubmissionMessageType, Message, LoggedAt
+FROM SubmissionLogEntry sle
+JOIN Submission s ON sle.Submission_Id = s.Submission_Id
+JOIN SubmissionMessageType smt
+               ON sle.SubmissionMessageType_Id = smt.SubmissionMessageType_Id
+WHERE s.Identifier = :identifier
+ORDER BY sle.SubmissionLogEntryNumber
+LIMIT :skip, 100000
+    """,
+)
+
+_SUBMISSION_PROGRESS_QUERY = """
+SELECT s.Submission_Id,
+       status.SubmissionStatus,
+       sle.SubmissionLogEntryNumber,
+       smt.SubmissionMessageType,
+       sle.Message,
+       sle.LoggedAt
+FROM Submission s
+JOIN SubmissionStatus status ON s.SubmissionStatus_Id = status.SubmissionStatus_Id
+LEFT JOIN SubmissionLogEntry sle
+          ON sle.Submission_Id = s.Submission_Id
+             AND sle.SubmissionLogEntryNumber > :after_entry_number
+LEFT JOIN SubmissionMessageType smt
+          ON sle.SubmissionMessageType_Id = smt.SubmissionMessageType_Id
+WHERE {condition}
+ORDER BY sle.SubmissionLogEntryNumber
+LIMIT :row_limit
+"""
+
+query_registry.register(
+    "find_submission_progress_by_identifier",
+    _SUBMISSION_PROGRESS_QUERY.format(condition="s.Identifier = :identifier"),
+)
+
+query_registry.register(
+    "find_submission_progress_by_id",
+    _SUBMISSION_PROGRESS_QUERY.format(condition="s.Submission_Id = :submission_id"),
+)
+
+query_registry.register(
+    "find_submission_states",
+    """
+SELECT s.Identifier,
+       status.SubmissionStatus,
+       (SELECT MAX(sle.SubmissionLogEntryNumber)
+        FROM SubmissionLogEntry sle
+        WHERE sle.Submission_Id = s.Submission_Id)
+FROM Submission s
+JOIN SubmissionStatus status ON s.SubmissionStatus_Id = status.SubmissionStatus_Id
+WHERE s.Identifier IN :identifiers
+    """,
+)
+
+# A query for the new log entries of a single submission. The queries for all
+# submissions of a poll are combined with UNION ALL, so that every submission is
+# read from its own entry number and has its own row limit.
+_NEW_LOG_ENTRIES_QUERY = """
+(SELECT s.Identifier,
+        sle.SubmissionLogEntryNumber,
+        smt.SubmissionMessageType,
+        sle.Message,
+        sle.LoggedAt
+ FROM SubmissionLogEntry sle
+ JOIN Submission s ON sle.Submission_Id = s.Submission_Id
+ JOIN SubmissionMessageType smt
+                ON sle.SubmissionMessageType_Id = smt.SubmissionMessageType_Id
+ WHERE s.Identifier = :identifier_{i}
+       AND sle.SubmissionLogEntryNumber > :after_entry_number_{i}
+ ORDER BY sle.SubmissionLogEntryNumber
+ LIMIT :row_limit)
+"""
+
 
 class SubmissionStatus(enum.Enum):
     """A submission status."""
@@ -22,11 +138,10 @@ class SubmissionStatus(enum.Enum):
     @staticmethod
     def from_value(value: str) -> "SubmissionStatus":
         """Return the SubmissionStatus with a given value."""
-        for status in SubmissionStatus:
-            if status.value == value:
-                return status
-        logger.error(msg=f"Unknown submission status value: {value}")
-        raise ValueError(f"Unknown submission status value: {value}")
+        return _submission_statuses.by_value(value)
+
+
+_submission_statuses = EnumLookup(SubmissionStatus, "submission status value")
 
 
 class LogMessageType(enum.Enum):
@@ -39,17 +154,24 @@ class LogMessageType(enum.Enum):
     @staticmethod
     def from_value(value: str) -> "LogMessageType":
         """Return the LogMessageType with a given value."""
-        for lmt in LogMessageType:
-            if lmt.value == value:
-                return lmt
-        logger.error(msg=f"Unknown log message type value: {value}")
-        raise ValueError(f"Unknown log message type value: {value}")
+        return _log_message_types.by_value(value)
+
+
+_log_message_types = EnumLookup(LogMessageType, "log message type value")
 
 
 @dataclasses.dataclass(frozen=True)
 class SubmissionLogEntry:
     """An entry in a submission log."""
 
+    __slots__ = (
+        "submission_identifier",
+        "entry_number",
+        "message_type",
+        "message",
+        "logged_at",
+    )
+
     submission_identifier: str
     entry_number: int
     message_type: LogMessageType
@@ -57,20 +179,163 @@ class SubmissionLogEntry:
     logged_at: datetime
 
 
+class SubmissionLog(Sequence[SubmissionLogEntry]):
+    """
+    Log entries of a submission, stored column by column.
+
+    The entries must be appended in the order of their entry numbers. The log
+    stores the submission identifier once and the entry numbers, message types,
+    messages and naive datetimes (in the database timezone) in one list each, so
+    that no object is created per entry. Indexing the log creates a
+    SubmissionLogEntry for an entry, and slicing it returns a new log.
+
+    Use the columns and the timestamps method to process many entries without
+    creating SubmissionLogEntry instances.
+    """
+
+    __slots__ = (
+        "submission_identifier",
+        "entry_numbers",
+        "message_types",
+        "messages",
+        "logged_at",
+    )
+
+    def __init__(self, submission_identifier: str):
+        self.submission_identifier = submission_identifier
+        self.entry_numbers: List[int] = []
+        self.message_types: List[LogMessageType] = []
+        self.messages: List[str] = []
+        self.logged_at: List[datetime] = []
+
+    def append(
+        self,
+        entry_number: int,
+        message_type: LogMessageType,
+        message: str,
+        logged_at: datetime,
+    ) -> None:
+        """Add an entry with a naive datetime in the database timezone."""
+        self.entry_numbers.append(entry_number)
+        self.message_types.append(message_type)
+        self.messages.append(message)
+        self.logged_at.append(logged_at)
+
+    def __len__(self) -> int:
+        """Return the number of entries."""
+        return len(self.entry_numbers)
+
+    def __getitem__(self, index: Any) -> Any:
+        """Return an entry or, for a slice, a new log."""
+        if isinstance(index, slice):
+            log = SubmissionLog(self.submission_identifier)
+            log.entry_numbers = self.entry_numbers[index]
+            log.message_types = self.message_types[index]
+            log.messages = self.messages[index]
+            log.logged_at = self.logged_at[index]
+            return log
+        return SubmissionLogEntry(
+            submission_identifier=self.submission_identifier,
+            entry_number=self.entry_numbers[index],
+            message_type=self.message_types[index],
+            message=self.messages[index],
+            logged_at=localize(self.logged_at[index]),
+        )
+
+    def __iter__(self) -> Iterator[SubmissionLogEntry]:
+        """Iterate over the entries."""
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def last_entry_number(self) -> Optional[int]:
+        """Return the entry number of the last entry, if there is one."""
+        return self.entry_numbers[-1] if self.entry_numbers else None
+
+    def after(self, entry_number: int) -> "SubmissionLog":
+        """Return the entries after an entry number."""
+        start = bisect.bisect_right(self.entry_numbers, entry_number)
+        return self[start:]
+
+    def up_to(self, entry_number: int) -> "SubmissionLog":
+        """Return the entries up to and including an entry number."""
+        return self[: bisect.bisect_right(self.entry_numbers, entry_number)]
+
+    def timestamps(self) -> List[datetime]:
+        """Return the timezone-aware datetimes of the entries."""
+        return [localize(t) for t in self.logged_at]
+
+
+@dataclasses.dataclass(frozen=True)
+class SubmissionProgress:
+    """
+    The status of a submission and the log entries since the last update.
+
+    more_log_entries is True if the log entries have been limited and further log
+    entries exist already.
+    """
+
+    submission_identifier: str
+    status: SubmissionStatus
+    log_entries: SubmissionLog
+    more_log_entries: bool = False
+
+
+@functools.lru_cache(maxsize=1024)
+def _database_tzinfo(minute: datetime) -> tzinfo:
+    return DATABASE_TIMEZONE.localize(minute).tzinfo
+
+
+@dataclasses.dataclass(frozen=True)
+class SubmissionState:
+    """
+    The status of a submission and the number of its last log entry.
+
+    The last entry number is 0 if nothing has been logged for the submission.
+    """
+
+    submission_identifier: str
+    status: SubmissionStatus
+    last_entry_number: int
+
+
+def localize(t: datetime) -> datetime:
+    """
+    Make a naive datetime in the database timezone timezone-aware.
+
+    Localizing with pytz is slow, so the timezone information is cached for every
+    minute. Timezone transitions happen at full minutes.
+    """
+    return t.replace(tzinfo=_database_tzinfo(t.replace(second=0, microsecond=0)))
+
+
+def _decode_log_entries(
+    submission_identifier: str, rows: Iterable[Sequence[Any]], first_column: int
+) -> SubmissionLog:
+    """
+    Decode the log entry columns of database rows.
+
+    The entry number, message type, message and datetime must be in consecutive
+    columns, starting at the given first column. Rows without an entry number are
+    ignored.
+    """
+    log = SubmissionLog(submission_identifier)
+    from_value = LogMessageType.from_value
+    append = log.append
+    i = first_column
+    for row in rows:
+        entry_number = row[i]
+        if entry_number is not None:
+            append(entry_number, from_value(row[i + 1]), row[i + 2], row[i + 3])
+    return log
+
+
 async def find_submission_status(submission_identifier: str) -> SubmissionStatus:
     """Get the current status of a submission."""
-    query = """
-SELECT SubmissionStatus
-FROM SubmissionStatus status
-JOIN Submission s ON status.SubmissionStatus_Id=s.SubmissionStatus_Id
-WHERE s.Identifier = :identifier
-    """
     values = {"identifier": submission_identifier}
-    row = await database.fetch_one(query=query, values=values)
+    row = await query_registry.fetch_one("find_submission_status", values)
     if not row:
-        logger.error(
-            msg=f"Unknown submission identifier: {submission_identifier}"
-        )
+        logger.error(msg=f"Unknown submission identifier: {submission_identifier}")
         raise ValueError(f"Unknown submission identifier: {submission_identifier}")
     return SubmissionStatus.from_value(row[0])
 
@@ -78,28 +343,139 @@ WHERE s.Identifier = :identifier
 async def find_submission_log_entries(
     submission_identifier: str,
     skip: int,
-) -> List[SubmissionLogEntry]:
+) -> SubmissionLog:
     """Get the entries in the submission log for a submission."""
-    query = """
-SELECT SubmissionLogEntryNumber, SubmissionMessageType, Message, LoggedAt
-FROM SubmissionLogEntry sle
-JOIN Submission s ON sle.Submission_Id = s.Submission_Id
-JOIN SubmissionMessageType smt
-               ON sle.SubmissionMessageType_Id = smt.SubmissionMessageType_Id
-WHERE s.Identifier = :identifier
-ORDER BY sle.SubmissionLogEntryNumber
-LIMIT :skip, 100000
-    """
     values = {"identifier": submission_identifier, "skip": skip}
-    rows = await database.fetch_all(query=query, values=values)
-    database_timezone = timezone(os.environ["DATABASE_TIMEZONE"])
-    return [
-        SubmissionLogEntry(
-            submission_identifier=submission_identifier,
-            entry_number=row[0],
-            message_type=LogMessageType.from_value(row[1]),
-            message=row[2],
-            logged_at=database_timezone.localize(row[3]),
+    rows = await query_registry.fetch_all("find_submission_log_entries", values)
+    return _decode_log_entries(submission_identifier, rows, 0)
+
+
+async def find_submission_progress(
+    submission_identifier: str,
+    after_entry_number: int,
+    max_log_entries: int = MAX_LOG_ENTRIES,
+) -> SubmissionProgress:
+    """
+    Get the status of a submission and its log entries after a given entry number.
+
+    The status and log entries are read with a single query. The log entries are
+    selected by their entry number rather than an offset, so that the cost of the
+    query doesn't grow with the length of the log.
+
+    At most max_log_entries log entries are returned. If there are more, the
+    more_log_entries flag of the returned progress is set, and the remaining entries
+    can be read by calling this function with the last returned entry number.
+    """
+    submission_id = _submission_ids.get(submission_identifier)
+    if submission_id is None:
+        statement = "find_submission_progress_by_identifier"
+        values = {"identifier": submission_identifier}
+    else:
+        statement = "find_submission_progress_by_id"
+        values = {"submission_id": submission_id}
+    values["after_entry_number"] = after_entry_number
+    # an additional row reveals whether there are more log entries
+    values["row_limit"] = max_log_entries + 1
+    rows = await query_registry.fetch_all(statement, values)
+    if not rows:
+        logger.error(msg=f"Unknown submission identifier: {submission_identifier}")
+        raise ValueError(f"Unknown submission identifier: {submission_identifier}")
+
+    if submission_id is None:
+        _cache_submission_id(submission_identifier, rows[0][0])
+
+    more_log_entries = len(rows) > max_log_entries
+    return SubmissionProgress(
+        submission_identifier=submission_identifier,
+        status=SubmissionStatus.from_value(rows[0][1]),
+        log_entries=_decode_log_entries(
+            submission_identifier, rows[:max_log_entries], 2
+        ),
+        more_log_entries=more_log_entries,
+    )
+
+
+async def find_submission_states(
+    submission_identifiers: Iterable[str],
+) -> Dict[str, SubmissionState]:
+    """
+    Get the status and last log entry number of several submissions.
+
+    The states of all submissions are read with a single query. Unknown submission
+    identifiers are missing from the returned dictionary.
+    """
+    identifiers = tuple(submission_identifiers)
+    if not identifiers:
+        return {}
+    rows = await query_registry.fetch_all(
+        "find_submission_states", {"identifiers": identifiers}
+    )
+    return {
+        row[0]: SubmissionState(
+            submission_identifier=row[0],
+            status=SubmissionStatus.from_value(row[1]),
+            last_entry_number=row[2] or 0,
         )
         for row in rows
-    ]
+    }
+
+
+async def find_new_log_entries(
+    after_entry_numbers: Mapping[str, int],
+    max_log_entries: int = MAX_LOG_ENTRIES,
+) -> Dict[str, SubmissionLog]:
+    """
+    Get the log entries of several submissions after given entry numbers.
+
+    The keys of after_entry_numbers are submission identifiers, and the values are
+    the entry numbers after which the log entries are required. The log entries of
+    all submissions are read with a single query, in which every submission has its
+    own entry number. At most max_log_entries log entries are read per submission,
+    so that a submission may get fewer log entries than there are.
+    """
+    if not after_entry_numbers:
+        return {}
+    statement_size = _new_log_entries_statement_size(len(after_entry_numbers))
+    values: Dict[str, Any] = {"row_limit": max_log_entries}
+    # unused placeholders get a NULL identifier, which matches no submission
+    submissions = list(after_entry_numbers.items())
+    submissions += [(None, 0)] * (statement_size - len(submissions))
+    for i, (identifier, after_entry_number) in enumerate(submissions):
+        values[f"identifier_{i}"] = identifier
+        values[f"after_entry_number_{i}"] = after_entry_number
+    rows = await query_registry.fetch_all(
+        f"find_new_log_entries_{statement_size}", values
+    )
+    logs = {identifier: SubmissionLog(identifier) for identifier in after_entry_numbers}
+    from_value = LogMessageType.from_value
+    for identifier, entry_number, message_type, message, logged_at in rows:
+        logs[identifier].append(
+            entry_number, from_value(message_type), message, logged_at
+        )
+    return logs
+
+
+def _new_log_entries_statement_size(submissions: int) -> int:
+    """
+    Return the number of submissions in the statement for reading new log entries.
+
+    Statements are registered for powers of 2 only, so that the number of registered
+    statements remains small. The statement is registered if need be.
+    """
+    size = 1 << (submissions - 1).bit_length()
+    name = f"find_new_log_entries_{size}"
+    if size not in _new_log_entries_statement_sizes:
+        query_registry.register(
+            name,
+            "UNION ALL".join(_NEW_LOG_ENTRIES_QUERY.format(i=i) for i in range(size))
+            + "ORDER BY Identifier, SubmissionLogEntryNumber\n",
+        )
+        _new_log_entries_statement_sizes.add(size)
+    return size
+
+
+def _cache_submission_id(submission_identifier: str, submission_id: int) -> None:
+    """Cache the database id of a submission, evicting the oldest id if need be."""
+    if len(_submission_ids) >= SUBMISSION_ID_CACHE_SIZE:
+        del _submission_ids[next(iter(_submission_ids))]
+    _submission_ids[submission_identifier] = submission_id
@@ -1,14 +1,99 @@
 """Access user  details from the database."""
 
 import dataclasses
-from typing import List, Optional
+import enum
+import os
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
 
-from saltapi.repository.database import database
+from saltapi.repository.query_registry import query_registry
+from saltapi.util.cache import TTLCache
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "1000"))
+
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", "60"))
+
+PROPOSAL_ROLE_CACHE_SIZE = int(os.environ.get("PROPOSAL_ROLE_CACHE_SIZE", "1000"))
+
+PROPOSAL_ROLE_CACHE_TTL = float(os.environ.get("PROPOSAL_ROLE_CACHE_TTL", "30"))
+
+query_registry.register(
+    "find_user_by_credentials",
+    """
+SELECT PiptUser_Id
+FROM PiptUser
+WHERE Username=:username AND Password=MD5(:password)
+    """,
+)
+
+query_registry.register(
+    "find_user_by_id",
+    """
+SELECT
+    u.PiptUser_Id,
+    Username,
+    FirstName,
+    Surname,
+    Email
+FROM PiptUser AS u
+    JOIN Investigator AS i using (Investigator_Id)
+WHERE u.PiptUser_Id = :user_id
+    """,
+)
+
+query_registry.register(
+    "find_users_by_ids",
+    """
+SELECT
+    u.PiptUser_Id,
+    Username,
+    FirstName,
+    Surname,
+    Email
+FROM PiptUser AS u
+    JOIN Investigator AS i using (Investigator_Id)
+WHERE u.PiptUser_Id IN :user_ids
+    """,
+)
+
+query_registry.register(
+    "find_proposal_roles",
+    """
+SELECT pu.PiptUser_Id = prc.Leader_Id,
+       pu.PiptUser_Id = prc.Contact_Id,
+       EXISTS (SELECT 1
+               FROM ProposalInvestigator AS pi
+                   JOIN Investigator AS i ON pi.Investigator_Id = i.Investigator_Id
+               WHERE pi.ProposalCode_Id = pc.ProposalCode_Id
+                     AND i.PiptUser_Id = pu.PiptUser_Id)
+FROM ProposalCode AS pc
+    JOIN ProposalContact AS prc ON prc.ProposalCode_Id = pc.ProposalCode_Id
+    JOIN PiptUser AS pu ON pu.Username = :username
+WHERE pc.Proposal_Code = :proposal_code
+    """,
+)
+
+query_registry.register(
+    "find_user_grants",
+    """
+SELECT pus.PiptUser_Id, ps.PiptSetting_Name
+FROM PiptUserSetting AS pus
+    JOIN PiptSetting AS ps ON pus.PiptSetting_Id = ps.PiptSetting_Id
+WHERE pus.Value > 0
+    """,
+)
+
+
+class ProposalRole(enum.Enum):
+    """A role a user may have on a proposal."""
+
+    INVESTIGATOR = "INVESTIGATOR"
+    PRINCIPAL_CONTACT = "PRINCIPAL_CONTACT"
+    PRINCIPAL_INVESTIGATOR = "PRINCIPAL_INVESTIGATOR"
+
 
 @dataclasses.dataclass(frozen=True)
 class User:
@@ -39,14 +124,9 @@ async def find_user_by_credentials(username: str, password: str) -> Optional[Use
     Returns
     -------
     None.
-    """
-    query = """
-SELECT PiptUser_Id
-FROM PiptUser
-WHERE Username=:username AND Password=MD5(:password)
     """
     values = {"username": username, "password": password}
-    result = await database.fetch_one(query=query, values=values)
+    result = await query_registry.fetch_one("find_user_by_credentials", values)
     if not result:
         return None
     return await find_user_by_id(result[0])
@@ -67,35 +147,100 @@ async def find_user_by_id(user_id: int) -> Optional[User]:
     -------
         The user.
     """
-    sql = """
-SELECT
-    Username,
-    FirstName,
-    Surname,
-    Email
-FROM PiptUser AS u
-    JOIN Investigator AS i using (Investigator_Id)
-WHERE u.PiptUser_Id = :user_id
-    """
     values = {"user_id": user_id}
-    result = await database.fetch_one(query=sql, values=values)
+    result = await query_registry.fetch_one("find_user_by_id", values)
     if not result:
         return None
+    return _user_from_row(result)
+
+
+async def find_users_by_ids(user_ids: Iterable[int]) -> Dict[int, User]:
+    """
+    Find the users with given user ids.
+
+    All users are read with a single query. User ids which don't exist are missing
+    from the returned dictionary.
+
+    Parameters
+    ----------
+    user_ids
+        PIPT user ids.
+
+    Returns
+    -------
+        A dictionary of user ids and users.
+    """
+    ids = tuple(user_ids)
+    if not ids:
+        return {}
+    # The MySQL driver expands a tuple into a parenthesized list of values.
+    values = {"user_ids": ids}
+    results = await query_registry.fetch_all("find_users_by_ids", values)
+    return {result[0]: _user_from_row(result) for result in results}
 
+
+def _user_from_row(row: Mapping) -> User:
+    # the row has the columns of the find_user_by_id and find_users_by_ids queries
     return User(
-        id=user_id,
-        username=result[0],
-        first_name=result[1],
-        last_name=result[2],
-        email=result[3],
+        id=row[0],
+        username=row[1],
+        first_name=row[2],
+        last_name=row[3],
+        email=row[4],
         roles=[],  # TODO: get user roles
         permissions=[],  # TODO: get user permissions
     )
 
 
-async def is_user_pi(username: str, proposal_code: str) -> bool:
+user_cache: "TTLCache[int, User]" = TTLCache(
+    max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL
+)
+
+
+async def find_cached_user_by_id(user_id: int) -> Optional[User]:
     """
-    Check if the user is the Principal Investigator of a proposal.
+    Find the user with a given user id, using the user cache.
+
+    The user is only read from the database if it isn't cached already. Concurrent
+    calls for the same user id share a single database query. Use
+    user_cache.invalidate to remove a user from the cache after changing their
+    details.
+
+    Parameters
+    ----------
+    user_id
+        A PIPT user id.
+
+    Returns
+    -------
+        The user.
+    """
+    return await user_cache.get_or_load(user_id, lambda: find_user_by_id(user_id))
+
+
+async def find_user_grants() -> List[Tuple[int, str]]:
+    """
+    Find the settings granted to all users.
+
+    All grants are read with a single query.
+
+    Returns
+    -------
+    A list of tuples of a PIPT user id and the name of a setting granted to the user.
+
+    """
+    results = await query_registry.fetch_all("find_user_grants")
+    return [(int(result[0]), result[1]) for result in results]
+
+
+async def find_proposal_roles(
+    username: str, proposal_code: str
+) -> FrozenSet[ProposalRole]:
+    """
+    Find the roles a user has on a proposal.
+
+    All roles are read with a single query. An empty set is returned if the user has
+    no role on the proposal or if the user or proposal doesn't exist.
 
     Parameters
     ----------
@@ -106,26 +251,33 @@ async def is_user_pi(username: str, proposal_code: str) -> bool:
 
     Returns
     -------
-    True if the user is The Principal Investigator else False
+    The user's roles on the proposal.
 
     """
-    query = """
-SELECT Username FROM Proposal as p
-    JOIN ProposalCode as pc ON p.ProposalCode_Id = pc.ProposalCode_Id
-    JOIN ProposalContact as prc ON prc.ProposalCode_Id = pc.ProposalCode_Id
-    JOIN PiptUser as pu ON pu.PiptUser_Id = prc.Leader_Id
-WHERE Proposal_Code = :proposal_code
-    """
-    values = {"proposal_code": proposal_code}
-    result = await database.fetch_one(query=query, values=values)
-    if result and result[0] == username:
-        return True
-    return False
+    values = {"username": username, "proposal_code": proposal_code}
+    result = await query_registry.fetch_one("find_proposal_roles", values)
+    if not result:
+        return frozenset()
+    flags = (
+        (ProposalRole.PRINCIPAL_INVESTIGATOR, result[0]),
+        (ProposalRole.PRINCIPAL_CONTACT, result[1]),
+        (ProposalRole.INVESTIGATOR, result[2]),
+    )
+    return frozenset(role for role, flag in flags if flag)
 
 
-async def is_user_pc(username: str, proposal_code: str) -> bool:
+proposal_role_cache: "TTLCache[Tuple[str, str], FrozenSet[ProposalRole]]" = TTLCache(
+    max_size=PROPOSAL_ROLE_CACHE_SIZE, ttl=PROPOSAL_ROLE_CACHE_TTL
+)
+
+
+async def find_cached_proposal_roles(
+    username: str, proposal_code: str
+) -> FrozenSet[ProposalRole]:
     """
-    Check if the user is the Principal Contact of a proposal.
+    Find the roles a user has on a proposal, using the proposal role cache.
+
+    The roles are only read from the database if they aren't cached already.
 
     Parameters
     ----------
@@ -136,18 +288,10 @@ async def is_user_pc(username: str, proposal_code: str) -> bool:
 
     Returns
     -------
-    True if the user is the Principal Contact else False
+    The user's roles on the proposal.
 
     """
-    query = """
-SELECT Username FROM Proposal as p
-    JOIN ProposalCode as pc ON p.ProposalCode_Id = pc.ProposalCode_Id
-    JOIN ProposalContact as prc ON prc.ProposalCode_Id = pc.ProposalCode_Id
-    JOIN PiptUser as pu ON pu.PiptUser_Id = prc.Contact_Id
-WHERE Proposal_Code = :proposal_code
-    """
-    values = {"proposal_code": proposal_code}
-    result = await database.fetch_one(query=query, values=values)
-    if result and result[0] == username:
-        return True
-    return False
+    roles = await proposal_role_cache.get_or_load(
+        (username, proposal_code), lambda: find_proposal_roles(username, proposal_code)
+    )
+    return roles if roles is not None else frozenset()
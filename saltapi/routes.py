@@ -1,13 +1,16 @@
 """Non-GraphQL routes for the server."""
-import os
-
 from pydantic import BaseModel
 from starlette.requests import Request
 from starlette.responses import JSONResponse, PlainTextResponse, Response
 
+from saltapi.auth import authorization
+from saltapi.auth.authorization import Role
+from saltapi.auth.keys import rs256_public_key
 from saltapi.auth.token import create_token
 from saltapi.repository import user_repository
+from saltapi.submission.events import progress_event_stream
 from saltapi.util.error import UsageError
+from saltapi.util.stats import stats_registry
 
 
 class Credentials(BaseModel):
@@ -32,7 +35,55 @@ async def token(request: Request) -> Response:
 
 
 async def public_key(request: Request) -> Response:
-    """Return the public key for signing with the RS256 algorithm."""
-    with open(os.environ["RS256_PUBLIC_KEY_FILE"]) as f:
-        key = f.read()
-    return PlainTextResponse(key)
+    """
+    Return the public key for signing with the RS256 algorithm.
+
+    The key is served from memory. Clients may cache it for as long as the server
+    waits before checking the key file for changes, and they can revalidate it with
+    its entity tag.
+    """
+    etag = rs256_public_key.etag
+    headers = {
+        "Cache-Control": f"public, max-age={int(rs256_public_key.reload_interval)}",
+        "ETag": etag,
+    }
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status_code=304, headers=headers)
+    return PlainTextResponse(rs256_public_key.pem.decode("utf-8"), headers=headers)
+
+
+async def submission_progress(request: Request) -> Response:
+    """
+    Stream the progress of a submission as server-sent events.
+
+    A client resuming the stream sends the id of the last event it has received as
+    the Last-Event-ID header, and only gets the log entries it hasn't seen. If there
+    are none and the submission has finished, a 204 (No Content) response tells the
+    client to stop reconnecting.
+    """
+    last_event_id = request.headers.get("Last-Event-ID", "0") or "0"
+    try:
+        after_entry = int(last_event_id)
+    except ValueError:
+        raise UsageError(f"Invalid Last-Event-ID header: {last_event_id}")
+    if after_entry < 0:
+        raise UsageError(f"Invalid Last-Event-ID header: {last_event_id}")
+    return await progress_event_stream(
+        request.path_params["submission_id"],
+        after_entry,
+        resumed="Last-Event-ID" in request.headers,
+    )
+
+
+async def stats(request: Request) -> Response:
+    """
+    Return the statistics collected by the server.
+
+    Only administrators may request the statistics.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        raise UsageError("You must be authenticated to request the statistics.", 401)
+    if Role.ADMINISTRATOR not in authorization.authorization_index.roles(user.id):
+        raise UsageError("You are not allowed to request the statistics.", 403)
+    return JSONResponse(await stats_registry.collect())
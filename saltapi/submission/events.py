@@ -0,0 +1,170 @@
+"""Server-sent events for the progress of a submission."""
+import asyncio
+import json
+import os
+from typing import AsyncIterator, Optional
+
+from starlette.responses import Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from saltapi.repository.submission_repository import SubmissionProgress
+from saltapi.submission.progress import (
+    FINAL_STATUSES,
+    SubmissionProgressHub,
+    progress_hub,
+)
+from saltapi.util.error import UsageError
+
+SUBMISSION_PROGRESS_HEARTBEAT_INTERVAL = float(
+    os.environ.get("SUBMISSION_PROGRESS_HEARTBEAT_INTERVAL", "15")
+)
+
+_HEARTBEAT = b": heartbeat\n\n"
+
+
+class EventStreamResponse(StreamingResponse):
+    """
+    A streaming response for server-sent events.
+
+    The response stops streaming when the client disconnects. Unlike Starlette's
+    StreamingResponse, it wraps the coroutines it waits for in tasks, as
+    asyncio.wait doesn't accept coroutines from Python 3.11 onwards.
+    """
+
+    media_type = "text/event-stream"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Stream the events until they are exhausted or the client disconnects."""
+        tasks = [
+            asyncio.ensure_future(self.stream_response(send)),
+            asyncio.ensure_future(self.listen_for_disconnect(receive)),
+        ]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+        # the cancelled stream must have unsubscribed before the response finishes
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for task in done:
+            task.result()
+
+
+def progress_event(progress: SubmissionProgress, latest_entry: int) -> bytes:
+    """
+    Encode a progress update as a server-sent event.
+
+    The event data has the same fields as the SubmissionProgress GraphQL type. The
+    event id is the number of the latest log entry, so that a reconnecting client
+    sends it back as its Last-Event-ID header.
+    """
+    log = progress.log_entries
+    data = {
+        "submissionId": progress.submission_identifier,
+        "logEntries": [
+            {
+                "messageType": message_type.name,
+                "message": message,
+                "timestamp": t.isoformat(),
+            }
+            for message_type, message, t in zip(
+                log.message_types, log.messages, log.timestamps()
+            )
+        ],
+        "status": progress.status.name,
+        "latestEntry": latest_entry,
+    }
+    return (
+        f"id: {latest_entry}\n"
+        f"event: progress\n"
+        f"data: {json.dumps(data, separators=(',', ':'))}\n\n"
+    ).encode("utf-8")
+
+
+def error_event(message: str) -> bytes:
+    """Encode an error as a server-sent event."""
+    return f"event: error\ndata: {json.dumps({'detail': message})}\n\n".encode("utf-8")
+
+
+async def _progress_events(
+    first: SubmissionProgress,
+    updates: AsyncIterator[SubmissionProgress],
+    after_entry: int,
+    heartbeat_interval: float,
+) -> AsyncIterator[bytes]:
+    """
+    Generate the events for the progress updates of a submission.
+
+    A comment is sent whenever there has been no update for the heartbeat interval,
+    so that proxies don't close the connection.
+    """
+    latest_entry = after_entry
+    next_update: Optional["asyncio.Future[SubmissionProgress]"] = None
+    progress = first
+    try:
+        while True:
+            if len(progress.log_entries):
+                latest_entry = progress.log_entries.entry_numbers[-1]
+            yield progress_event(progress, latest_entry)
+
+            # The update is awaited in a separate task, as cancelling the wait for
+            # the next heartbeat must not cancel the subscription.
+            next_update = asyncio.ensure_future(updates.__anext__())
+            while True:
+                done, _ = await asyncio.wait(
+                    {next_update}, timeout=heartbeat_interval or None
+                )
+                if done:
+                    break
+                yield _HEARTBEAT
+            try:
+                progress = next_update.result()
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                # the polling has failed and has been logged already
+                yield error_event(str(e))
+                return
+            finally:
+                next_update = None
+    finally:
+        if next_update is not None and not next_update.done():
+            next_update.cancel()
+            try:
+                await next_update
+            except (asyncio.CancelledError, StopAsyncIteration):
+                pass
+        await updates.aclose()
+
+
+async def progress_event_stream(
+    submission_identifier: str,
+    after_entry: int = 0,
+    hub: SubmissionProgressHub = progress_hub,
+    heartbeat_interval: float = SUBMISSION_PROGRESS_HEARTBEAT_INTERVAL,
+    resumed: bool = False,
+) -> Response:
+    """
+    Return a response streaming the progress of a submission as server-sent events.
+
+    Only the log entries after after_entry are sent. The first update is received
+    before the response is returned, so that an unknown submission results in an
+    error response rather than in an empty stream.
+
+    The stream ends once the submission has failed or succeeded, and an EventSource
+    then reconnects. If a resumed stream would only repeat the final status, a
+    response with status code 204 (No Content) is returned instead, which tells the
+    client to stop reconnecting.
+    """
+    updates = hub.subscribe(submission_identifier, after_entry)
+    try:
+        first = await updates.__anext__()
+    except ValueError as e:
+        raise UsageError(str(e), 404)
+    if resumed and first.status in FINAL_STATUSES and not len(first.log_entries):
+        await updates.aclose()
+        return Response(status_code=204)
+    return EventStreamResponse(
+        _progress_events(first, updates, after_entry, heartbeat_interval),
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
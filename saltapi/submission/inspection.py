@@ -0,0 +1,197 @@
+"""Inspection of proposal files in a worker pool."""
+import asyncio
+import concurrent.futures
+import functools
+import os
+import shutil
+import tempfile
+from typing import BinaryIO, Optional, Union
+
+import logging
+
+from saltapi.repository.proposal_repository import get_proposal_code
+from saltapi.util.error import UsageError
+from saltapi.util.loop_local import LoopLocal
+
+logger = logging.getLogger(__name__)
+
+PROPOSAL_INSPECTION_EXECUTOR = os.environ.get("PROPOSAL_INSPECTION_EXECUTOR", "thread")
+
+PROPOSAL_INSPECTION_WORKERS = int(os.environ.get("PROPOSAL_INSPECTION_WORKERS", "4"))
+
+PROPOSAL_INSPECTION_TIMEOUT = float(os.environ.get("PROPOSAL_INSPECTION_TIMEOUT", "30"))
+
+
+def _spool(proposal_zip: BinaryIO, path: str) -> None:
+    position = proposal_zip.tell()
+    try:
+        proposal_zip.seek(0)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(proposal_zip, f)
+    finally:
+        proposal_zip.seek(position)
+
+
+def _get_proposal_code_from_file(proposal_zip: BinaryIO) -> Optional[str]:
+    position = proposal_zip.tell()
+    try:
+        return get_proposal_code(proposal_zip)
+    finally:
+        proposal_zip.seek(position)
+
+
+class ProposalInspector:
+    """
+    An inspector of proposal files, which does its work in a worker pool.
+
+    The executor type must be "thread" or "process". The number of inspections
+    running at the same time is limited to the number of workers; any further
+    inspections wait for a free worker. An asyncio.TimeoutError is raised if an
+    inspection (including the time spent waiting for a worker) takes longer than
+    the timeout. A worker is only freed once its inspection has finished, even if
+    the inspection has timed out.
+
+    File objects can't be passed to another process, so for a process pool the file
+    is copied to a temporary file, whose path is passed on. File paths are passed on
+    as they are. The position of a file object is the same after the inspection as
+    before.
+    """
+
+    def __init__(
+        self,
+        executor_type: str = PROPOSAL_INSPECTION_EXECUTOR,
+        max_workers: int = PROPOSAL_INSPECTION_WORKERS,
+        timeout: float = PROPOSAL_INSPECTION_TIMEOUT,
+    ):
+        if executor_type not in ("thread", "process"):
+            raise ValueError(f"Unsupported executor type: {executor_type}")
+        self.executor_type = executor_type
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor: Optional[concurrent.futures.Executor] = None
+        self._worker_slots = LoopLocal(lambda: asyncio.Semaphore(self.max_workers))
+
+    async def get_proposal_code(
+        self, proposal_zip: Union[str, BinaryIO]
+    ) -> Optional[str]:
+        """
+        Extract the proposal code from a proposal file.
+
+        See saltapi.repository.proposal_repository.get_proposal_code for details.
+        """
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + self.timeout
+        try:
+            inspection = await asyncio.wait_for(
+                self._start_inspection(proposal_zip), self.timeout
+            )
+            # the inspection keeps running if the wait for it times out
+            return await asyncio.wait_for(
+                asyncio.shield(inspection), deadline - loop.time()
+            )
+        except asyncio.TimeoutError:
+            logger.error(msg="The proposal file could not be inspected in time.")
+            raise
+
+    async def check_proposal_code(
+        self, proposal_zip: Union[str, BinaryIO], proposal_code: Optional[str]
+    ) -> None:
+        """
+        Check that a proposal file has a proposal code.
+
+        A proposal code of None means that the file must not contain a proposal
+        code. A UsageError is raised if the file isn't a valid proposal file or has
+        a different proposal code, and a UsageError with status code 503 is raised
+        if the file cannot be inspected in time.
+        """
+        try:
+            file_proposal_code = await self.get_proposal_code(proposal_zip)
+        except asyncio.TimeoutError:
+            raise UsageError(
+                "The proposal file could not be inspected in time. Please try again "
+                "later.",
+                503,
+            ) from None
+        except (KeyError, ValueError) as e:
+            raise UsageError(str(e.args[0]) if e.args else str(e)) from None
+
+        if file_proposal_code == proposal_code:
+            return
+        if proposal_code is None:
+            raise UsageError(
+                f"The proposal file contains the proposal code {file_proposal_code}, "
+                f"but no proposal code is given."
+            )
+        if file_proposal_code is None:
+            raise UsageError(
+                f"The proposal code {proposal_code} is given, but the proposal file "
+                f"contains no proposal code."
+            )
+        raise UsageError(
+            f"The proposal code {proposal_code} differs from the proposal code "
+            f"{file_proposal_code} in the proposal file."
+        )
+
+    def shutdown(self) -> None:
+        """Shut down the worker pool."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = None
+
+    async def _start_inspection(
+        self, proposal_zip: Union[str, BinaryIO]
+    ) -> "asyncio.Future[Optional[str]]":
+        """
+        Wait for a free worker and start inspecting a proposal file.
+
+        The worker is freed (and the temporary file removed) when the returned
+        future is done.
+        """
+        loop = asyncio.get_event_loop()
+        workers = self._worker_slots.get()
+        await workers.acquire()
+        spooled_path: Optional[str] = None
+
+        def free_worker() -> None:
+            workers.release()
+            if spooled_path is not None:
+                os.remove(spooled_path)
+
+        try:
+            if self.executor_type == "process" and not isinstance(proposal_zip, str):
+                fd, spooled_path = tempfile.mkstemp(suffix=".zip")
+                os.close(fd)
+                await loop.run_in_executor(None, _spool, proposal_zip, spooled_path)
+                task = functools.partial(get_proposal_code, spooled_path)
+            elif isinstance(proposal_zip, str):
+                task = functools.partial(get_proposal_code, proposal_zip)
+            else:
+                task = functools.partial(_get_proposal_code_from_file, proposal_zip)
+            inspection = loop.run_in_executor(self._get_executor(), task)
+        except BaseException:
+            free_worker()
+            raise
+
+        def finish(inspection: "asyncio.Future[Optional[str]]") -> None:
+            free_worker()
+            if not inspection.cancelled():
+                inspection.exception()  # avoid a warning if nobody waits for it
+
+        inspection.add_done_callback(finish)
+        return inspection
+
+    def _get_executor(self) -> concurrent.futures.Executor:
+        if self._executor is None:
+            if self.executor_type == "process":
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers
+                )
+            else:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="proposal-inspection",
+                )
+        return self._executor
+
+
+proposal_inspector = ProposalInspector()
@@ -0,0 +1,143 @@
+"""Streaming multipart request bodies."""
+import binascii
+import os
+from typing import AsyncIterator, Dict, List, Optional
+
+from starlette.datastructures import UploadFile
+
+from saltapi.util.error import UsageError
+
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+
+
+def _form_param(name: str, value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    escaped = escaped.replace("\r", "%0D").replace("\n", "%0A")
+    return f'{name}="{escaped}"'
+
+
+class MultipartFileUpload:
+    """
+    A multipart/form-data request body with form fields and a single file.
+
+    The body is an asynchronous iterator, which reads the file in chunks while it is
+    being sent, so that at most one chunk of the file is held in memory. If the file
+    size can be determined beforehand, the body has a Content-Length header.
+    Otherwise it is sent with chunked transfer encoding.
+
+    A UsageError is raised if the file is larger than the maximum file size. This is
+    checked before the body is sent if possible, and while it is sent otherwise.
+    """
+
+    def __init__(
+        self,
+        data: Dict[str, str],
+        file_field: str,
+        file: UploadFile,
+        max_file_size: int,
+        content_type: str = "application/octet-stream",
+        chunk_size: int = UPLOAD_CHUNK_SIZE,
+    ):
+        self.boundary = binascii.hexlify(os.urandom(16))
+        self.file = file
+        self.max_file_size = max_file_size
+        self.chunk_size = chunk_size
+        self._preamble = self._render_fields(data) + self._render_file_headers(
+            file_field, file.filename, content_type
+        )
+        self._epilogue = b"\r\n--" + self.boundary + b"--\r\n"
+        self._file_size = self._peek_file_size()
+        if self._file_size is not None and self._file_size > max_file_size:
+            raise file_too_large_error(file.filename, max_file_size)
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        """Return the Content-Type and (if known) Content-Length header."""
+        headers = {
+            "Content-Type": "multipart/form-data; boundary="
+            + self.boundary.decode("ascii")
+        }
+        if self._file_size is not None:
+            content_length = len(self._preamble) + self._file_size + len(self._epilogue)
+            headers["Content-Length"] = str(content_length)
+        return headers
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        """Generate the body, reading the file in chunks."""
+        yield self._preamble
+        size = 0
+        async for chunk in read_chunks(self.file, self.max_file_size, self.chunk_size):
+            size += len(chunk)
+            yield chunk
+        if self._file_size is not None and size != self._file_size:
+            raise ValueError("The file size has changed while it was being sent.")
+        yield self._epilogue
+
+    def _render_fields(self, data: Dict[str, str]) -> bytes:
+        boundary = self.boundary.decode("ascii")
+        parts: List[str] = []
+        for name, value in data.items():
+            parts.append(
+                f"--{boundary}\r\n"
+                f"Content-Disposition: form-data; {_form_param('name', name)}\r\n"
+                f"\r\n"
+                f"{value}\r\n"
+            )
+        return "".join(parts).encode("utf-8")
+
+    def _render_file_headers(
+        self, name: str, filename: str, content_type: str
+    ) -> bytes:
+        boundary = self.boundary.decode("ascii")
+        disposition = (
+            f"form-data; {_form_param('name', name)}; "
+            f"{_form_param('filename', filename)}"
+        )
+        return (
+            f"--{boundary}\r\n"
+            f"Content-Disposition: {disposition}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"\r\n"
+        ).encode("utf-8")
+
+    def _peek_file_size(self) -> Optional[int]:
+        try:
+            f = self.file.file
+            position = f.tell()
+            size = f.seek(0, os.SEEK_END)
+            f.seek(position)
+            return int(size)
+        except (AttributeError, OSError, ValueError):
+            return None
+
+
+async def read_chunks(
+    file: UploadFile, max_size: int, chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """
+    Read an uploaded file from its start in chunks.
+
+    Text is encoded as UTF-8. A UsageError is raised as soon as more than the maximum
+    size has been read.
+    """
+    await file.seek(0)
+    size = 0
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            return
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        size += len(chunk)
+        if size > max_size:
+            raise file_too_large_error(file.filename, max_size)
+        yield chunk
+
+
+def file_too_large_error(filename: str, max_size: int) -> UsageError:
+    """Return the error for a file larger than the maximum size."""
+    return UsageError(
+        f"The file {filename} is larger than the maximum allowed size of {max_size} "
+        f"bytes.",
+        413,
+    )
@@ -0,0 +1,67 @@
+"""Policies for the interval between consecutive database polls."""
+import abc
+
+
+class PollIntervalPolicy(abc.ABC):
+    """
+    A policy for the time to wait between consecutive polls.
+
+    A policy is stateful, so every poll loop must have its own policy instance.
+    """
+
+    @abc.abstractmethod
+    def next_interval(self, activity: bool) -> float:
+        """
+        Return the number of seconds to wait until the next poll.
+
+        The activity flag must be True if the previous poll found something new.
+        """
+        raise NotImplementedError
+
+
+class FixedIntervalPolicy(PollIntervalPolicy):
+    """A policy with the same interval between all polls."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+
+    def next_interval(self, activity: bool) -> float:
+        """Return the fixed interval."""
+        return self.interval
+
+
+class BackoffPolicy(PollIntervalPolicy):
+    """
+    A policy backing off exponentially while there is no activity.
+
+    The interval starts at the minimum interval and is multiplied by the backoff
+    factor after every poll without activity, until the maximum interval is
+    reached. It is reset to the minimum interval whenever a poll finds activity.
+    """
+
+    def __init__(
+        self, min_interval: float, max_interval: float, factor: float = 2
+    ) -> None:
+        if min_interval <= 0:
+            raise ValueError("The minimum poll interval must be positive.")
+        if max_interval < min_interval:
+            raise ValueError(
+                "The maximum poll interval must not be less than the minimum poll "
+                "interval."
+            )
+        if factor < 1:
+            raise ValueError("The backoff factor must not be less than 1.")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self._interval = min_interval
+
+    def next_interval(self, activity: bool) -> float:
+        """Return the next interval, backing off if there was no activity."""
+        if activity:
+            self._interval = self.min_interval
+            return self._interval
+
+        interval = self._interval
+        self._interval = min(self._interval * self.factor, self.max_interval)
+        return interval
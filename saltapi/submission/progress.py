@@ -0,0 +1,361 @@
+"""Shared sources of submission progress updates."""
+import asyncio
+import dataclasses
+import logging
+import math
+import os
+from typing import AsyncIterator, Callable, Dict, Optional, Set, Union
+
+from saltapi.repository import submission_repository
+from saltapi.repository.submission_repository import (
+    SubmissionLog,
+    SubmissionProgress,
+    SubmissionStatus,
+)
+from saltapi.submission.polling import BackoffPolicy, PollIntervalPolicy
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = (SubmissionStatus.FAILED, SubmissionStatus.SUCCESSFUL)
+
+MIN_POLL_INTERVAL = float(
+    os.environ.get("SUBMISSION_PROGRESS_MIN_POLL_INTERVAL", "0.5")
+)
+
+MAX_POLL_INTERVAL = float(os.environ.get("SUBMISSION_PROGRESS_MAX_POLL_INTERVAL", "10"))
+
+MAX_LOG_ENTRIES = int(os.environ.get("SUBMISSION_PROGRESS_MAX_LOG_ENTRIES", "1000"))
+
+# The polling which was used before the hub was introduced: every subscriber ran
+# two queries every five seconds.
+BASELINE_POLL_INTERVAL = 5
+BASELINE_QUERIES_PER_POLL = 2
+
+# Items put on a subscriber queue are progress updates or the error which ended the
+# polling.
+_QueueItem = Union[SubmissionProgress, Exception]
+
+
+@dataclasses.dataclass(frozen=True)
+class PollingStats:
+    """
+    Statistics for the database queries made by a progress hub.
+
+    The baseline is the number of queries which would have been made if every
+    subscriber had polled the database itself at a fixed interval of five seconds.
+    """
+
+    queries: int
+    baseline_queries: int
+
+    @property
+    def saved_queries(self) -> int:
+        """Return the number of queries saved compared to the baseline."""
+        return self.baseline_queries - self.queries
+
+
+class _SubmissionWatch:
+    """The shared polling state for a single submission."""
+
+    def __init__(self, submission_identifier: str, policy: PollIntervalPolicy):
+        self.submission_identifier = submission_identifier
+        self.policy = policy
+        # the subscriber queues and the (event loop) time when they subscribed
+        self.subscribers: Dict["asyncio.Queue[_QueueItem]", float] = {}
+        self.latest_entry_number = 0
+        self.status: Optional[SubmissionStatus] = None
+        # the (event loop) time from which on the submission is polled again
+        self.next_poll_at = 0.0
+
+
+class SubmissionProgressHub:
+    """
+    A hub fanning out submission progress to any number of subscribers.
+
+    The database is polled once per submission, irrespective of how many
+    subscribers there are for that submission. New log entries and status changes
+    are put on an in-process queue for every subscriber.
+
+    Polling for a submission starts with its first subscriber and stops when its
+    last subscriber leaves or when the submission has failed or succeeded.
+
+    All submissions are polled together, by a single task which wakes up once per
+    tick. A tick polls the submissions which are due with one query for their
+    statuses and, if any of them has new log entries, one query for these entries.
+    The number of queries hence depends on the number of ticks, but not on the
+    number of submissions.
+
+    The time between polls of a submission is determined by a poll interval policy,
+    and it is rounded up to a multiple of the tick interval. As policies are
+    stateful, the hub must be given a function creating a new policy.
+
+    A progress update contains at most max_log_entries log entries, and at most
+    max_log_entries log entries are read per submission and tick. Longer logs, such
+    as the log so far when a subscriber joins, are sent as several updates, which
+    are read from the database one after the other.
+    """
+
+    def __init__(
+        self,
+        poll_interval_policy: Callable[[], PollIntervalPolicy],
+        max_log_entries: int = MAX_LOG_ENTRIES,
+        tick_interval: float = MIN_POLL_INTERVAL,
+    ):
+        self.poll_interval_policy = poll_interval_policy
+        self.max_log_entries = max_log_entries
+        self.tick_interval = tick_interval
+        self._watches: Dict[str, _SubmissionWatch] = {}
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._queries = 0
+        self._baseline_queries = 0
+
+    @property
+    def watched_submissions(self) -> Set[str]:
+        """Return the identifiers of the submissions currently being polled."""
+        return set(self._watches.keys())
+
+    def stats(self) -> PollingStats:
+        """Return statistics for the queries made so far."""
+        now = asyncio.get_event_loop().time()
+        baseline_queries = self._baseline_queries
+        for watch in self._watches.values():
+            for subscribed_at in watch.subscribers.values():
+                baseline_queries += _baseline_queries(now - subscribed_at)
+        return PollingStats(queries=self._queries, baseline_queries=baseline_queries)
+
+    async def subscribe(
+        self, submission_identifier: str, after_entry: int = 0
+    ) -> AsyncIterator[SubmissionProgress]:
+        """
+        Generate the progress of a submission.
+
+        The first updates contain all the log entries logged after the entry with
+        the number after_entry so far. Subsequent updates contain the new log
+        entries only. The generator finishes once the submission has failed or
+        succeeded and all log entries have been sent.
+
+        A subscriber which reconnects can pass the number of the last log entry it
+        has received as after_entry, so that the log entries it has seen already are
+        neither read from the database nor sent again.
+        """
+        watch = self._watches.get(submission_identifier)
+        if watch is None:
+            watch = _SubmissionWatch(submission_identifier, self.poll_interval_policy())
+            # nobody needs the log entries up to after_entry
+            watch.latest_entry_number = after_entry
+            self._watches[submission_identifier] = watch
+            if self._task is None or self._task.done():
+                self._task = asyncio.ensure_future(self._run_ticks())
+
+        queue: "asyncio.Queue[_QueueItem]" = asyncio.Queue()
+        joined_at_entry = watch.latest_entry_number
+        joined_with_status = watch.status
+        watch.subscribers[queue] = asyncio.get_event_loop().time()
+        try:
+            if after_entry < joined_at_entry or joined_with_status is not None:
+                # The subscriber has missed log entries or status updates which
+                # have been published already.
+                async for progress in self._backfill(
+                    submission_identifier,
+                    after_entry,
+                    joined_at_entry,
+                    joined_with_status,
+                ):
+                    yield progress
+                    joined_with_status = progress.status
+
+            sent_status = joined_with_status
+            while True:
+                item = await queue.get()
+                if isinstance(item, Exception):
+                    raise item
+                if after_entry > joined_at_entry:
+                    # The polling started before the subscriber's log entries, so
+                    # the entries it has received already must be removed.
+                    item = dataclasses.replace(
+                        item, log_entries=item.log_entries.after(after_entry)
+                    )
+                if len(item.log_entries) or item.status != sent_status:
+                    yield item
+                    sent_status = item.status
+                if item.status in FINAL_STATUSES and not item.more_log_entries:
+                    return
+        finally:
+            self._unsubscribe(watch, queue)
+
+    async def _backfill(
+        self,
+        submission_identifier: str,
+        after_entry: int,
+        up_to_entry: int,
+        status: Optional[SubmissionStatus],
+    ) -> AsyncIterator[SubmissionProgress]:
+        """
+        Generate the progress between two log entries.
+
+        The log entries after after_entry up to (and including) up_to_entry are
+        generated. If no status is given, the status read from the database is used.
+        """
+        if after_entry >= up_to_entry and status is not None:
+            # only the status is missing
+            yield SubmissionProgress(
+                submission_identifier=submission_identifier,
+                status=status,
+                log_entries=SubmissionLog(submission_identifier),
+            )
+            return
+
+        while True:
+            progress = await submission_repository.find_submission_progress(
+                submission_identifier, after_entry, self.max_log_entries
+            )
+            self._queries += 1
+            if status is None:
+                status = progress.status
+            log_entries = progress.log_entries.up_to(up_to_entry)
+            last_entry = log_entries.last_entry_number
+            more_log_entries = (
+                progress.more_log_entries
+                and last_entry is not None
+                and last_entry < up_to_entry
+            )
+            yield SubmissionProgress(
+                submission_identifier=submission_identifier,
+                status=status,
+                log_entries=log_entries,
+                more_log_entries=more_log_entries,
+            )
+            if not more_log_entries or last_entry is None:
+                return
+            after_entry = last_entry
+
+    def _unsubscribe(
+        self, watch: _SubmissionWatch, queue: "asyncio.Queue[_QueueItem]"
+    ) -> None:
+        """Remove a subscriber and stop polling if it was the last one."""
+        subscribed_at = watch.subscribers.pop(queue, None)
+        if subscribed_at is not None:
+            now = asyncio.get_event_loop().time()
+            self._baseline_queries += _baseline_queries(now - subscribed_at)
+        if not watch.subscribers:
+            self._remove(watch)
+            if not self._watches and self._task is not None:
+                self._task.cancel()
+                self._task = None
+
+    def _remove(self, watch: _SubmissionWatch) -> None:
+        """Forget about a watch."""
+        if self._watches.get(watch.submission_identifier) is watch:
+            del self._watches[watch.submission_identifier]
+
+    def _publish(self, watch: _SubmissionWatch, item: _QueueItem) -> None:
+        """Put an item on the queue of every subscriber."""
+        for queue in watch.subscribers:
+            queue.put_nowait(item)
+
+    async def _run_ticks(self) -> None:
+        """Poll the database once per tick while there are submissions to watch."""
+        loop = asyncio.get_event_loop()
+        while self._watches:
+            started_at = loop.time()
+            if await self._tick(started_at):
+                # the remaining log entries are read without delay
+                continue
+            await asyncio.sleep(max(0.0, started_at + self.tick_interval - loop.time()))
+
+    async def _tick(self, now: float) -> bool:
+        """
+        Poll the database for all the submissions which are due.
+
+        True is returned if there are log entries which haven't been read yet.
+        """
+        due = [watch for watch in self._watches.values() if watch.next_poll_at <= now]
+        if not due:
+            return False
+
+        try:
+            states = await submission_repository.find_submission_states(
+                watch.submission_identifier for watch in due
+            )
+            self._queries += 1
+            after_entry_numbers = {
+                watch.submission_identifier: watch.latest_entry_number
+                for watch in due
+                if watch.submission_identifier in states
+                and states[watch.submission_identifier].last_entry_number
+                > watch.latest_entry_number
+            }
+            logs: Dict[str, SubmissionLog] = {}
+            if after_entry_numbers:
+                logs = await submission_repository.find_new_log_entries(
+                    after_entry_numbers, self.max_log_entries
+                )
+                self._queries += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(
+                msg=f"Polling the progress of {len(due)} submissions failed."
+            )
+            for watch in due:
+                self._publish(watch, e)
+                self._remove(watch)
+            return False
+
+        more_log_entries = False
+        for watch in due:
+            submission_identifier = watch.submission_identifier
+            state = states.get(submission_identifier)
+            if state is None:
+                message = f"Unknown submission identifier: {submission_identifier}"
+                logger.error(msg=message)
+                self._publish(watch, ValueError(message))
+                self._remove(watch)
+                continue
+            log_entries = logs.get(submission_identifier) or SubmissionLog(
+                submission_identifier
+            )
+            progress = SubmissionProgress(
+                submission_identifier=submission_identifier,
+                status=state.status,
+                log_entries=log_entries,
+                more_log_entries=state.last_entry_number
+                > (log_entries.last_entry_number or watch.latest_entry_number),
+            )
+            activity = self._update(watch, progress)
+            if progress.more_log_entries:
+                more_log_entries = True
+            elif state.status in FINAL_STATUSES:
+                self._remove(watch)
+            else:
+                watch.next_poll_at = now + watch.policy.next_interval(activity)
+        return more_log_entries
+
+    def _update(self, watch: _SubmissionWatch, progress: SubmissionProgress) -> bool:
+        """
+        Update a watch and publish the progress if there is anything new.
+
+        True is returned if there are new log entries or the status has changed.
+        """
+        # The watch must only be updated when the update is published, as otherwise
+        # a subscriber joining in the meantime would miss entries.
+        previous_status = watch.status
+        log_entries = progress.log_entries
+        if len(log_entries):
+            watch.latest_entry_number = log_entries.entry_numbers[-1]
+        watch.status = progress.status
+        activity = progress.status != previous_status or len(log_entries) > 0
+        if activity:
+            self._publish(watch, progress)
+        return activity
+
+
+def _baseline_queries(subscription_duration: float) -> int:
+    """Return the number of queries the fixed-interval polling would have made."""
+    polls = math.floor(subscription_duration / BASELINE_POLL_INTERVAL) + 1
+    return BASELINE_QUERIES_PER_POLL * polls
+
+
+progress_hub = SubmissionProgressHub(
+    lambda: BackoffPolicy(MIN_POLL_INTERVAL, MAX_POLL_INTERVAL)
+)
@@ -0,0 +1,325 @@
+"""A queue of proposal submissions, which are sent to the storage service."""
+import asyncio
+import dataclasses
+import enum
+import logging
+import math
+import os
+import random
+import tempfile
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from starlette.datastructures import UploadFile
+
+from saltapi.submission import submit
+from saltapi.submission.multipart import read_chunks
+from saltapi.submission.submit import StorageServiceError
+from saltapi.util.cache import TTLCache
+from saltapi.util.error import UsageError
+from saltapi.util.loop_local import LoopLocal
+
+logger = logging.getLogger(__name__)
+
+SUBMISSION_QUEUE_WORKERS = int(os.environ.get("SUBMISSION_QUEUE_WORKERS", "4"))
+
+SUBMISSION_QUEUE_MAX_SIZE = int(os.environ.get("SUBMISSION_QUEUE_MAX_SIZE", "100"))
+
+SUBMISSION_QUEUE_ENQUEUE_TIMEOUT = float(
+    os.environ.get("SUBMISSION_QUEUE_ENQUEUE_TIMEOUT", "10")
+)
+
+SUBMISSION_QUEUE_MAX_ATTEMPTS = int(
+    os.environ.get("SUBMISSION_QUEUE_MAX_ATTEMPTS", "5")
+)
+
+SUBMISSION_QUEUE_RETRY_DELAY = float(
+    os.environ.get("SUBMISSION_QUEUE_RETRY_DELAY", "1")
+)
+
+SUBMISSION_QUEUE_MAX_RETRY_DELAY = float(
+    os.environ.get("SUBMISSION_QUEUE_MAX_RETRY_DELAY", "60")
+)
+
+SUBMISSION_QUEUE_DRAIN_TIMEOUT = float(
+    os.environ.get("SUBMISSION_QUEUE_DRAIN_TIMEOUT", "30")
+)
+
+SUBMISSION_JOB_TTL = float(os.environ.get("SUBMISSION_JOB_TTL", "86400"))
+
+# Maximum number of finished jobs which are kept for status queries.
+SUBMISSION_JOB_CACHE_SIZE = 10000
+
+# Size (in bytes) up to which a spooled proposal file is kept in memory.
+SPOOL_MEMORY_SIZE = 1024 * 1024
+
+Submit = Callable[[UploadFile, Optional[str], str], Awaitable[str]]
+
+
+class SubmissionJobStatus(enum.Enum):
+    """The status of a queued submission."""
+
+    QUEUED = "Queued"
+    SENDING = "Sending"
+    SUBMITTED = "Submitted"
+    FAILED = "Failed"
+
+
+class SubmissionJob:
+    """
+    A proposal submission waiting to be sent, or sent, to the storage service.
+
+    The submission id is set once the storage service has accepted the proposal,
+    and the error is set if this has failed.
+    """
+
+    def __init__(
+        self,
+        tracking_id: str,
+        proposal: UploadFile,
+        proposal_code: Optional[str],
+        submitter: str,
+    ):
+        self.tracking_id = tracking_id
+        self.proposal = proposal
+        self.proposal_code = proposal_code
+        self.submitter = submitter
+        self.status = SubmissionJobStatus.QUEUED
+        self.attempts = 0
+        self.submission_id: Optional[str] = None
+        self.error: Optional[str] = None
+
+
+@dataclasses.dataclass(frozen=True)
+class SubmissionQueueStats:
+    """Gauges and counters for a submission queue."""
+
+    queued: int
+    max_size: int
+    sending: int
+    workers: int
+    submitted: int
+    failed: int
+    retries: int
+    rejected: int
+
+
+def retry_delay(
+    attempt: int,
+    base_delay: float,
+    max_delay: float,
+    rng: Callable[[], float] = random.random,
+) -> float:
+    """
+    Return the time (in seconds) to wait before retrying after a failed attempt.
+
+    The delay is chosen randomly between 0 and an exponentially growing bound
+    ("full jitter"), so that submissions which failed at the same time aren't
+    retried at the same time.
+    """
+    bound = min(max_delay, base_delay * math.pow(2, attempt - 1))
+    return rng() * bound
+
+
+async def spool(upload: UploadFile, max_size: int) -> UploadFile:
+    """
+    Copy an uploaded file to a temporary file owned by the caller.
+
+    The copy is kept in memory if it is small and written to disk otherwise. A
+    UsageError is raised if the file is larger than the maximum size.
+    """
+    spooled = UploadFile(
+        filename=upload.filename,
+        file=tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_SIZE),
+        content_type=upload.content_type,
+    )
+    try:
+        async for chunk in read_chunks(upload, max_size):
+            await spooled.write(chunk)
+        await spooled.seek(0)
+    except BaseException:
+        await spooled.close()
+        raise
+    return spooled
+
+
+class SubmissionQueue:
+    """
+    An in-process queue of proposal submissions.
+
+    Submissions are spooled and queued by the enqueue method, which returns a
+    tracking id for the submission at once. A pool of workers sends the queued
+    submissions to the storage service, so that the number of concurrent requests
+    to the storage service is limited to the number of workers.
+
+    If the queue is full, enqueue waits for a free place. A UsageError with status
+    code 503 is raised if there is none within the enqueue timeout.
+
+    A submission is sent again, after a random delay growing exponentially with the
+    number of attempts, if the storage service fails with a transient error. It has
+    failed once the storage service rejects it or the maximum number of attempts is
+    reached.
+
+    Finished jobs can be looked up by their tracking id for the job time to live.
+    The queue is in-process, so queued submissions are lost if the server is
+    stopped before the queue has been drained.
+    """
+
+    def __init__(
+        self,
+        workers: int = SUBMISSION_QUEUE_WORKERS,
+        max_size: int = SUBMISSION_QUEUE_MAX_SIZE,
+        enqueue_timeout: float = SUBMISSION_QUEUE_ENQUEUE_TIMEOUT,
+        max_attempts: int = SUBMISSION_QUEUE_MAX_ATTEMPTS,
+        retry_delay: float = SUBMISSION_QUEUE_RETRY_DELAY,
+        max_retry_delay: float = SUBMISSION_QUEUE_MAX_RETRY_DELAY,
+        drain_timeout: float = SUBMISSION_QUEUE_DRAIN_TIMEOUT,
+        job_ttl: float = SUBMISSION_JOB_TTL,
+        submit: Optional[Submit] = None,
+    ):
+        if workers < 1:
+            raise ValueError("There must be at least one worker.")
+        if max_attempts < 1:
+            raise ValueError("There must be at least one attempt.")
+        self.workers = workers
+        self.max_size = max_size
+        self.enqueue_timeout = enqueue_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.drain_timeout = drain_timeout
+        self._submit = submit
+        self._queue: LoopLocal["asyncio.Queue[SubmissionJob]"] = LoopLocal(
+            lambda: asyncio.Queue(maxsize=self.max_size)
+        )
+        self._workers: List["asyncio.Task[None]"] = []
+        self._active_jobs: Dict[str, SubmissionJob] = {}
+        self._finished_jobs: TTLCache[str, SubmissionJob] = TTLCache(
+            SUBMISSION_JOB_CACHE_SIZE, job_ttl
+        )
+        self._sending = 0
+        self._submitted = 0
+        self._failed = 0
+        self._retries = 0
+        self._rejected = 0
+
+    async def start(self) -> None:
+        """Start the workers."""
+        if self._workers and self._queue.loop is asyncio.get_event_loop():
+            return
+        self._queue.get()
+        self._workers = [
+            asyncio.ensure_future(self._work()) for _ in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        """Wait for the queue to be drained (up to a timeout) and stop the workers."""
+        queue = self._queue.value
+        if queue is not None and self._workers:
+            try:
+                await asyncio.wait_for(queue.join(), self.drain_timeout)
+            except asyncio.TimeoutError:
+                logger.error(
+                    msg=f"{queue.qsize()} queued submissions have not been "
+                    f"sent to the storage service."
+                )
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def enqueue(
+        self, proposal: UploadFile, proposal_code: Optional[str], submitter: str
+    ) -> str:
+        """Spool and queue a proposal submission and return its tracking id."""
+        await self.start()
+        queue = self._queue.get()
+        spooled = await spool(proposal, submit.MAX_PROPOSAL_SIZE)
+        job = SubmissionJob(uuid.uuid4().hex, spooled, proposal_code, submitter)
+        # a worker may finish the job before the put call returns
+        self._active_jobs[job.tracking_id] = job
+        try:
+            if queue.full():
+                logger.warning(msg=f"The submission queue is full: {self.stats()}")
+            await asyncio.wait_for(queue.put(job), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            del self._active_jobs[job.tracking_id]
+            self._rejected += 1
+            await spooled.close()
+            raise UsageError(
+                "Too many submissions are waiting to be processed. Please try again "
+                "later.",
+                503,
+            ) from None
+        return job.tracking_id
+
+    def job(self, tracking_id: str) -> Optional[SubmissionJob]:
+        """Return the job with a tracking id, if it is known."""
+        job = self._active_jobs.get(tracking_id)
+        if job is None:
+            job = self._finished_jobs.get(tracking_id)
+        return job
+
+    def stats(self) -> SubmissionQueueStats:
+        """Return the statistics for the queue."""
+        queue = self._queue.value
+        return SubmissionQueueStats(
+            queued=queue.qsize() if queue is not None else 0,
+            max_size=self.max_size,
+            sending=self._sending,
+            workers=len(self._workers),
+            submitted=self._submitted,
+            failed=self._failed,
+            retries=self._retries,
+            rejected=self._rejected,
+        )
+
+    async def _work(self) -> None:
+        queue = self._queue.get()
+        while True:
+            job = await queue.get()
+            try:
+                await self._process(job)
+            finally:
+                queue.task_done()
+
+    async def _process(self, job: SubmissionJob) -> None:
+        """Send a submission to the storage service, retrying if need be."""
+        submit_proposal = self._submit or submit.submit_proposal
+        job.status = SubmissionJobStatus.SENDING
+        self._sending += 1
+        try:
+            while True:
+                job.attempts += 1
+                try:
+                    job.submission_id = await submit_proposal(
+                        job.proposal, job.proposal_code, job.submitter
+                    )
+                    job.status = SubmissionJobStatus.SUBMITTED
+                    self._submitted += 1
+                    return
+                except StorageServiceError as e:
+                    if not e.retryable or job.attempts >= self.max_attempts:
+                        raise
+                    delay = retry_delay(
+                        job.attempts, self.retry_delay, self.max_retry_delay
+                    )
+                    logger.warning(
+                        msg=f"Attempt {job.attempts} to send the submission "
+                        f"{job.tracking_id} failed. Retrying in {delay:.1f} seconds."
+                    )
+                    self._retries += 1
+                    await asyncio.sleep(delay)
+        except Exception as e:
+            logger.error(msg=f"The submission {job.tracking_id} failed: {e}")
+            job.status = SubmissionJobStatus.FAILED
+            job.error = str(e)
+            self._failed += 1
+        finally:
+            self._sending -= 1
+            await job.proposal.close()
+            self._active_jobs.pop(job.tracking_id, None)
+            self._finished_jobs.set(job.tracking_id, job)
+
+
+submission_queue = SubmissionQueue()
@@ -0,0 +1,150 @@
+"""A shared HTTP client for the storage service."""
+import asyncio
+import dataclasses
+import importlib.util
+import os
+from typing import Any, Optional
+
+import httpcore
+import httpx
+import logging
+
+logger = logging.getLogger(__name__)
+
+STORAGE_SERVICE_MAX_CONNECTIONS = int(
+    os.environ.get("STORAGE_SERVICE_MAX_CONNECTIONS", "20")
+)
+
+STORAGE_SERVICE_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.environ.get("STORAGE_SERVICE_MAX_KEEPALIVE_CONNECTIONS", "10")
+)
+
+STORAGE_SERVICE_KEEPALIVE_EXPIRY = float(
+    os.environ.get("STORAGE_SERVICE_KEEPALIVE_EXPIRY", "30")
+)
+
+STORAGE_SERVICE_HTTP2 = os.environ.get("STORAGE_SERVICE_HTTP2", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+STORAGE_SERVICE_CONNECT_TIMEOUT = float(
+    os.environ.get("STORAGE_SERVICE_CONNECT_TIMEOUT", "5")
+)
+
+STORAGE_SERVICE_READ_TIMEOUT = float(
+    os.environ.get("STORAGE_SERVICE_READ_TIMEOUT", "60")
+)
+
+STORAGE_SERVICE_WRITE_TIMEOUT = float(
+    os.environ.get("STORAGE_SERVICE_WRITE_TIMEOUT", "60")
+)
+
+STORAGE_SERVICE_POOL_TIMEOUT = float(
+    os.environ.get("STORAGE_SERVICE_POOL_TIMEOUT", "10")
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class ConnectionPoolStats:
+    """Statistics for the connection pool of an HTTP client."""
+
+    requests: int
+    connections: int
+    idle_connections: int
+
+
+class StorageServiceClient:
+    """
+    An HTTP client for the storage service with a pool of reusable connections.
+
+    The underlying httpx client is created by the start method or, if start hasn't
+    been called, when it is first needed. It is closed by the close method. HTTP/2
+    is only used if it is enabled and the h2 package is installed.
+
+    Requests should be made with the post method, which limits the number of
+    concurrent requests to the maximum number of connections. Requests waiting for
+    a connection in the pool of httpcore 0.12 are not woken up when a connection
+    becomes idle, so they would fail with a pool timeout otherwise.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = STORAGE_SERVICE_MAX_CONNECTIONS,
+        max_keepalive_connections: int = STORAGE_SERVICE_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = STORAGE_SERVICE_KEEPALIVE_EXPIRY,
+        http2: bool = STORAGE_SERVICE_HTTP2,
+        timeout: httpx.Timeout = httpx.Timeout(
+            STORAGE_SERVICE_READ_TIMEOUT,
+            connect=STORAGE_SERVICE_CONNECT_TIMEOUT,
+            read=STORAGE_SERVICE_READ_TIMEOUT,
+            write=STORAGE_SERVICE_WRITE_TIMEOUT,
+            pool=STORAGE_SERVICE_POOL_TIMEOUT,
+        ),
+    ):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        self.timeout = timeout
+        self._pool: Optional[httpcore.AsyncConnectionPool] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._request_slots: Optional[asyncio.Semaphore] = None
+        self._requests = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Return the httpx client, creating it if necessary."""
+        if self._client is None:
+            self._pool = httpcore.AsyncConnectionPool(
+                ssl_context=httpx.create_ssl_context(),
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+                http2=self.http2,
+            )
+            self._client = httpx.AsyncClient(
+                transport=self._pool,
+                timeout=self.timeout,
+                event_hooks={"request": [self._count_request]},
+            )
+            self._request_slots = asyncio.Semaphore(self.max_connections)
+        return self._client
+
+    async def start(self) -> None:
+        """Create the httpx client."""
+        self.client
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        """Make a POST request, waiting for a free connection if necessary."""
+        client = self.client
+        assert self._request_slots is not None
+        async with self._request_slots:
+            return await client.post(url, **kwargs)
+
+    async def close(self) -> None:
+        """Close the httpx client and all its connections."""
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+        self._pool = None
+        self._request_slots = None
+
+    async def stats(self) -> ConnectionPoolStats:
+        """Return statistics for the connection pool."""
+        connections = []
+        if self._pool is not None:
+            for infos in (await self._pool.get_connection_info()).values():
+                connections.extend(infos)
+        return ConnectionPoolStats(
+            requests=self._requests,
+            connections=len(connections),
+            idle_connections=sum(1 for info in connections if "IDLE" in info),
+        )
+
+    async def _count_request(self, request: httpx.Request) -> None:
+        self._requests += 1
+
+
+storage_service = StorageServiceClient()
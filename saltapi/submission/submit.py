@@ -5,59 +5,107 @@ from typing import Optional
 import httpx
 from starlette.datastructures import UploadFile
 
-from saltapi.auth.token import create_token
+from saltapi.auth.token import ServiceTokenProvider
 from saltapi.repository.user_repository import User
+from saltapi.submission.multipart import MultipartFileUpload
+from saltapi.submission.storage import storage_service
+from saltapi.util.error import UsageError
 import logging
 
 logger = logging.getLogger(__name__)
 
 proposal_submission_url = f"{os.environ['STORAGE_SERVICE_URL']}/proposal/submit"
 
+MAX_PROPOSAL_SIZE = int(os.environ.get("MAX_PROPOSAL_SIZE", str(500 * 1024 * 1024)))
+
+# Response status codes indicating that the storage service hasn't processed a
+# request, but might accept the same request later. Gateway errors aren't included,
+# as the request may have reached the storage service.
+RETRYABLE_STATUS_CODES = (429, 503)
+
+# Errors raised before a request has been sent to the storage service. Other
+# transport errors, such as a read timeout, may happen after the storage service
+# has received the whole proposal.
+UNSENT_REQUEST_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class StorageServiceError(Exception):
+    """
+    An exception indicating that the storage service didn't accept a submission.
+
+    The retryable flag is True if the failure is transient and the storage service
+    has not processed the submission, so that sending the submission again may
+    succeed and doesn't submit the proposal twice.
+    """
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+storage_service_token = ServiceTokenProvider(
+    user=User(
+        id=-1,
+        username="admin",
+        first_name="",
+        last_name="",
+        email="",
+        roles=["Admin"],
+        permissions=[],
+    ),
+    lifetime=300,
+)
+
 
 async def submit_proposal(
     proposal: UploadFile, proposal_code: Optional[str], submitter: str
 ) -> str:
-    """Submit a proposal."""
+    """
+    Submit a proposal.
+
+    The proposal file is streamed to the storage service. A UsageError is raised if
+    it is larger than the maximum proposal size, and a StorageServiceError is raised
+    if the storage service doesn't return a submission id.
+    """
     generic_error = "The proposal could not be sent to the storage service."
-    files = {
-        "proposal": (proposal.filename, proposal.file, "application/octet-stream"),
-    }
     data = {
         "submitter": submitter,
     }
     if proposal_code:
         data["proposal_code"] = proposal_code
-    user = User(
-        id=-1,
-        username="admin",
-        first_name="",
-        last_name="",
-        email="",
-        roles=["Admin"],
-        permissions=[],
+    body = MultipartFileUpload(
+        data=data,
+        file_field="proposal",
+        file=proposal,
+        max_file_size=MAX_PROPOSAL_SIZE,
     )
-    auth_token = create_token(user=user, expiry=300, algorithm="RS256")
-    headers = {"Authorization": f"Bearer {auth_token}"}
+    auth_token = await storage_service_token.token()
+    headers = {"Authorization": f"Bearer {auth_token}", **body.headers}
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                proposal_submission_url, data=data, files=files, headers=headers
-            )
+        response = await storage_service.post(
+            proposal_submission_url, content=body, headers=headers
+        )
+    except UsageError:
+        raise
+    except UNSENT_REQUEST_ERRORS:
+        logger.exception(msg=generic_error)
+        raise StorageServiceError(generic_error, retryable=True)
     except Exception:
         logger.exception(msg=generic_error)
-        raise Exception(generic_error)
+        raise StorageServiceError(generic_error)
     submission_id = _submission_id(response)
     if submission_id:
         return submission_id
 
     # error handling
+    retryable = response.status_code in RETRYABLE_STATUS_CODES
     error = _submission_error(response)
     if error:
         logger.error(msg=error)
-        raise Exception(error)
+        raise StorageServiceError(error, retryable=retryable)
     else:
         logger.error(msg=generic_error)
-        raise Exception(generic_error)
+        raise StorageServiceError(generic_error, retryable=retryable)
 
 
 def _submission_id(response: httpx.Response) -> Optional[str]:
@@ -0,0 +1,158 @@
+"""In-process caching."""
+import asyncio
+import dataclasses
+import time
+from collections import OrderedDict
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclasses.dataclass(frozen=True)
+class CacheStats:
+    """Statistics for a cache."""
+
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+
+
+class TTLCache(Generic[K, V]):
+    """
+    A bounded least-recently-used cache whose entries expire.
+
+    Entries expire after the cache's time to live, unless a different time to live
+    is given when they are added. Expired entries are never returned. If the cache
+    is full, adding an entry evicts the least recently used entry. A maximum size of
+    0 disables the cache.
+
+    Values can be loaded with the get_or_load method. Concurrent calls of this
+    method for the same key share a single call of the loader function. A value
+    whose load started before its key was invalidated (or the cache was cleared)
+    isn't cached.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[K, Tuple[V, float]]" = OrderedDict()
+        self._loading: Dict[K, "asyncio.Task[Optional[V]]"] = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __len__(self) -> int:
+        """Return the number of cached entries, including expired ones."""
+        return len(self._entries)
+
+    def get(self, key: K) -> Optional[V]:
+        """Return the value cached for a key, or None if there is none."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+        value, expires_at = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return value
+
+    def set(self, key: K, value: V, ttl: Optional[float] = None) -> None:
+        """Cache a value for a key, optionally with its own time to live."""
+        if self.max_size <= 0:
+            return
+        expires_at = self._clock() + (ttl if ttl is not None else self.ttl)
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def invalidate(self, key: K) -> None:
+        """Remove the value cached for a key, if there is one."""
+        self._entries.pop(key, None)
+        self._loading.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all cached values."""
+        self._entries.clear()
+        self._loading.clear()
+
+    async def get_or_load(
+        self, key: K, loader: Callable[[], Awaitable[Optional[V]]]
+    ) -> Optional[V]:
+        """
+        Return the cached value for a key, loading it if necessary.
+
+        The loader is only called if there is no cached value and no other call is
+        loading the value already. A None value returned by the loader isn't cached.
+        A lookup sharing the load of another call counts as a hit. Cancelling a call
+        doesn't cancel the load.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        loading = self._loading.get(key)
+        if loading is not None:
+            # get has counted a miss, but no load is made for this call
+            self._misses -= 1
+            self._hits += 1
+        else:
+            # The loader runs in its own task, so that cancelling any of the callers
+            # waiting for it cancels neither the load nor the other callers.
+            loading = asyncio.ensure_future(self._load(key, loader))
+            loading.add_done_callback(_retrieve_exception)
+            self._loading[key] = loading
+        return await asyncio.shield(loading)
+
+    async def _load(
+        self, key: K, loader: Callable[[], Awaitable[Optional[V]]]
+    ) -> Optional[V]:
+        load = asyncio.current_task()
+        try:
+            value = await loader()
+        finally:
+            # the load has been detached if its key was invalidated in the meantime
+            is_current = self._loading.get(key) is load
+            if is_current:
+                del self._loading[key]
+        if value is not None and is_current:
+            self.set(key, value)
+        return value
+
+    def stats(self) -> CacheStats:
+        """Return the cache statistics."""
+        return CacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            evictions=self._evictions,
+            size=len(self._entries),
+        )
+
+
+def _retrieve_exception(task: "asyncio.Task[Any]") -> None:
+    # avoid a warning if all the callers waiting for a failed load were cancelled
+    if not task.cancelled():
+        task.exception()
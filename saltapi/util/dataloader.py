@@ -0,0 +1,118 @@
+"""Batched and deduplicated loading of values by key."""
+import asyncio
+import dataclasses
+import os
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    TypeVar,
+)
+
+DATALOADER_MAX_BATCH_SIZE = int(os.environ.get("DATALOADER_MAX_BATCH_SIZE", "500"))
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclasses.dataclass(frozen=True)
+class DataLoaderStats:
+    """Statistics for a data loader."""
+
+    loads: int
+    cache_hits: int
+    batches: int
+    loaded_keys: int
+
+
+class DataLoader(Generic[K, V]):
+    """
+    A loader batching the loads made in the same event loop iteration.
+
+    The keys requested with the load method are collected until the current
+    iteration of the event loop has finished, and they are then passed to the batch
+    load function in batches of at most the maximum batch size. The batch load
+    function must return a mapping of keys to values; a key missing from the
+    mapping is loaded as None.
+
+    Every key is loaded at most once, as the loaded values are cached for the
+    lifetime of the loader. Data loaders should therefore only be used for a
+    single request. If a batch fails, its keys are removed from the cache and the
+    error is raised for all of their loads.
+    """
+
+    def __init__(
+        self,
+        batch_load: Callable[[List[K]], Awaitable[Mapping[K, V]]],
+        max_batch_size: int = DATALOADER_MAX_BATCH_SIZE,
+    ):
+        self.batch_load = batch_load
+        self.max_batch_size = max_batch_size
+        self._values: Dict[K, "asyncio.Future[Optional[V]]"] = {}
+        self._queue: List[K] = []
+        self._loads = 0
+        self._cache_hits = 0
+        self._batches = 0
+        self._loaded_keys = 0
+
+    async def load(self, key: K) -> Optional[V]:
+        """Load the value for a key."""
+        self._loads += 1
+        future = self._values.get(key)
+        if future is not None:
+            self._cache_hits += 1
+        else:
+            loop = asyncio.get_event_loop()
+            future = loop.create_future()
+            self._values[key] = future
+            if not self._queue:
+                loop.call_soon(self._dispatch)
+            self._queue.append(key)
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable[K]) -> List[Optional[V]]:
+        """Load the values for several keys."""
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def stats(self) -> DataLoaderStats:
+        """Return the statistics for the loader."""
+        return DataLoaderStats(
+            loads=self._loads,
+            cache_hits=self._cache_hits,
+            batches=self._batches,
+            loaded_keys=self._loaded_keys,
+        )
+
+    def _dispatch(self) -> None:
+        queue, self._queue = self._queue, []
+        size = max(self.max_batch_size, 1)
+        for start in range(0, len(queue), size):
+            end = start + size
+            asyncio.ensure_future(self._load_batch(queue[start:end]))
+
+    async def _load_batch(self, keys: List[K]) -> None:
+        self._batches += 1
+        self._loaded_keys += len(keys)
+        try:
+            values = await self.batch_load(keys)
+        except asyncio.CancelledError:
+            for key in keys:
+                self._values.pop(key).cancel()
+            raise
+        except Exception as e:
+            for key in keys:
+                future = self._values.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+                    future.exception()  # avoid a warning if no load awaits it
+            return
+        for key in keys:
+            future = self._values[key]
+            if not future.done():
+                future.set_result(values.get(key))
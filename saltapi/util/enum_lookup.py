@@ -0,0 +1,42 @@
+"""Constant-time lookups of enum members."""
+import enum
+import logging
+from typing import Any, Dict, Generic, Type, TypeVar
+
+logger = logging.getLogger(__name__)
+
+E = TypeVar("E", bound=enum.Enum)
+
+
+class EnumLookup(Generic[E]):
+    """
+    Reverse lookup maps for the members of an enum.
+
+    The maps from values and names to members are generated once, so that a lookup
+    is a dictionary access rather than a loop over the members. The description is
+    used in the error message for an unknown value or name, which has the form
+    "Unknown <description>: <value or name>".
+    """
+
+    def __init__(self, enum_type: Type[E], description: str):
+        self.description = description
+        self._by_value: Dict[Any, E] = {member.value: member for member in enum_type}
+        self._by_name: Dict[str, E] = dict(enum_type.__members__)
+
+    def by_value(self, value: Any) -> E:
+        """Return the member with a value."""
+        try:
+            return self._by_value[value]
+        except (KeyError, TypeError):
+            return self._unknown(value)
+
+    def by_name(self, name: str) -> E:
+        """Return the member with a name."""
+        try:
+            return self._by_name[name]
+        except (KeyError, TypeError):
+            return self._unknown(name)
+
+    def _unknown(self, key: Any) -> E:
+        logger.error(msg=f"Unknown {self.description}: {key}")
+        raise ValueError(f"Unknown {self.description}: {key}")
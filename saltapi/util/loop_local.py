@@ -0,0 +1,40 @@
+"""Values created separately for every asyncio event loop."""
+import asyncio
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class LoopLocal(Generic[T]):
+    """
+    A value, such as an asyncio lock, semaphore or queue, bound to an event loop.
+
+    asyncio synchronization primitives and queues must not be shared between event
+    loops. The server runs a single event loop, but a new event loop is used for
+    every test. So the value is created with the factory function when it is first
+    requested, and it is created again when it is requested in a different event
+    loop.
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._value: Optional[T] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        """Return the event loop of the current value, if there is a value."""
+        return self._loop
+
+    @property
+    def value(self) -> Optional[T]:
+        """Return the current value (if there is one), whatever its event loop."""
+        return self._value
+
+    def get(self) -> T:
+        """Return the value for the current event loop, creating it if necessary."""
+        loop = asyncio.get_event_loop()
+        if self._value is None or self._loop is not loop:
+            self._value = self._factory()
+            self._loop = loop
+        return self._value
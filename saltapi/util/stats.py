@@ -0,0 +1,47 @@
+"""A registry of the statistics collected by the server."""
+import dataclasses
+import inspect
+from typing import Any, Callable, Dict
+
+StatsProvider = Callable[[], Any]
+
+
+class StatsRegistry:
+    """
+    A registry of functions returning statistics.
+
+    A function is registered with a name, and it must return a dataclass instance, a
+    dictionary of dataclass instances, None, or an awaitable for one of these. When
+    the statistics are collected, all functions are called, and their results are
+    returned as a JSON-serializable dictionary with the names as keys.
+    """
+
+    def __init__(self) -> None:
+        self._providers: Dict[str, StatsProvider] = {}
+
+    def register(self, name: str, provider: StatsProvider) -> None:
+        """Register a function returning statistics."""
+        if name in self._providers:
+            raise ValueError(f"Statistics registered already: {name}")
+        self._providers[name] = provider
+
+    async def collect(self) -> Dict[str, Any]:
+        """Collect the statistics of all registered functions."""
+        stats: Dict[str, Any] = {}
+        for name, provider in self._providers.items():
+            value = provider()
+            if inspect.isawaitable(value):
+                value = await value
+            stats[name] = _to_json(value)
+        return stats
+
+
+def _to_json(value: Any) -> Any:
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if isinstance(value, dict):
+        return {str(key): _to_json(item) for key, item in value.items()}
+    return value
+
+
+stats_registry = StatsRegistry()
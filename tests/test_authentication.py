@@ -7,7 +7,7 @@ from starlette.testclient import TestClient
 
 from saltapi.app import app
 from saltapi.repository import user_repository
-from saltapi.repository.user_repository import User
+from saltapi.repository.user_repository import User, user_cache
 
 USER_ID = 42
 
@@ -99,6 +99,12 @@ def test_cannot_authenticate_with_invalid_token(header_value):
     assert response.status_code == 400
 
 
+@pytest.fixture(autouse=True)
+def clear_user_cache():
+    """Make sure that no users are cached."""
+    user_cache.clear()
+
+
 def test_can_authenticate_with_valid_token(monkeypatch):
     """Request a token and then authenticate with it."""
     monkeypatch.setattr(
@@ -118,3 +124,26 @@ def test_can_authenticate_with_valid_token(monkeypatch):
     # authenticate with this token
     r = client.get("/graphql", headers={"Authorization": f"Bearer {token}"})
     assert r.status_code == 200
+
+
+def test_authenticated_users_are_cached(monkeypatch):
+    """The user is only read from the database for the first request."""
+    calls = 0
+
+    async def counting_find_user_by_id(user_id: int) -> Optional[User]:
+        nonlocal calls
+        calls += 1
+        return await mock_find_user_by_id(user_id)
+
+    monkeypatch.setattr(
+        user_repository, "find_user_by_credentials", mock_find_user_by_credentials
+    )
+    monkeypatch.setattr(user_repository, "find_user_by_id", counting_find_user_by_id)
+
+    client = TestClient(app)
+    data = {"username": "jane", "password": "secret"}
+    token = client.post("/token", json.dumps(data)).json()["token"]
+    for _ in range(3):
+        r = client.get("/graphql", headers={"Authorization": f"Bearer {token}"})
+        assert r.status_code == 200
+    assert calls == 1
@@ -0,0 +1,135 @@
+"""Tests for the in-memory authorization index."""
+import asyncio
+
+import pytest
+
+from saltapi.auth import authorization
+from saltapi.auth.authorization import (
+    GRANT_BITS,
+    AuthorizationIndex,
+    Permission,
+    Role,
+    grant_mask,
+    grants_in_mask,
+)
+from saltapi.repository.database import database
+
+
+@pytest.fixture
+def user_settings(monkeypatch):
+    """Serve user settings from a list instead of the database."""
+    settings = [(1, "RightAdmin"), (2, "RightAstronomer")]
+    queries = []
+
+    async def fetch_all(query):
+        queries.append(str(query))
+        return list(settings)
+
+    monkeypatch.setattr(database, "fetch_all", fetch_all)
+    return settings, queries
+
+
+def test_grant_bits_are_distinct():
+    """Every role and permission has its own bit."""
+    bits = list(GRANT_BITS.values())
+    assert len(bits) == len(set(bits)) == len(Role) + len(Permission)
+    assert grants_in_mask(grant_mask([Role.ADMINISTRATOR])) == {Role.ADMINISTRATOR}
+
+
+def test_update_ignores_unknown_settings():
+    """Only settings which confer a role or permission are indexed."""
+    index = AuthorizationIndex()
+    assert index.update([(1, "RightAdmin"), (2, "RightAstronomer")]) == 1
+    assert len(index) == 1
+    assert index.roles(1) == {Role.ADMINISTRATOR}
+    assert index.permissions(1) == frozenset()
+    assert index.roles(2) == frozenset()
+
+
+def test_update_only_changes_modified_users():
+    """A refresh reports the users whose grants have changed."""
+    index = AuthorizationIndex()
+    index.update([(1, "RightAdmin"), (2, "RightAdmin")])
+    assert index.update([(1, "RightAdmin"), (2, "RightAdmin")]) == 0
+    assert index.update([(1, "RightAdmin"), (3, "RightAdmin")]) == 2
+    assert index.has_any(1, GRANT_BITS[Role.ADMINISTRATOR])
+    assert not index.has_any(2, GRANT_BITS[Role.ADMINISTRATOR])
+    assert index.has_any(3, GRANT_BITS[Role.ADMINISTRATOR])
+
+
+def test_version_changes_with_the_grants():
+    """The version of the index is incremented whenever any grants change."""
+    index = AuthorizationIndex()
+    index.update([(1, "RightAdmin")])
+    version = index.version
+    index.update([(1, "RightAdmin")])
+    assert index.version == version
+    index.update([])
+    assert index.version == version + 1
+
+
+@pytest.mark.asyncio
+async def test_index_is_loaded_with_a_single_query(user_settings, monkeypatch):
+    """All grants are loaded at once when the index is started."""
+    _, queries = user_settings
+    index = AuthorizationIndex(refresh_interval=0)
+    monkeypatch.setattr(authorization, "authorization_index", index)
+
+    await index.start()
+    try:
+        assert len(queries) == 1
+        for _ in range(10):
+            assert authorization.authorization_index.has_any(
+                1, GRANT_BITS[Role.ADMINISTRATOR]
+            )
+            assert not authorization.authorization_index.has_any(
+                2, GRANT_BITS[Role.ADMINISTRATOR]
+            )
+        assert len(queries) == 1
+    finally:
+        await index.stop()
+
+
+@pytest.mark.asyncio
+async def test_index_is_refreshed_periodically(user_settings):
+    """Changed grants are picked up by the background refresh."""
+    settings, queries = user_settings
+    index = AuthorizationIndex(refresh_interval=0.01)
+    await index.start()
+    try:
+        assert index.roles(2) == frozenset()
+        settings.append((2, "RightAdmin"))
+        for _ in range(100):
+            if index.roles(2):
+                break
+            await asyncio.sleep(0.01)
+        assert index.roles(2) == {Role.ADMINISTRATOR}
+        assert len(queries) > 1
+    finally:
+        await index.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_load_keeps_index(monkeypatch):
+    """A database error does not clear the index."""
+    index = AuthorizationIndex(refresh_interval=0)
+    index.update([(1, "RightAdmin")])
+
+    async def fetch_all(query):
+        raise ConnectionError("The database is down.")
+
+    monkeypatch.setattr(database, "fetch_all", fetch_all)
+    await index.start()
+    assert index.roles(1) == {Role.ADMINISTRATOR}
+
+
+def test_has_any():
+    """Any of the roles and permissions in a bitset are checked at once."""
+    index = AuthorizationIndex()
+    index.update([(1, "RightAdmin")])
+
+    assert index.has_any(1, grant_mask([Role.ADMINISTRATOR]))
+    assert index.has_any(1, grant_mask([Role.ADMINISTRATOR, Permission.VIEW_PROPOSAL]))
+    assert not index.has_any(1, grant_mask([Permission.SUBMIT_PROPOSAL]))
+    assert not index.has_any(1, grant_mask([]))
+    assert not index.has_any(2, grant_mask([Role.ADMINISTRATOR]))
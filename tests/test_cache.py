@@ -0,0 +1,169 @@
+"""Tests for the in-process cache."""
+import asyncio
+
+import pytest
+
+from saltapi.util.cache import TTLCache
+
+
+class Clock:
+    """A clock which only moves when told to."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        """Return the current time."""
+        return self.now
+
+
+def test_cached_values_are_returned():
+    """Cached values are returned until they expire."""
+    clock = Clock()
+    cache = TTLCache(max_size=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    clock.now = 9.9
+    assert cache.get("a") == 1
+    clock.now = 10
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_entries_can_have_their_own_ttl():
+    """An entry can have a time to live different from the cache's one."""
+    clock = Clock()
+    cache = TTLCache(max_size=2, ttl=10, clock=clock)
+    cache.set("a", 1, ttl=2)
+    clock.now = 2
+    assert cache.get("a") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    """The least recently used entry is evicted from a full cache."""
+    cache = TTLCache(max_size=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats().evictions == 1
+
+
+def test_invalidate():
+    """Invalidated entries are removed."""
+    cache = TTLCache(max_size=2, ttl=10)
+    cache.set("a", 1)
+    cache.invalidate("a")
+    cache.invalidate("b")
+    assert cache.get("a") is None
+
+
+def test_zero_size_disables_cache():
+    """Nothing is cached by a cache with a maximum size of 0."""
+    cache = TTLCache(max_size=0, ttl=10)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_loads_are_shared():
+    """Concurrent loads for the same key share a single call of the loader."""
+    cache = TTLCache(max_size=2, ttl=10)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "value"
+
+    values = await asyncio.gather(*[cache.get_or_load("a", loader) for _ in range(5)])
+    assert values == ["value"] * 5
+    assert await cache.get_or_load("a", loader) == "value"
+    assert calls == 1
+
+    stats = cache.stats()
+    assert stats.hits == 5
+    assert stats.misses == 1
+    assert stats.size == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_loads_are_not_cached():
+    """Errors raised by the loader are passed on and nothing is cached."""
+    cache = TTLCache(max_size=2, ttl=10)
+
+    async def failing_loader():
+        await asyncio.sleep(0.01)
+        raise ValueError("Database not available")
+
+    results = await asyncio.gather(
+        cache.get_or_load("a", failing_loader),
+        cache.get_or_load("a", failing_loader),
+        return_exceptions=True,
+    )
+    assert all(isinstance(r, ValueError) for r in results)
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_none_is_not_cached():
+    """A None value returned by the loader isn't cached."""
+    cache = TTLCache(max_size=2, ttl=10)
+
+    async def loader():
+        return None
+
+    assert await cache.get_or_load("a", loader) is None
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelling_a_load_does_not_cancel_other_callers():
+    """A cancelled call neither cancels the load nor the calls sharing it."""
+    cache = TTLCache(max_size=2, ttl=10)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "value"
+
+    first = asyncio.ensure_future(cache.get_or_load("a", loader))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(cache.get_or_load("a", loader))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await follower == "value"
+    assert first.cancelled()
+    assert cache.get("a") == "value"
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("invalidate", [lambda c: c.invalidate("a"), TTLCache.clear])
+async def test_loads_started_before_an_invalidation_are_not_cached(invalidate):
+    """A value loaded before its key was invalidated isn't cached."""
+    cache = TTLCache(max_size=2, ttl=10)
+    versions = iter(["stale", "fresh"])
+    release = asyncio.Event()
+
+    async def loader():
+        version = next(versions)
+        if version == "stale":
+            await release.wait()
+        return version
+
+    stale = asyncio.ensure_future(cache.get_or_load("a", loader))
+    await asyncio.sleep(0)
+    invalidate(cache)
+    assert await asyncio.wait_for(cache.get_or_load("a", loader), 1) == "fresh"
+    release.set()
+
+    assert await stale == "stale"
+    assert cache.get("a") == "fresh"
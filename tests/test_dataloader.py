@@ -0,0 +1,201 @@
+"""Tests for the data loaders."""
+import asyncio
+
+import pytest
+from ariadne import ObjectType, QueryType, make_executable_schema
+from starlette.applications import Starlette
+from starlette.testclient import TestClient
+
+from saltapi.graphql.loaders import Loaders, graphql_context
+from saltapi.graphql.server import CachingGraphQL
+from saltapi.repository.database import database
+from saltapi.repository.user_repository import find_user_by_id, find_users_by_ids
+from saltapi.util.dataloader import DataLoader
+
+USERS = {
+    1: (1, "jane", "Jane", "Doe", "jane@example.com"),
+    2: (2, "john", "John", "Doe", "john@example.com"),
+    3: (3, "jim", "Jim", "Doe", "jim@example.com"),
+}
+
+
+class BatchLoad:
+    """A batch load function recording its calls."""
+
+    def __init__(self, fail: bool = False):
+        self.batches = []
+        self.fail = fail
+
+    async def __call__(self, keys):
+        """Return ten times the positive keys."""
+        self.batches.append(keys)
+        if self.fail:
+            raise ConnectionError("The database is down.")
+        return {key: key * 10 for key in keys if key > 0}
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    """Serve users from memory instead of the database."""
+    recorded = []
+
+    async def fetch_all(query):
+        values = query.compile().params
+        recorded.append((str(query), values))
+        return [USERS[i] for i in values["user_ids"] if i in USERS]
+
+    async def fetch_one(query):
+        values = query.compile().params
+        recorded.append((str(query), values))
+        return USERS.get(values["user_id"])
+
+    monkeypatch.setattr(database, "fetch_all", fetch_all)
+    monkeypatch.setattr(database, "fetch_one", fetch_one)
+    return recorded
+
+
+@pytest.mark.asyncio
+async def test_loads_are_batched_and_deduplicated():
+    """Concurrent loads are combined in a single batch without duplicate keys."""
+    batch_load = BatchLoad()
+    loader = DataLoader(batch_load)
+
+    values = await asyncio.gather(*(loader.load(k) for k in (1, 2, 1, 3, -1)))
+
+    assert values == [10, 20, 10, 30, None]
+    assert batch_load.batches == [[1, 2, 3, -1]]
+    stats = loader.stats()
+    assert (stats.loads, stats.cache_hits, stats.batches, stats.loaded_keys) == (
+        5,
+        1,
+        1,
+        4,
+    )
+
+
+@pytest.mark.asyncio
+async def test_loaded_values_are_cached():
+    """A key is only loaded once."""
+    batch_load = BatchLoad()
+    loader = DataLoader(batch_load)
+
+    assert await loader.load(1) == 10
+    assert await loader.load_many([1, 2]) == [10, 20]
+    assert batch_load.batches == [[1], [2]]
+
+
+@pytest.mark.asyncio
+async def test_batches_are_limited_in_size():
+    """Batches don't exceed the maximum batch size."""
+    batch_load = BatchLoad()
+    loader = DataLoader(batch_load, max_batch_size=2)
+
+    assert await loader.load_many(range(1, 6)) == [10, 20, 30, 40, 50]
+    assert batch_load.batches == [[1, 2], [3, 4], [5]]
+
+
+@pytest.mark.asyncio
+async def test_failed_batches_are_not_cached():
+    """The error of a failed batch is raised, and the keys can be loaded again."""
+    batch_load = BatchLoad(fail=True)
+    loader = DataLoader(batch_load)
+
+    with pytest.raises(ConnectionError):
+        await loader.load_many([1, 2])
+
+    batch_load.fail = False
+    assert await loader.load(1) == 10
+    assert batch_load.batches == [[1, 2], [1]]
+
+
+@pytest.mark.asyncio
+async def test_find_users_by_ids(queries):
+    """Users are found with a single query."""
+    users = await find_users_by_ids([1, 3, 4])
+
+    assert sorted(users.keys()) == [1, 3]
+    assert users[3].username == "jim"
+    assert len(queries) == 1
+    assert "IN :user_ids" in queries[0][0]
+    assert await find_users_by_ids([]) == {}
+    assert len(queries) == 1
+
+
+@pytest.mark.asyncio
+async def test_users_found_by_id_and_by_ids_are_the_same(queries):
+    """A user is the same whether found on their own or together with others."""
+    users = await find_users_by_ids([1, 3])
+
+    assert await find_user_by_id(3) == users[3]
+    assert await find_user_by_id(4) is None
+
+
+TYPE_DEFS = """
+type Query {
+    proposals: [Proposal!]!
+}
+
+type Proposal {
+    code: String!
+    principalInvestigator: User
+}
+
+type User {
+    username: String!
+}
+"""
+
+PROPOSALS = [
+    {"code": "2021-1-SCI-001", "pi": 1},
+    {"code": "2021-1-SCI-002", "pi": 2},
+    {"code": "2021-1-SCI-003", "pi": 1},
+    {"code": "2021-1-SCI-004", "pi": 4},
+]
+
+
+def _client(debug):
+    query = QueryType()
+    query.set_field("proposals", lambda *_: PROPOSALS)
+    proposal = ObjectType("Proposal")
+
+    @proposal.field("principalInvestigator")
+    async def resolve_principal_investigator(obj, info):
+        return await info.context["loaders"].user_by_id.load(obj["pi"])
+
+    schema = make_executable_schema(TYPE_DEFS, query, proposal)
+    app = Starlette()
+    app.mount(
+        "/graphql", CachingGraphQL(schema, context_value=graphql_context, debug=debug)
+    )
+    return TestClient(app)
+
+
+QUERY = "{ proposals { code principalInvestigator { username } } }"
+
+
+def test_resolvers_share_the_request_loaders(queries):
+    """The users of all proposals are read with a single query."""
+    response = _client(debug=False).post("/graphql/", json={"query": QUERY})
+
+    usernames = [
+        p["principalInvestigator"] and p["principalInvestigator"]["username"]
+        for p in response.json()["data"]["proposals"]
+    ]
+    assert usernames == ["jane", "john", "jane", None]
+    assert len(queries) == 1
+    assert sorted(queries[0][1]["user_ids"]) == [1, 2, 4]
+    assert "extensions" not in response.json()
+
+
+def test_loader_stats_in_debug_mode(queries):
+    """In debug mode the loader statistics are included in the response."""
+    client = _client(debug=True)
+    for _ in range(2):
+        response = client.post("/graphql/", json={"query": QUERY})
+        stats = response.json()["extensions"]["dataLoaders"]["user_by_id"]
+        assert stats == {"loads": 4, "cache_hits": 1, "batches": 1, "loaded_keys": 3}
+
+
+def test_loaders_stats():
+    """The statistics are returned for every loader."""
+    assert set(Loaders().stats().keys()) == {"user_by_id"}
@@ -0,0 +1,135 @@
+"""Tests for the GraphQL schema directives."""
+import pytest
+from ariadne import QueryType, graphql, make_executable_schema
+from starlette.authentication import AuthCredentials, UnauthenticatedUser
+from starlette.requests import Request
+
+from saltapi.auth import authorization
+from saltapi.auth.authorization import AuthenticatedUser, AuthorizationIndex
+from saltapi.graphql.directives import PermittedForDirective
+from saltapi.repository.user_repository import User
+
+TYPE_DEFS = """
+enum Permission {
+    SUBMIT_PROPOSAL
+    VIEW_PROPOSAL
+}
+
+enum Role {
+    ADMINISTRATOR
+}
+
+directive @permittedFor(roles: [Role!], permissions: [Permission!]) on FIELD_DEFINITION
+
+type Query {
+    secret: String @permittedFor(roles: [ADMINISTRATOR])
+    proposal: String @permittedFor(permissions: [VIEW_PROPOSAL])
+    public: String
+}
+"""
+
+
+def _schema():
+    query = QueryType()
+
+    @query.field("secret")
+    async def resolve_secret(*_):
+        return "secret"
+
+    query.set_field("proposal", lambda *_: "proposal")
+    query.set_field("public", lambda *_: "public")
+
+    return make_executable_schema(
+        TYPE_DEFS, query, directives={"permittedFor": PermittedForDirective}
+    )
+
+
+def _request(user_id=None):
+    if user_id is None:
+        user = UnauthenticatedUser()
+    else:
+        user = AuthenticatedUser(
+            User(
+                id=user_id,
+                username="jane",
+                first_name="Jane",
+                last_name="Doe",
+                email="jane@example.com",
+                roles=[],
+                permissions=[],
+            )
+        )
+    return Request(
+        {"type": "http", "user": user, "auth": AuthCredentials(["authenticated"])}
+    )
+
+
+@pytest.fixture
+def index(monkeypatch):
+    """Use an authorization index in which user 1 is an administrator."""
+    index = AuthorizationIndex(refresh_interval=0)
+    index.update([(1, "RightAdmin")])
+    monkeypatch.setattr(authorization, "authorization_index", index)
+    return index
+
+
+async def _query(request, query):
+    _, result = await graphql(
+        _schema(), {"query": query}, context_value={"request": request}
+    )
+    return result
+
+
+@pytest.mark.asyncio
+async def test_permitted_user_may_query_field(index):
+    """A user with a permitted role may query a protected field."""
+    result = await _query(_request(1), "{ secret public }")
+    assert result["data"] == {"secret": "secret", "public": "public"}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("user_id", [2, None])
+async def test_other_users_may_not_query_field(index, user_id):
+    """Users without a permitted role or permission may not query a field."""
+    result = await _query(_request(user_id), "{ secret proposal public }")
+    assert result["data"] == {"secret": None, "proposal": None, "public": "public"}
+    assert {e["message"] for e in result["errors"]} == {"Not authorized."}
+
+
+@pytest.mark.asyncio
+async def test_grants_are_looked_up_once_per_operation(index, monkeypatch):
+    """The user's grants are cached in the context of the operation."""
+    lookups = []
+    grant_set = index.grant_set
+
+    def counting_grant_set(user_id):
+        lookups.append(user_id)
+        return grant_set(user_id)
+
+    monkeypatch.setattr(index, "grant_set", counting_grant_set)
+    context = {"request": _request(1)}
+    await graphql(_schema(), {"query": "{ secret proposal }"}, context_value=context)
+    await graphql(_schema(), {"query": "{ secret }"}, context_value=context)
+    assert lookups == [1]
+
+
+@pytest.mark.asyncio
+async def test_changed_grants_apply_to_running_operations(index):
+    """The grants are looked up again once the authorization index has changed."""
+    context = {"request": _request(1)}
+    _, result = await graphql(_schema(), {"query": "{ secret }"}, context_value=context)
+    assert result["data"] == {"secret": "secret"}
+
+    index.update([])
+    _, result = await graphql(_schema(), {"query": "{ secret }"}, context_value=context)
+    assert result["data"] == {"secret": None}
+
+
+def test_unknown_role_is_rejected_when_schema_is_built():
+    """Roles unknown to the API are detected when the schema is built."""
+    type_defs = TYPE_DEFS.replace("ADMINISTRATOR\n}", "ADMINISTRATOR\n    OWNER\n}")
+    type_defs += "extend type Query { other: String @permittedFor(roles: [OWNER]) }"
+    with pytest.raises(ValueError):
+        make_executable_schema(
+            type_defs, directives={"permittedFor": PermittedForDirective}
+        )
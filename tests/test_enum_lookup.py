@@ -0,0 +1,52 @@
+"""Tests for the lookup of enum members."""
+import enum
+import logging
+
+import pytest
+
+from saltapi.auth.authorization import Permission, Role
+from saltapi.repository.submission_repository import LogMessageType, SubmissionStatus
+from saltapi.util.enum_lookup import EnumLookup
+
+
+class Colour(enum.Enum):
+    """A colour."""
+
+    RED = "red"
+    GREEN = "green"
+
+
+colours = EnumLookup(Colour, "colour")
+
+
+def test_lookup_by_value_and_name():
+    """Members are found by value and by name."""
+    assert colours.by_value("green") is Colour.GREEN
+    assert colours.by_name("RED") is Colour.RED
+
+
+@pytest.mark.parametrize("key", ["blue", "GREEN", None, ["red"]])
+def test_unknown_value_is_rejected(key, caplog):
+    """A ValueError is raised and logged for an unknown value."""
+    with caplog.at_level(logging.ERROR):
+        with pytest.raises(ValueError, match="Unknown colour"):
+            colours.by_value(key)
+    assert f"Unknown colour: {key}" in caplog.text
+
+
+def test_unknown_name_is_rejected():
+    """A ValueError is raised for an unknown name."""
+    with pytest.raises(ValueError, match="Unknown colour: red"):
+        colours.by_name("red")
+
+
+def test_repository_and_auth_enums():
+    """The enums of the repository and auth layers use the lookups."""
+    assert SubmissionStatus.from_value("In Progress") is SubmissionStatus.IN_PROGRESS
+    assert LogMessageType.from_value("Warning") is LogMessageType.WARNING
+    assert Permission.from_name("VIEW_PROPOSAL") is Permission.VIEW_PROPOSAL
+    assert Role.from_name("ADMINISTRATOR") is Role.ADMINISTRATOR
+    with pytest.raises(ValueError, match="Unknown submission status value: Done"):
+        SubmissionStatus.from_value("Done")
+    with pytest.raises(ValueError, match="Unknown role: OWNER"):
+        Role.from_name("OWNER")
@@ -0,0 +1,174 @@
+"""Tests for the cache of GraphQL documents and persisted queries."""
+import pytest
+from ariadne import QueryType, SubscriptionType, make_executable_schema
+from starlette.applications import Starlette
+from starlette.testclient import TestClient
+
+from saltapi.graphql import documents
+from saltapi.graphql.documents import DocumentCache, query_hash
+from saltapi.graphql.server import CachingGraphQL
+
+TYPE_DEFS = """
+type Query {
+    hello(name: String!): String!
+}
+
+type Subscription {
+    counter(up_to: Int!): Int!
+}
+"""
+
+QUERY = "query Hello($name: String!) { hello(name: $name) }"
+
+
+def _schema():
+    query = QueryType()
+    query.set_field("hello", lambda *_, name: f"Hello {name}")
+
+    subscription = SubscriptionType()
+
+    async def count(*_, up_to):
+        for i in range(1, up_to + 1):
+            yield i
+
+    subscription.set_source("counter", count)
+    subscription.set_field("counter", lambda value, *_, **__: value)
+    return make_executable_schema(TYPE_DEFS, query, subscription)
+
+
+@pytest.fixture
+def graphql_app():
+    """Return the GraphQL application."""
+    return CachingGraphQL(_schema(), document_cache_size=2)
+
+
+@pytest.fixture
+def client(graphql_app):
+    """Return a test client for the GraphQL application."""
+    app = Starlette()
+    app.mount("/graphql", graphql_app)
+    return TestClient(app)
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """Count the parsed documents."""
+    parsed = []
+    parse_query = documents.parse_query
+
+    def counting_parse_query(query):
+        parsed.append(query)
+        return parse_query(query)
+
+    monkeypatch.setattr(documents, "parse_query", counting_parse_query)
+    return parsed
+
+
+def _post(client, **data):
+    return client.post("/graphql/", json=data)
+
+
+def test_repeated_queries_are_parsed_once(client, graphql_app, parses):
+    """A repeated query is taken from the cache."""
+    for name in ("Jane", "John", "Jim"):
+        response = _post(client, query=QUERY, variables={"name": name})
+        assert response.json() == {"data": {"hello": f"Hello {name}"}}
+
+    assert parses == [QUERY]
+    stats = graphql_app.documents.stats().documents
+    assert (stats.hits, stats.misses, stats.size) == (2, 1, 1)
+
+
+def test_validation_errors_are_cached(client, parses):
+    """Invalid queries are not validated again."""
+    for _ in range(2):
+        response = _post(client, query="{ goodbye }")
+        assert response.status_code == 400
+        assert "goodbye" in response.json()["errors"][0]["message"]
+    assert len(parses) == 1
+
+
+def test_syntax_errors(client):
+    """Queries which can't be parsed are rejected."""
+    response = _post(client, query="{ hello(")
+    assert response.status_code == 400
+    assert "Syntax Error" in response.json()["errors"][0]["message"]
+
+
+def test_document_cache_is_bounded(graphql_app):
+    """The least recently used documents are evicted."""
+    cache = graphql_app.documents
+    for name in ("a", "b", "c"):
+        cache.compile(f'{{ hello(name: "{name}") }}')
+    stats = cache.stats().documents
+    assert stats.size == 2
+    assert stats.evictions == 1
+
+
+def test_automatic_persisted_queries(client, parses):
+    """A query is stored on first use and can then be sent by its hash."""
+    extensions = {"persistedQuery": {"version": 1, "sha256Hash": query_hash(QUERY)}}
+    response = _post(client, extensions=extensions, variables={"name": "Jane"})
+    assert response.status_code == 400
+    error = response.json()["errors"][0]
+    assert error["message"] == "PersistedQueryNotFound"
+    assert error["extensions"]["code"] == "PERSISTED_QUERY_NOT_FOUND"
+
+    response = _post(
+        client, query=QUERY, extensions=extensions, variables={"name": "Jane"}
+    )
+    assert response.json() == {"data": {"hello": "Hello Jane"}}
+
+    response = _post(client, extensions=extensions, variables={"name": "John"})
+    assert response.json() == {"data": {"hello": "Hello John"}}
+    assert parses == [QUERY]
+
+
+@pytest.mark.parametrize(
+    "persisted_query,message",
+    [
+        ({"version": 1, "sha256Hash": query_hash("{ other }")}, "does not match"),
+        ({"version": 2, "sha256Hash": query_hash(QUERY)}, "Unsupported"),
+        ({"version": 1}, "must be a string"),
+    ],
+)
+def test_invalid_persisted_queries(client, persisted_query, message):
+    """Invalid persisted query extensions are rejected."""
+    response = _post(
+        client,
+        query=QUERY,
+        variables={"name": "Jane"},
+        extensions={"persistedQuery": persisted_query},
+    )
+    assert response.status_code == 400
+    assert message in response.json()["errors"][0]["message"]
+
+
+def test_persisted_query_cache_is_bounded():
+    """The least recently used persisted queries are evicted."""
+    cache = DocumentCache(_schema(), persisted_query_max_size=1)
+    first = cache.persist('{ a: hello(name: "a") }')
+    cache.persist('{ b: hello(name: "b") }')
+    with pytest.raises(documents.PersistedQueryNotFound):
+        cache.resolve_query(
+            {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": first}}}
+        )
+    assert cache.stats().persisted_queries.evictions == 1
+
+
+def test_subscriptions_use_the_cache(client, parses):
+    """Subscriptions are executed with the cached documents."""
+    query = "subscription { counter(up_to: 2) }"
+    for _ in range(2):
+        with client.websocket_connect("/graphql/", ["graphql-ws"]) as ws:
+            ws.send_json({"type": "connection_init"})
+            assert ws.receive_json()["type"] == "connection_ack"
+            ws.send_json({"type": "start", "id": "1", "payload": {"query": query}})
+            received = [ws.receive_json() for _ in range(3)]
+            ws.send_json({"type": "connection_terminate"})
+        assert [m.get("payload") for m in received[:2]] == [
+            {"data": {"counter": 1}},
+            {"data": {"counter": 2}},
+        ]
+        assert received[2]["type"] == "complete"
+    assert parses == [query]
@@ -0,0 +1,132 @@
+"""Tests for the keys used for authentication tokens."""
+import os
+
+import pytest
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from starlette.testclient import TestClient
+
+from saltapi.app import app
+from saltapi.auth.keys import KeyFile
+
+
+class Clock:
+    """A clock which only moves when told to."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        """Return the current time."""
+        return self.now
+
+
+def public_key_pem() -> bytes:
+    """Generate a public key in PEM format."""
+    private_key = rsa.generate_private_key(
+        public_exponent=65537, key_size=2048, backend=default_backend()
+    )
+    return private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+
+
+@pytest.fixture()
+def key_file(tmp_path, monkeypatch):
+    """Provide a file with a public key and the environment variable for it."""
+    path = tmp_path / "rs256_key.pub"
+    path.write_bytes(public_key_pem())
+    monkeypatch.setenv("TEST_PUBLIC_KEY_FILE", str(path))
+    return path
+
+
+def test_keys_are_parsed_once(key_file):
+    """A key is only read and parsed once as long as the file is unchanged."""
+    parsed = []
+
+    def parse(pem: bytes) -> bytes:
+        parsed.append(pem)
+        return pem
+
+    clock = Clock()
+    key = KeyFile("TEST_PUBLIC_KEY_FILE", parse, reload_interval=10, clock=clock)
+    assert key.key == key_file.read_bytes()
+    assert key.pem == key_file.read_bytes()
+    clock.now = 20
+    assert key.key == key_file.read_bytes()
+    assert len(parsed) == 1
+
+
+def test_keys_are_reloaded_when_the_file_changes(key_file):
+    """A changed key file is read again after the reload interval."""
+    clock = Clock()
+    key = KeyFile("TEST_PUBLIC_KEY_FILE", lambda pem: pem, 10, clock=clock)
+    old_pem = key.pem
+    old_etag = key.etag
+
+    new_pem = public_key_pem()
+    key_file.write_bytes(new_pem)
+    stat = os.stat(key_file)
+    os.utime(key_file, (stat.st_atime, stat.st_mtime + 1))
+    clock.now = 9
+    assert key.pem == old_pem
+    clock.now = 10
+    assert key.pem == new_pem
+    assert key.etag != old_etag
+
+
+def test_invalid_key_files_are_not_loaded(key_file):
+    """The previous key is kept while the key file is invalid."""
+    clock = Clock()
+    key = KeyFile(
+        "TEST_PUBLIC_KEY_FILE",
+        lambda pem: serialization.load_pem_public_key(pem, backend=default_backend()),
+        10,
+        clock=clock,
+    )
+    old_pem = key.pem
+    old_key = key.key
+
+    key_file.write_bytes(b"-----BEGIN PUBLIC KEY-----\ninvalid")
+    stat = os.stat(key_file)
+    os.utime(key_file, (stat.st_atime, stat.st_mtime + 1))
+    clock.now = 10
+    assert key.pem == old_pem
+    assert key.key is old_key
+
+    new_pem = public_key_pem()
+    key_file.write_bytes(new_pem)
+    os.utime(key_file, (stat.st_atime, stat.st_mtime + 2))
+    clock.now = 20
+    assert key.pem == new_pem
+
+
+def test_keys_can_be_reloaded_explicitly(key_file):
+    """The reload method reads the key file again."""
+    key = KeyFile("TEST_PUBLIC_KEY_FILE", lambda pem: pem, 10, clock=Clock())
+    assert key.pem == key_file.read_bytes()
+    new_pem = public_key_pem()
+    key_file.write_bytes(new_pem)
+    key.reload()
+    assert key.pem == new_pem
+
+
+def test_public_key_is_served_with_etag(key_file, monkeypatch):
+    """The public key is served with an entity tag and can be revalidated."""
+    public_key = KeyFile(
+        "TEST_PUBLIC_KEY_FILE", lambda pem: pem, reload_interval=60, clock=Clock()
+    )
+    monkeypatch.setattr("saltapi.routes.rs256_public_key", public_key)
+    client = TestClient(app)
+
+    response = client.get("/public-key")
+    assert response.status_code == 200
+    assert response.text == key_file.read_text()
+    assert response.headers["Cache-Control"] == "public, max-age=60"
+    etag = response.headers["ETag"]
+
+    response = client.get("/public-key", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
@@ -0,0 +1,29 @@
+"""Tests for values bound to an event loop."""
+import asyncio
+
+from saltapi.util.loop_local import LoopLocal
+
+
+def test_values_are_created_once_per_event_loop():
+    """The value is reused in an event loop and created again in another one."""
+    lock = LoopLocal(asyncio.Lock)
+    assert lock.value is None and lock.loop is None
+
+    async def get_twice():
+        first = lock.get()
+        assert lock.get() is first
+        return first
+
+    values = []
+    for _ in range(2):
+        loop = asyncio.new_event_loop()
+        try:
+            asyncio.set_event_loop(loop)
+            values.append(loop.run_until_complete(get_twice()))
+            assert lock.loop is loop
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    assert values[0] is not values[1]
+    assert lock.value is values[1]
@@ -0,0 +1,100 @@
+"""Tests for streaming multipart request bodies."""
+from io import BytesIO
+
+import pytest
+from starlette.datastructures import Headers, UploadFile
+from starlette.formparsers import MultiPartParser
+
+from saltapi.submission.multipart import MultipartFileUpload
+from saltapi.util.error import UsageError
+
+
+class UnseekableFile(BytesIO):
+    """A file whose size cannot be determined without reading it."""
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        """Only allow rewinding the file."""
+        if offset != 0 or whence != 0:
+            raise OSError("The file is not seekable.")
+        return super().seek(offset, whence)
+
+    def tell(self) -> int:
+        """Refuse to return the current position."""
+        raise OSError("The file is not seekable.")
+
+
+async def collect(body: MultipartFileUpload):
+    """Return the chunks of a body."""
+    return [chunk async for chunk in body]
+
+
+@pytest.mark.asyncio
+async def test_body_is_valid_multipart():
+    """The body can be parsed as multipart/form-data."""
+    content = bytes(range(256)) * 1000
+    body = MultipartFileUpload(
+        data={"submitter": "someone", "proposal_code": "2021-1-SCI-001"},
+        file_field="proposal",
+        file=UploadFile(filename="proposal.zip", file=BytesIO(content)),
+        max_file_size=len(content),
+        chunk_size=1000,
+    )
+    chunks = await collect(body)
+    assert int(body.headers["Content-Length"]) == sum(len(c) for c in chunks)
+
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    form = await MultiPartParser(Headers(body.headers), stream()).parse()
+    assert form["submitter"] == "someone"
+    assert form["proposal_code"] == "2021-1-SCI-001"
+    assert form["proposal"].filename == "proposal.zip"
+    assert await form["proposal"].read() == content
+
+
+@pytest.mark.asyncio
+async def test_file_is_read_in_chunks():
+    """No chunk of the body is larger than the chunk size."""
+    content = b"x" * 100_000
+    body = MultipartFileUpload(
+        data={},
+        file_field="proposal",
+        file=UploadFile(filename="proposal.zip", file=BytesIO(content)),
+        max_file_size=len(content),
+        chunk_size=4096,
+    )
+    chunks = await collect(body)
+    assert max(len(chunk) for chunk in chunks) <= 4096
+    assert len(chunks) > 100_000 // 4096
+
+
+def test_too_large_files_are_rejected_before_sending():
+    """A file which is known to be too large is rejected immediately."""
+    with pytest.raises(UsageError) as excinfo:
+        MultipartFileUpload(
+            data={},
+            file_field="proposal",
+            file=UploadFile(filename="proposal.zip", file=BytesIO(b"x" * 11)),
+            max_file_size=10,
+        )
+    assert excinfo.value.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_too_large_files_are_rejected_while_sending():
+    """A file of unknown size is rejected as soon as it is found to be too large."""
+    body = MultipartFileUpload(
+        data={},
+        file_field="proposal",
+        file=UploadFile(filename="proposal.zip", file=UnseekableFile(b"x" * 100)),
+        max_file_size=50,
+        chunk_size=10,
+    )
+    assert "Content-Length" not in body.headers
+    sent = []
+    with pytest.raises(UsageError):
+        async for chunk in body:
+            sent.append(chunk)
+    # the preamble and five chunks of the file
+    assert len(sent) == 6
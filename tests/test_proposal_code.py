@@ -104,3 +104,11 @@ def test_file_with_xml_namespace():
         code, "utf-8"
     )
     assert get_proposal_code(create_zip(file)) == code
+
+
+def test_only_the_root_start_tag_is_parsed():
+    """The proposal code is found without parsing the rest of the file."""
+    file = b"""<?xml version="1.0" encoding="UTF-8" standalone="yes" ?>
+          <Proposal code="2020-2-SCI-009"><Block>"""
+    file += b"<Block>" * 100_000  # the file is incomplete
+    assert get_proposal_code(create_zip(file)) == "2020-2-SCI-009"
@@ -0,0 +1,197 @@
+"""Tests for inspecting proposal files in a worker pool."""
+import asyncio
+import os
+import tempfile
+import time
+from io import BytesIO
+from typing import Optional
+from zipfile import ZipFile
+
+import pytest
+
+from saltapi.submission import inspection
+from saltapi.submission.inspection import ProposalInspector
+from saltapi.util.error import UsageError
+
+CODE = "2020-2-SCI-009"
+
+
+def create_zip(code: str = CODE) -> BytesIO:
+    """Create a proposal zip file with a proposal code."""
+    archive = BytesIO()
+    with ZipFile(archive, "w") as zip_file:
+        with zip_file.open("Proposal.xml", "w") as proposal_file:
+            proposal_file.write(b'<Proposal code="%b"></Proposal>' % code.encode())
+    archive.seek(0)
+    return archive
+
+
+def slow_get_proposal_code(proposal_zip) -> Optional[str]:
+    """Extract the proposal code slowly."""
+    time.sleep(0.2)
+    return CODE
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("executor_type", ["thread", "process"])
+async def test_proposal_code_is_extracted(executor_type):
+    """The proposal code is extracted in a thread or process pool."""
+    inspector = ProposalInspector(executor_type=executor_type, max_workers=2)
+    try:
+        assert await inspector.get_proposal_code(create_zip()) == CODE
+    finally:
+        inspector.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_errors_are_passed_on():
+    """Errors raised by the inspection are raised by the inspector."""
+    inspector = ProposalInspector(executor_type="thread")
+    with pytest.raises(ValueError) as excinfo:
+        await inspector.get_proposal_code(BytesIO(b"not a zip file"))
+    assert "not a zip file" in str(excinfo.value)
+    inspector.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_inspections_run_in_parallel(monkeypatch):
+    """Concurrent inspections run in parallel without blocking the event loop."""
+    monkeypatch.setattr(inspection, "get_proposal_code", slow_get_proposal_code)
+    inspector = ProposalInspector(executor_type="thread", max_workers=4)
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.ensure_future(tick())
+    start = time.perf_counter()
+    codes = await asyncio.gather(
+        *(inspector.get_proposal_code(create_zip()) for _ in range(4))
+    )
+    duration = time.perf_counter() - start
+    ticker.cancel()
+    inspector.shutdown()
+
+    assert codes == [CODE] * 4
+    assert duration < 0.6
+    assert ticks >= 5
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_limited(monkeypatch):
+    """No more inspections than workers run at the same time."""
+    monkeypatch.setattr(inspection, "get_proposal_code", slow_get_proposal_code)
+    inspector = ProposalInspector(executor_type="thread", max_workers=2)
+    start = time.perf_counter()
+    await asyncio.gather(*(inspector.get_proposal_code(create_zip()) for _ in range(4)))
+    duration = time.perf_counter() - start
+    inspector.shutdown()
+
+    assert duration >= 0.4
+
+
+@pytest.mark.asyncio
+async def test_slow_inspections_time_out(monkeypatch):
+    """An inspection taking too long raises a timeout error."""
+    monkeypatch.setattr(inspection, "get_proposal_code", slow_get_proposal_code)
+    inspector = ProposalInspector(executor_type="thread", timeout=0.05)
+    with pytest.raises(asyncio.TimeoutError):
+        await inspector.get_proposal_code(create_zip())
+    inspector.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_workers_are_busy_until_timed_out_inspections_finish(monkeypatch):
+    """A worker isn't freed before its inspection has finished."""
+    monkeypatch.setattr(inspection, "get_proposal_code", slow_get_proposal_code)
+    inspector = ProposalInspector(executor_type="thread", max_workers=1, timeout=0.05)
+    with pytest.raises(asyncio.TimeoutError):
+        await inspector.get_proposal_code(create_zip())
+    assert inspector._worker_slots.get().locked()
+
+    await asyncio.sleep(0.3)
+    assert not inspector._worker_slots.get().locked()
+    inspector.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_process_pools_are_given_a_temporary_file(monkeypatch):
+    """A process pool inspects a temporary copy of the file, which is removed."""
+    spooled_paths = []
+    mkstemp = tempfile.mkstemp
+
+    def recording_mkstemp(*args, **kwargs):
+        fd, path = mkstemp(*args, **kwargs)
+        spooled_paths.append(path)
+        return fd, path
+
+    monkeypatch.setattr(inspection.tempfile, "mkstemp", recording_mkstemp)
+    inspector = ProposalInspector(executor_type="process", max_workers=1)
+    try:
+        assert await inspector.get_proposal_code(create_zip()) == CODE
+    finally:
+        inspector.shutdown()
+
+    assert len(spooled_paths) == 1
+    assert not os.path.exists(spooled_paths[0])
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("executor_type", ["thread", "process"])
+async def test_file_positions_are_kept(executor_type):
+    """A file is inspected from its start and keeps its position."""
+    inspector = ProposalInspector(executor_type=executor_type, max_workers=1)
+    proposal_zip = create_zip()
+    proposal_zip.seek(10)
+    try:
+        assert await inspector.get_proposal_code(proposal_zip) == CODE
+    finally:
+        inspector.shutdown()
+    assert proposal_zip.tell() == 10
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "file_code,proposal_code,error",
+    [
+        (CODE, CODE, None),
+        ("Unsubmitted-001", None, None),
+        (CODE, None, "no proposal code is given"),
+        ("Unsubmitted-001", CODE, "contains no proposal code"),
+        (CODE, "2021-1-SCI-001", "differs from the proposal code"),
+    ],
+)
+async def test_check_proposal_code(file_code, proposal_code, error):
+    """The proposal code in a file must be the given one."""
+    inspector = ProposalInspector(executor_type="thread")
+    try:
+        if error is None:
+            await inspector.check_proposal_code(create_zip(file_code), proposal_code)
+        else:
+            with pytest.raises(UsageError) as excinfo:
+                await inspector.check_proposal_code(
+                    create_zip(file_code), proposal_code
+                )
+            assert error in str(excinfo.value.message)
+            assert excinfo.value.status_code == 400
+    finally:
+        inspector.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_check_proposal_code_rejects_invalid_files():
+    """A file which isn't a proposal file is rejected as a usage error."""
+    inspector = ProposalInspector(executor_type="thread")
+    with pytest.raises(UsageError) as excinfo:
+        await inspector.check_proposal_code(BytesIO(b"not a zip file"), None)
+    inspector.shutdown()
+    assert excinfo.value.message == "The file supplied is not a zip file"
+
+
+def test_unsupported_executor_types_are_rejected():
+    """Only thread and process pools are supported."""
+    with pytest.raises(ValueError):
+        ProposalInspector(executor_type="fibre")
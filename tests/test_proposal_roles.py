@@ -0,0 +1,66 @@
+"""Tests for the roles of users on proposals."""
+import pytest
+
+from saltapi.auth.authorization import can_re_submit_proposal
+from saltapi.repository.database import database
+from saltapi.repository.user_repository import (
+    ProposalRole,
+    find_cached_proposal_roles,
+    find_proposal_roles,
+    proposal_role_cache,
+)
+
+ROLES = {
+    ("jane", "2021-1-SCI-001"): (1, 0, 1),
+    ("john", "2021-1-SCI-001"): (0, 1, 1),
+    ("jim", "2021-1-SCI-001"): (0, 0, 1),
+}
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    """Record the queries sent to the database."""
+    proposal_role_cache.clear()
+    recorded = []
+
+    async def fetch_one(query):
+        values = query.compile().params
+        recorded.append((str(query), values))
+        return ROLES.get((values["username"], values["proposal_code"]))
+
+    monkeypatch.setattr(database, "fetch_one", fetch_one)
+    return recorded
+
+
+@pytest.mark.asyncio
+async def test_find_proposal_roles(queries):
+    """All roles are read with a single query."""
+    roles = await find_proposal_roles("jane", "2021-1-SCI-001")
+    assert roles == {ProposalRole.PRINCIPAL_INVESTIGATOR, ProposalRole.INVESTIGATOR}
+    assert len(queries) == 1
+
+
+@pytest.mark.asyncio
+async def test_find_proposal_roles_for_unrelated_user(queries):
+    """A user without any role on a proposal has no roles."""
+    assert await find_proposal_roles("joan", "2021-1-SCI-001") == frozenset()
+
+
+@pytest.mark.asyncio
+async def test_proposal_roles_are_cached(queries):
+    """The roles of a user on a proposal are only read once."""
+    for _ in range(3):
+        roles = await find_cached_proposal_roles("john", "2021-1-SCI-001")
+        assert ProposalRole.PRINCIPAL_CONTACT in roles
+    assert len(queries) == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "username,allowed",
+    [("jane", True), ("john", True), ("jim", False), ("joan", False)],
+)
+async def test_can_re_submit_proposal(queries, username, allowed):
+    """Only the Principal Investigator and Principal Contact can resubmit."""
+    assert await can_re_submit_proposal("2021-1-SCI-001", username) is allowed
+    assert len(queries) == 1
@@ -0,0 +1,74 @@
+"""Tests for the query registry."""
+import asyncio
+
+import pytest
+
+from saltapi.repository.query_registry import QueryRegistry
+
+
+class FakeDatabase:
+    """A fake database recording the executed queries."""
+
+    def __init__(self, delay: float = 0) -> None:
+        self.delay = delay
+        self.queries = []
+
+    async def fetch_all(self, query):
+        """Record a query and return no rows."""
+        await asyncio.sleep(self.delay)
+        self.queries.append((str(query), query.compile().params))
+        return []
+
+    async def fetch_one(self, query):
+        """Record a query and return no row."""
+        await asyncio.sleep(self.delay)
+        self.queries.append((str(query), query.compile().params))
+        return None
+
+
+@pytest.mark.asyncio
+async def test_statements_are_executed_by_name():
+    """A registered statement is executed with the given values."""
+    db = FakeDatabase()
+    registry = QueryRegistry(db)
+    registry.register("find_user", "SELECT * FROM PiptUser WHERE Username=:username")
+    await registry.fetch_one("find_user", {"username": "jane"})
+    await registry.fetch_all("find_user", {"username": "john"})
+
+    assert db.queries == [
+        ("SELECT * FROM PiptUser WHERE Username=:username", {"username": "jane"}),
+        ("SELECT * FROM PiptUser WHERE Username=:username", {"username": "john"}),
+    ]
+
+
+def test_names_must_be_unique():
+    """A name can only be registered once."""
+    registry = QueryRegistry(FakeDatabase())
+    registry.register("find_user", "SELECT 1")
+    with pytest.raises(ValueError):
+        registry.register("find_user", "SELECT 2")
+
+
+@pytest.mark.asyncio
+async def test_unknown_statements_are_rejected():
+    """Executing an unregistered statement raises an error."""
+    registry = QueryRegistry(FakeDatabase())
+    with pytest.raises(KeyError):
+        await registry.fetch_all("find_user")
+
+
+@pytest.mark.asyncio
+async def test_latencies_are_recorded():
+    """The latency of every execution is recorded in the statement's histogram."""
+    registry = QueryRegistry(FakeDatabase(delay=0.03), bucket_bounds=(0.01, 0.1))
+    registry.register("slow", "SELECT 1")
+    registry.register("unused", "SELECT 2")
+    for _ in range(3):
+        await registry.fetch_one("slow")
+
+    latencies = registry.latencies()
+    assert latencies["slow"].counts == (0, 3, 0)
+    assert latencies["slow"].count == 3
+    assert 0.03 <= latencies["slow"].mean_seconds < 0.1
+    assert latencies["slow"].quantile_bound(0.99) == 0.1
+    assert latencies["unused"].count == 0
@@ -0,0 +1,107 @@
+"""Tests for the statistics collected by the server."""
+import dataclasses
+import json
+
+import pytest
+from starlette.authentication import AuthCredentials, UnauthenticatedUser
+from starlette.requests import Request
+
+from saltapi import routes
+from saltapi.app import app  # noqa: F401 (registers the statistics)
+from saltapi.auth import authorization
+from saltapi.auth.authorization import AuthenticatedUser, AuthorizationIndex
+from saltapi.repository.user_repository import User
+from saltapi.util.error import UsageError
+from saltapi.util.stats import StatsRegistry
+
+
+@dataclasses.dataclass(frozen=True)
+class Counts:
+    """Statistics for testing."""
+
+    hits: int
+    misses: int
+
+
+def _request(user_id=None):
+    if user_id is None:
+        user = UnauthenticatedUser()
+    else:
+        user = AuthenticatedUser(
+            User(
+                id=user_id,
+                username="jane",
+                first_name="Jane",
+                last_name="Doe",
+                email="jane@example.com",
+                roles=[],
+                permissions=[],
+            )
+        )
+    return Request(
+        {"type": "http", "user": user, "auth": AuthCredentials(["authenticated"])}
+    )
+
+
+@pytest.fixture
+def index(monkeypatch):
+    """Use an authorization index in which user 1 is an administrator."""
+    index = AuthorizationIndex(refresh_interval=0)
+    index.update([(1, "RightAdmin")])
+    monkeypatch.setattr(authorization, "authorization_index", index)
+    return index
+
+
+@pytest.mark.asyncio
+async def test_statistics_are_collected_from_all_providers():
+    """Dataclasses, dictionaries of dataclasses and awaitables are collected."""
+
+    async def pool():
+        return Counts(hits=3, misses=4)
+
+    registry = StatsRegistry()
+    registry.register("cache", lambda: Counts(hits=1, misses=2))
+    registry.register("pool", pool)
+    registry.register("queries", lambda: {"a": Counts(hits=5, misses=6)})
+    registry.register("database", lambda: None)
+
+    assert await registry.collect() == {
+        "cache": {"hits": 1, "misses": 2},
+        "pool": {"hits": 3, "misses": 4},
+        "queries": {"a": {"hits": 5, "misses": 6}},
+        "database": None,
+    }
+
+
+def test_statistics_names_must_be_unique():
+    """A name can only be registered once."""
+    registry = StatsRegistry()
+    registry.register("cache", lambda: None)
+    with pytest.raises(ValueError):
+        registry.register("cache", lambda: None)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("user_id,status_code", [(None, 401), (2, 403)])
+async def test_statistics_are_only_served_to_administrators(
+    index, user_id, status_code
+):
+    """Only administrators may request the statistics."""
+    with pytest.raises(UsageError) as excinfo:
+        await routes.stats(_request(user_id))
+    assert excinfo.value.status_code == status_code
+
+
+@pytest.mark.asyncio
+async def test_statistics_are_served_to_administrators(index):
+    """The statistics of the server are served as JSON."""
+    response = await routes.stats(_request(1))
+    assert response.status_code == 200
+    stats = json.loads(response.body)
+    assert "queries" in stats["progress_polling"]
+    assert "hits" in stats["user_cache"]
+    assert "idle_connections" in stats["storage_service"]
+    assert "database_pool" in stats
+    assert isinstance(stats["query_latencies"], dict)
+    assert "queued" in stats["submission_queue"]
+    assert "persisted_queries" in stats["graphql_documents"]
@@ -0,0 +1,217 @@
+"""Tests for the storage service client."""
+import asyncio
+from io import BytesIO
+from typing import List, Set
+
+import httpx
+import pytest
+from starlette.datastructures import UploadFile
+
+from saltapi.auth.token import ServiceTokenProvider
+from saltapi.submission import submit
+from saltapi.submission.storage import StorageServiceClient
+from saltapi.submission.submit import submit_proposal
+from saltapi.util.error import UsageError
+
+SUBMISSIONS = 20
+
+
+class StandInStorageServer:
+    """
+    A local HTTP/1.1 server standing in for the storage service.
+
+    The server responds with a 503 error to the first failures requests. If stall is
+    True, the server reads requests but never responds.
+    """
+
+    def __init__(self, failures: int = 0, stall: bool = False) -> None:
+        self.failures = failures
+        self.stall = stall
+        self.connections = 0
+        self.requests = 0
+        self.active_requests = 0
+        self.max_active_requests = 0
+        self.largest_body = 0
+        self.url = ""
+        self._server: asyncio.AbstractServer
+        self._handlers: Set["asyncio.Task[None]"] = set()
+
+    async def __aenter__(self) -> "StandInStorageServer":
+        """Start the server."""
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/proposal/submit"
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        """Stop the server."""
+        self._server.close()
+        await self._server.wait_closed()
+        for handler in self._handlers:
+            handler.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connections += 1
+        handler = asyncio.current_task()
+        assert handler is not None
+        self._handlers.add(handler)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                self.active_requests += 1
+                self.max_active_requests = max(
+                    self.max_active_requests, self.active_requests
+                )
+                headers = self._headers(head.decode("latin-1").split("\r\n")[1:])
+                if headers.get("transfer-encoding") == "chunked":
+                    body_size = await self._read_chunks(reader)
+                else:
+                    body_size = int(headers.get("content-length", "0"))
+                    await reader.readexactly(body_size)
+                self.requests += 1
+                self.largest_body = max(self.largest_body, body_size)
+                if self.stall:
+                    await asyncio.Event().wait()
+                # keep the connection busy so that submissions overlap
+                await asyncio.sleep(0.01)
+                if self.requests <= self.failures:
+                    status = b"503 Service Unavailable"
+                    body = b'{"error": "The storage service is unavailable."}'
+                else:
+                    status = b"200 OK"
+                    body = b'{"submission_id": "abc"}'
+                self.active_requests -= 1
+                writer.write(
+                    b"HTTP/1.1 " + status + b"\r\n"
+                    b"Content-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_chunks(reader: asyncio.StreamReader) -> int:
+        size = 0
+        while True:
+            chunk_size = int((await reader.readuntil(b"\r\n")).strip(), 16)
+            await reader.readexactly(chunk_size + 2)
+            size += chunk_size
+            if chunk_size == 0:
+                return size
+
+    @staticmethod
+    def _headers(lines: List[str]) -> dict:
+        headers = {}
+        for line in lines:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        return headers
+
+
+def proposal() -> UploadFile:
+    """Return a proposal file."""
+    return UploadFile(filename="proposal.zip", file=BytesIO(b"proposal"))
+
+
+@pytest.fixture()
+def service_token(monkeypatch):
+    """Use a service token signed with the HS256 algorithm."""
+    monkeypatch.setattr(
+        submit,
+        "storage_service_token",
+        ServiceTokenProvider(submit.storage_service_token.user, algorithm="HS256"),
+    )
+
+
+@pytest.mark.asyncio
+async def test_concurrent_submissions_share_connections(monkeypatch, service_token):
+    """Concurrent submissions reuse the connections of a bounded pool."""
+    storage_service = StorageServiceClient(max_connections=4)
+    monkeypatch.setattr(submit, "storage_service", storage_service)
+    async with StandInStorageServer() as server:
+        monkeypatch.setattr(submit, "proposal_submission_url", server.url)
+        submission_ids = await asyncio.gather(
+            *(submit_proposal(proposal(), None, "someone") for _ in range(SUBMISSIONS))
+        )
+        stats = await storage_service.stats()
+        await storage_service.close()
+
+    assert submission_ids == ["abc"] * SUBMISSIONS
+    assert server.requests == SUBMISSIONS
+    assert server.connections <= 4
+    assert stats.requests == SUBMISSIONS
+    assert stats.connections <= 4
+    assert stats.idle_connections == stats.connections
+
+
+@pytest.mark.asyncio
+async def test_clients_per_submission_need_more_connections():
+    """Without a shared client every concurrent submission opens a connection."""
+
+    async def post(url: str) -> None:
+        async with httpx.AsyncClient() as client:
+            await client.post(url, files={"proposal": BytesIO(b"proposal")})
+
+    async with StandInStorageServer() as server:
+        await asyncio.gather(*(post(server.url) for _ in range(SUBMISSIONS)))
+
+    assert server.connections == SUBMISSIONS
+
+
+@pytest.mark.asyncio
+async def test_closed_clients_are_recreated():
+    """The client is created again when it is used after closing."""
+    storage_service = StorageServiceClient()
+    await storage_service.start()
+    client = storage_service.client
+    await storage_service.close()
+    assert client.is_closed
+    assert storage_service.client is not client
+    await storage_service.close()
+
+
+@pytest.mark.asyncio
+async def test_large_proposals_are_streamed(monkeypatch, service_token):
+    """A large proposal is sent in full to the storage service."""
+    storage_service = StorageServiceClient()
+    monkeypatch.setattr(submit, "storage_service", storage_service)
+    content = b"x" * (5 * 1024 * 1024)
+    async with StandInStorageServer() as server:
+        monkeypatch.setattr(submit, "proposal_submission_url", server.url)
+        large_proposal = UploadFile(filename="proposal.zip", file=BytesIO(content))
+        submission_id = await submit_proposal(large_proposal, None, "someone")
+        await storage_service.close()
+
+    assert submission_id == "abc"
+    assert server.largest_body > len(content)
+
+
+@pytest.mark.asyncio
+async def test_proposal_size_is_enforced_while_streaming(monkeypatch, service_token):
+    """A proposal of unknown size is rejected once it exceeds the maximum size."""
+
+    class UnsizedFile(BytesIO):
+        def tell(self) -> int:
+            raise OSError("The size of the file is unknown.")
+
+    storage_service = StorageServiceClient()
+    monkeypatch.setattr(submit, "storage_service", storage_service)
+    monkeypatch.setattr(submit, "MAX_PROPOSAL_SIZE", 1024 * 1024)
+    async with StandInStorageServer() as server:
+        monkeypatch.setattr(submit, "proposal_submission_url", server.url)
+        large_proposal = UploadFile(
+            filename="proposal.zip", file=UnsizedFile(b"x" * (2 * 1024 * 1024))
+        )
+        with pytest.raises(UsageError) as excinfo:
+            await submit_proposal(large_proposal, None, "someone")
+        await storage_service.close()
+
+    assert excinfo.value.status_code == 413
+    assert server.requests == 0
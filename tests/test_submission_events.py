@@ -0,0 +1,162 @@
+"""Tests for the server-sent events for the progress of a submission."""
+import asyncio
+import json
+
+import pytest
+from starlette.testclient import TestClient
+
+from saltapi.app import app
+from saltapi.repository import submission_repository
+from saltapi.repository.submission_repository import SubmissionStatus
+from saltapi.submission.events import progress_event_stream
+from saltapi.submission.polling import FixedIntervalPolicy
+from saltapi.submission.progress import SubmissionProgressHub
+from tests.test_submission_progress import FakeDatabase
+
+SUBMISSION_ID = "a1b2c3"
+
+
+@pytest.fixture
+def submission(monkeypatch):
+    """Return a fake submission and use it instead of the database."""
+    fake = FakeDatabase()
+    for name in (
+        "find_submission_progress",
+        "find_submission_states",
+        "find_new_log_entries",
+    ):
+        monkeypatch.setattr(submission_repository, name, getattr(fake, name))
+    return fake.add(SUBMISSION_ID)
+
+
+def parse_events(body: str):
+    """Parse a stream of server-sent events, ignoring comments."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(
+            line.split(": ", 1)
+            for line in block.split("\n")
+            if not line.startswith(":")
+        )
+        if fields:
+            events.append(fields)
+    return events
+
+
+def test_progress_is_streamed(submission):
+    """The progress of a submission is sent as server-sent events."""
+    submission.log("Started")
+    submission.log("Finished")
+    submission.status = SubmissionStatus.SUCCESSFUL
+    client = TestClient(app)
+
+    response = client.get(f"/submissions/{SUBMISSION_ID}/progress")
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/event-stream")
+    events = parse_events(response.text)
+    assert len(events) == 1
+    assert events[0]["id"] == "2"
+    assert events[0]["event"] == "progress"
+    data = json.loads(events[0]["data"])
+    assert data["status"] == "SUCCESSFUL"
+    assert data["latestEntry"] == 2
+    assert [le["message"] for le in data["logEntries"]] == ["Started", "Finished"]
+
+
+def test_progress_is_resumed_after_last_event_id(submission):
+    """Only the log entries after the Last-Event-ID are sent."""
+    for i in range(3):
+        submission.log(f"Entry {i + 1}")
+    submission.status = SubmissionStatus.SUCCESSFUL
+    client = TestClient(app)
+
+    response = client.get(
+        f"/submissions/{SUBMISSION_ID}/progress", headers={"Last-Event-ID": "2"}
+    )
+
+    data = json.loads(parse_events(response.text)[0]["data"])
+    assert [le["message"] for le in data["logEntries"]] == ["Entry 3"]
+    assert data["latestEntry"] == 3
+
+
+def test_finished_streams_are_not_resumed(submission):
+    """A client resuming the stream of a finished submission is told to stop."""
+    submission.log("Started")
+    submission.log("Finished")
+    submission.status = SubmissionStatus.SUCCESSFUL
+    client = TestClient(app)
+
+    response = client.get(f"/submissions/{SUBMISSION_ID}/progress")
+    last_event_id = parse_events(response.text)[-1]["id"]
+    response = client.get(
+        f"/submissions/{SUBMISSION_ID}/progress",
+        headers={"Last-Event-ID": last_event_id},
+    )
+
+    assert response.status_code == 204
+    assert response.text == ""
+
+
+@pytest.mark.parametrize("last_event_id", ["abc", "-1"])
+def test_invalid_last_event_id(submission, last_event_id):
+    """An invalid Last-Event-ID header is rejected."""
+    client = TestClient(app)
+
+    response = client.get(
+        f"/submissions/{SUBMISSION_ID}/progress",
+        headers={"Last-Event-ID": last_event_id},
+    )
+
+    assert response.status_code == 400
+
+
+def test_unknown_submission(submission):
+    """A 404 error is returned for an unknown submission."""
+    client = TestClient(app)
+
+    response = client.get("/submissions/unknown/progress")
+
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_heartbeats_are_sent_while_there_are_no_updates(submission):
+    """A comment is sent if there has been no update for a while."""
+    hub = SubmissionProgressHub(lambda: FixedIntervalPolicy(0.02), tick_interval=0.02)
+    submission.log("Started")
+    response = await progress_event_stream(
+        SUBMISSION_ID, hub=hub, heartbeat_interval=0.005
+    )
+    events = response.body_iterator
+
+    assert b"event: progress" in await events.__anext__()
+    assert await events.__anext__() == b": heartbeat\n\n"
+
+    await events.aclose()
+    assert hub.watched_submissions == set()
+
+
+@pytest.mark.asyncio
+async def test_streaming_stops_when_the_client_disconnects(submission):
+    """The subscription ends when the client disconnects."""
+    hub = SubmissionProgressHub(lambda: FixedIntervalPolicy(0.01), tick_interval=0.01)
+    submission.log("Started")
+    response = await progress_event_stream(SUBMISSION_ID, hub=hub)
+    sent = []
+    first_event_sent = asyncio.Event()
+
+    async def send(message):
+        sent.append(message)
+        if message.get("body"):
+            first_event_sent.set()
+
+    async def receive():
+        await first_event_sent.wait()
+        return {"type": "http.disconnect"}
+
+    await response({"type": "http"}, receive, send)
+
+    assert sent[0]["type"] == "http.response.start"
+    assert b"Started" in sent[1]["body"]
+    assert hub.watched_submissions == set()
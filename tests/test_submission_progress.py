@@ -0,0 +1,446 @@
+"""Tests for the submission progress hub."""
+import asyncio
+from datetime import datetime
+from typing import Dict, Iterable
+
+import pytest
+
+from saltapi.repository import submission_repository
+from saltapi.repository.submission_repository import (
+    LogMessageType,
+    SubmissionLog,
+    SubmissionProgress,
+    SubmissionState,
+    SubmissionStatus,
+)
+from saltapi.submission.polling import (
+    BackoffPolicy,
+    FixedIntervalPolicy,
+    PollIntervalPolicy,
+)
+from saltapi.submission.progress import SubmissionProgressHub
+
+SUBMISSION_ID = "a1b2c3"
+
+
+class FakeDatabase:
+    """Fake submissions, which can be queried like the database."""
+
+    def __init__(self) -> None:
+        self.submissions: Dict[str, "FakeSubmission"] = {}
+        self.queries = 0
+        self.log_queries = 0
+        self.log_rows = 0
+
+    def add(self, identifier: str) -> "FakeSubmission":
+        """Add a submission."""
+        submission = FakeSubmission(identifier, self)
+        self.submissions[identifier] = submission
+        return submission
+
+    async def find_submission_progress(
+        self, identifier: str, after_entry_number: int, max_log_entries: int = 100000
+    ) -> SubmissionProgress:
+        """Mock finding the submission progress."""
+        self.queries += 1
+        submission = self.submissions[identifier]
+        log_entries = submission.log_entries.after(after_entry_number)
+        return SubmissionProgress(
+            submission_identifier=identifier,
+            status=submission.status,
+            log_entries=log_entries[:max_log_entries],
+            more_log_entries=len(log_entries) > max_log_entries,
+        )
+
+    async def find_submission_states(
+        self, identifiers: Iterable[str]
+    ) -> Dict[str, SubmissionState]:
+        """Mock finding the states of submissions."""
+        self.queries += 1
+        return {
+            identifier: SubmissionState(
+                submission_identifier=identifier,
+                status=self.submissions[identifier].status,
+                last_entry_number=len(self.submissions[identifier].log_entries),
+            )
+            for identifier in identifiers
+            if identifier in self.submissions
+        }
+
+    async def find_new_log_entries(
+        self, after_entry_numbers: Dict[str, int], max_log_entries: int = 100000
+    ) -> Dict[str, SubmissionLog]:
+        """Mock finding the new log entries of submissions."""
+        self.queries += 1
+        self.log_queries += 1
+        logs = {}
+        for identifier, after_entry_number in after_entry_numbers.items():
+            log_entries = self.submissions[identifier].log_entries
+            logs[identifier] = log_entries.after(after_entry_number)[:max_log_entries]
+            self.log_rows += len(logs[identifier])
+        return logs
+
+
+class FakeSubmission:
+    """A fake submission."""
+
+    def __init__(self, identifier: str, database: FakeDatabase) -> None:
+        self.database = database
+        self.status = SubmissionStatus.IN_PROGRESS
+        self.log_entries = SubmissionLog(identifier)
+
+    @property
+    def queries(self) -> int:
+        """Return the number of queries made so far."""
+        return self.database.queries
+
+    def log(self, message: str) -> None:
+        """Add a log entry."""
+        self.log_entries.append(
+            entry_number=len(self.log_entries) + 1,
+            message_type=LogMessageType.INFO,
+            message=message,
+            logged_at=datetime(2021, 1, 1),
+        )
+
+
+@pytest.fixture
+def database(monkeypatch):
+    """Return fake submissions and use them instead of the database."""
+    fake = FakeDatabase()
+    for name in (
+        "find_submission_progress",
+        "find_submission_states",
+        "find_new_log_entries",
+    ):
+        monkeypatch.setattr(submission_repository, name, getattr(fake, name))
+    return fake
+
+
+@pytest.fixture
+def submission(database):
+    """Return a fake submission."""
+    return database.add(SUBMISSION_ID)
+
+
+def messages(progress):
+    """Return the log messages of a progress update."""
+    return [le.message for le in progress.log_entries]
+
+
+@pytest.mark.asyncio
+async def test_subscribers_share_polling(submission):
+    """Subscribers of the same submission share the database queries."""
+    hub = SubmissionProgressHub(lambda: FixedIntervalPolicy(0.01), tick_interval=0.01)
+    submission.log("Started")
+    first = hub.subscribe(SUBMISSION_ID)
+    second = hub.subscribe(SUBMISSION_ID)
+
+    assert messages(await first.__anext__()) == ["Started"]
+    assert messages(await second.__anext__()) == ["Started"]
+
+    submission.log("Finished")
+    submission.status = SubmissionStatus.SUCCESSFUL
+    assert messages(await first.__anext__()) == ["Finished"]
+    assert messages(await second.__anext__()) == ["Finished"]
+
+    # two queries per poll with new log entries, and one per poll without them; no
+    # poll can have been made for the second subscriber
+    assert submission.queries <= 5
+    assert hub.watched_submissions == set()
+
+
+@pytest.mark.asyncio
+async def test_late_subscriber_gets_full_log(submission):
+    """A subscriber joining an ongoing poll receives the log entries so far."""
+    hub = SubmissionProgressHub(lambda: FixedIntervalPolicy(0.01), tick_interval=0.01)
+    submission.log("Started")
+    submission.log("Validated")
+    first = hub.subscribe(SUBMISSION_ID)
+    await first.__anext__()
+
+    second = hub.subscribe(SUBMISSION_ID)
+    progress = await second.__anext__()
+    assert messages(progress) == ["Started", "Validated"]
+    assert progress.status == SubmissionStatus.IN_PROGRESS
+
+    submission.log("Stored")
+    assert messages(await first.__anext__()) == ["Stored"]
+    assert messages(await second.__anext__()) == ["Stored"]
+
+    await first.aclose()
+    await second.aclose()
+
+
+@pytest.mark.asyncio
+async def test_long_logs_are_sent_in_chunks(submission):
+    """A long log is split into updates with a bounded number of log entries."""
+    hub = SubmissionProgressHub(lambda: FixedIntervalPolicy(10), max_log_entries=2)
+    for i in range(5):
+        submission.log(f"Entry {i + 1}")
+    submission.status = SubmissionStatus.SUCCESSFUL
+
+    updates = [messages(progress) async for progress in hub.subscribe(SUBMISSION_ID)]
+
+    assert updates == [["Entry 1", "Entry 2"], ["Entry 3", "Entry 4"], ["Entry 5"]]
+    # a status query and a log query per update
+    assert submission.queries == 6
+
+
+@pytest.mark.asyncio
+async def test_late_subscriber_gets_full_log_in_chunks(submission):
+    """The log so far is sent to a late subscriber in chunks."""
+    hub = SubmissionProgressHub(lambda: FixedIntervalPolicy(0.01), max_log_entries=2)
+    for i in range(5):
+        submission.log(f"Entry {i + 1}")
+    first = hub.subscribe(SUBMISSION_ID)
+    for _ in range(3):
+        await first.__anext__()
+
+    submission.log("Entry 6")
+    second = hub.subscribe(SUBMISSION_ID)
+    backfill = [messages(await second.__anext__()) for _ in range(3)]
+    assert backfill == [["Entry 1", "Entry 2"], ["Entry 3", "Entry 4"], ["Entry 5"]]
+    assert messages(await second.__anext__()) == ["Entry 6"]
+
+    await first.aclose()
+    await second.aclose()
+
+
+@pytest.mark.asyncio
+async def test_resumed_subscription_skips_received_entries(submission):
+    """A resuming subscriber only gets the log entries after the given entry."""
+    hub = SubmissionProgressHub(lambda: FixedIntervalPolicy(0.01), tick_interval=0.01)
+    for i in range(3):
+        submission.log(f"Entry {i + 1}")
+    subscription = hub.subscribe(SUBMISSION_ID, after_entry=2)
+
+    assert messages(await subscription.__anext__()) == ["Entry 3"]
+
+    submission.log("Entry 4")
+    submission.status = SubmissionStatus.SUCCESSFUL
+    assert messages(await subscription.__anext__()) == ["Entry 4"]
+    with pytest.raises(StopAsyncIteration):
+        await subscription.__anext__()
+
+
+@pytest.mark.asyncio
+async def test_resumed_subscription_joining_ongoing_poll(submission):
+    """A resuming subscriber joining an ongoing poll gets the entries it missed."""
+    hub = SubmissionProgressHub(lambda: FixedIntervalPolicy(0.01), tick_interval=0.01)
+    for i in range(4):
+        submission.log(f"Entry {i + 1}")
+    first = hub.subscribe(SUBMISSION_ID)
+    await first.__anext__()
+
+    behind = hub.subscribe(SUBMISSION_ID, after_entry=2)
+    assert messages(await behind.__anext__()) == ["Entry 3", "Entry 4"]
+
+    up_to_date = hub.subscribe(SUBMISSION_ID, after_entry=4)
+    progress = await up_to_date.__anext__()
+    assert messages(progress) == []
+    assert progress.status == SubmissionStatus.IN_PROGRESS
+
+    submission.log("Entry 5")
+    for subscription in (first, behind, up_to_date):
+        assert messages(await subscription.__anext__()) == ["Entry 5"]
+        await subscription.aclose()
+
+
+@pytest.mark.asyncio
+async def test_resumed_subscription_ahead_of_poll(submission):
+    """Entries received already are removed from the updates for a subscriber."""
+    hub = SubmissionProgressHub(lambda: FixedIntervalPolicy(0.01), tick_interval=0.01)
+    for i in range(3):
+        submission.log(f"Entry {i + 1}")
+    first = hub.subscribe(SUBMISSION_ID, after_entry=1)
+    ahead = hub.subscribe(SUBMISSION_ID, after_entry=2)
+
+    assert messages(await first.__anext__()) == ["Entry 2", "Entry 3"]
+    assert messages(await ahead.__anext__()) == ["Entry 3"]
+
+    await first.aclose()
+    await ahead.aclose()
+
+
+@pytest.mark.asyncio
+async def test_polling_stops_when_last_subscriber_leaves(submission):
+    """Polling stops when there are no subscribers left."""
+    hub = SubmissionProgressHub(lambda: FixedIntervalPolicy(0.01), tick_interval=0.01)
+    first = hub.subscribe(SUBMISSION_ID)
+    second = hub.subscribe(SUBMISSION_ID)
+    await first.__anext__()
+    await second.__anext__()
+
+    await first.aclose()
+    assert hub.watched_submissions == {SUBMISSION_ID}
+    await second.aclose()
+    assert hub.watched_submissions == set()
+
+    queries = submission.queries
+    await asyncio.sleep(0.05)
+    assert submission.queries == queries
+
+
+@pytest.mark.asyncio
+async def test_polling_errors_are_passed_on(database):
+    """Errors raised while polling are raised for the subscribers."""
+    hub = SubmissionProgressHub(lambda: FixedIntervalPolicy(0.01), tick_interval=0.01)
+    with pytest.raises(ValueError) as excinfo:
+        await hub.subscribe("unknown").__anext__()
+    assert "Unknown submission identifier" in str(excinfo.value)
+    assert hub.watched_submissions == set()
+
+
+@pytest.mark.asyncio
+async def test_database_errors_are_passed_on(database, monkeypatch):
+    """Errors raised by a database query are raised for all subscribers."""
+
+    async def find_submission_states(identifiers):
+        raise RuntimeError("The database is down.")
+
+    monkeypatch.setattr(
+        submission_repository, "find_submission_states", find_submission_states
+    )
+    hub = SubmissionProgressHub(lambda: FixedIntervalPolicy(0.01), tick_interval=0.01)
+    for identifier in ("a", "b"):
+        database.add(identifier)
+        with pytest.raises(RuntimeError):
+            await hub.subscribe(identifier).__anext__()
+    assert hub.watched_submissions == set()
+
+
+@pytest.mark.asyncio
+async def test_submissions_are_polled_together(database):
+    """The queries per tick don't depend on the number of submissions."""
+    hub = SubmissionProgressHub(lambda: FixedIntervalPolicy(0.01), tick_interval=0.01)
+    submissions = [database.add(f"submission-{i}") for i in range(20)]
+    for i, submission in enumerate(submissions):
+        submission.log(f"Started {i}")
+    subscriptions = [hub.subscribe(f"submission-{i}") for i in range(20)]
+
+    updates = await asyncio.gather(*(s.__anext__() for s in subscriptions))
+    assert [messages(u) for u in updates] == [[f"Started {i}"] for i in range(20)]
+    # a status query and a log query
+    assert database.queries == 2
+
+    submissions[3].log("Validated")
+    update = await subscriptions[3].__anext__()
+    assert messages(update) == ["Validated"]
+    # at most a tick without new log entries and a tick with a new log entry
+    assert database.queries <= 5
+
+    for subscription in subscriptions:
+        await subscription.aclose()
+
+
+@pytest.mark.asyncio
+async def test_log_entries_of_a_tick_are_limited(database):
+    """At most max_log_entries are read per submission and tick."""
+    hub = SubmissionProgressHub(
+        lambda: FixedIntervalPolicy(10), max_log_entries=2, tick_interval=10
+    )
+    first = database.add("first")
+    second = database.add("second")
+    first.log("First 1")
+    for i in range(3):
+        second.log(f"Second {i + 1}")
+    first.status = SubmissionStatus.SUCCESSFUL
+    second.status = SubmissionStatus.SUCCESSFUL
+
+    first_updates = hub.subscribe("first")
+    second_updates = hub.subscribe("second")
+    first_progress, second_progress = await asyncio.gather(
+        first_updates.__anext__(), second_updates.__anext__()
+    )
+    assert messages(first_progress) == ["First 1"]
+    assert messages(second_progress) == ["Second 1", "Second 2"]
+    assert second_progress.more_log_entries
+    progress = await second_updates.__anext__()
+    assert messages(progress) == ["Second 3"]
+    assert not progress.more_log_entries
+    with pytest.raises(StopAsyncIteration):
+        await second_updates.__anext__()
+    with pytest.raises(StopAsyncIteration):
+        await first_updates.__anext__()
+
+
+@pytest.mark.asyncio
+async def test_submissions_are_read_from_their_own_entry_numbers(database):
+    """A long log doesn't make the new entries of other submissions cost more."""
+    hub = SubmissionProgressHub(lambda: FixedIntervalPolicy(0.01), tick_interval=0.01)
+    short = database.add("short")
+    long = database.add("long")
+    for i in range(20000):
+        long.log(f"Entry {i + 1}")
+
+    short_updates = hub.subscribe("short")
+    long_updates = hub.subscribe("long", after_entry=20000)
+    await asyncio.gather(short_updates.__anext__(), long_updates.__anext__())
+
+    for i in range(3):
+        log_queries = database.log_queries
+        log_rows = database.log_rows
+        short.log(f"Short {i + 1}")
+        long.log(f"Long {i + 1}")
+        short_progress, long_progress = await asyncio.gather(
+            short_updates.__anext__(), long_updates.__anext__()
+        )
+        assert messages(short_progress) == [f"Short {i + 1}"]
+        assert messages(long_progress) == [f"Long {i + 1}"]
+        assert database.log_queries == log_queries + 1
+        assert database.log_rows == log_rows + 2
+
+    await short_updates.aclose()
+    await long_updates.aclose()
+
+
+def test_backoff_policy():
+    """The backoff policy backs off while idle and resets on activity."""
+    policy = BackoffPolicy(min_interval=0.5, max_interval=3)
+    assert policy.next_interval(activity=True) == 0.5
+    assert [policy.next_interval(activity=False) for _ in range(5)] == [
+        0.5,
+        1,
+        2,
+        3,
+        3,
+    ]
+    assert policy.next_interval(activity=True) == 0.5
+    assert policy.next_interval(activity=False) == 0.5
+
+
+@pytest.mark.parametrize(
+    "min_interval,max_interval,factor", [(0, 1, 2), (2, 1, 2), (0.5, 1, 0.5)]
+)
+def test_backoff_policy_rejects_invalid_arguments(min_interval, max_interval, factor):
+    """The backoff policy requires sensible bounds and backoff factor."""
+    with pytest.raises(ValueError):
+        BackoffPolicy(min_interval, max_interval, factor)
+
+
+def test_policies_must_define_the_next_interval():
+    """A policy without a next_interval method cannot be created."""
+
+    class IncompletePolicy(PollIntervalPolicy):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompletePolicy()
+
+
+@pytest.mark.asyncio
+async def test_polling_stats(submission):
+    """The hub counts its queries and those of the fixed-interval baseline."""
+    hub = SubmissionProgressHub(lambda: FixedIntervalPolicy(0.01), tick_interval=0.01)
+    first = hub.subscribe(SUBMISSION_ID)
+    second = hub.subscribe(SUBMISSION_ID)
+    await first.__anext__()
+    await second.__anext__()
+    await first.aclose()
+    await second.aclose()
+
+    stats = hub.stats()
+    assert stats.queries == submission.queries
+    assert stats.baseline_queries == 4
+    assert stats.saved_queries == 4 - submission.queries
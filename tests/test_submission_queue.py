@@ -0,0 +1,263 @@
+"""Tests for the queue of proposal submissions."""
+import asyncio
+from io import BytesIO
+
+import httpx
+import pytest
+from starlette.datastructures import UploadFile
+
+from saltapi.graphql import resolvers
+from saltapi.submission import queue as queue_module
+from saltapi.submission import submit
+from saltapi.submission.queue import (
+    SubmissionJobStatus,
+    SubmissionQueue,
+    retry_delay,
+)
+from saltapi.submission.storage import StorageServiceClient
+from saltapi.submission.submit import StorageServiceError
+from saltapi.util.error import UsageError
+from tests.test_proposal_inspection import create_zip
+from tests.test_storage import (  # noqa: F401
+    StandInStorageServer,
+    proposal,
+    service_token,
+)
+
+
+def send_to(
+    monkeypatch, server: StandInStorageServer, **client_options
+) -> StorageServiceClient:
+    """Send submissions to a stand-in storage server."""
+    storage_service = StorageServiceClient(**client_options)
+    monkeypatch.setattr(submit, "storage_service", storage_service)
+    monkeypatch.setattr(submit, "proposal_submission_url", server.url)
+    return storage_service
+
+
+async def finished(submission_queue: SubmissionQueue, tracking_id: str):
+    """Wait for a job to finish and return it."""
+    while True:
+        job = submission_queue.job(tracking_id)
+        assert job is not None
+        if job.status in (SubmissionJobStatus.SUBMITTED, SubmissionJobStatus.FAILED):
+            return job
+        await asyncio.sleep(0.005)
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("service_token")
+async def test_submissions_are_sent_in_the_background(monkeypatch):
+    """A tracking id is returned at once and the proposal is sent later."""
+    submission_queue = SubmissionQueue(workers=2)
+    async with StandInStorageServer() as server:
+        storage_service = send_to(monkeypatch, server)
+        tracking_id = await submission_queue.enqueue(proposal(), None, "someone")
+        assert server.requests == 0
+
+        job = await finished(submission_queue, tracking_id)
+        await submission_queue.stop()
+        await storage_service.close()
+
+    assert job.status == SubmissionJobStatus.SUBMITTED
+    assert job.submission_id == "abc"
+    assert job.attempts == 1
+    assert server.requests == 1
+    assert submission_queue.stats().submitted == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("service_token")
+async def test_concurrent_requests_are_limited_to_the_workers(monkeypatch):
+    """No more requests than workers are sent to the storage service at once."""
+    submission_queue = SubmissionQueue(workers=3)
+    async with StandInStorageServer() as server:
+        storage_service = send_to(monkeypatch, server)
+        tracking_ids = [
+            await submission_queue.enqueue(proposal(), None, "someone")
+            for _ in range(15)
+        ]
+        assert submission_queue.stats().queued > 0
+        jobs = [await finished(submission_queue, t) for t in tracking_ids]
+        await submission_queue.stop()
+        await storage_service.close()
+
+    assert all(job.submission_id == "abc" for job in jobs)
+    assert server.requests == 15
+    assert server.max_active_requests <= 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("service_token")
+async def test_transient_errors_are_retried(monkeypatch):
+    """A submission is sent again if the storage service is unavailable."""
+    submission_queue = SubmissionQueue(workers=1, retry_delay=0.01)
+    async with StandInStorageServer(failures=2) as server:
+        storage_service = send_to(monkeypatch, server)
+        tracking_id = await submission_queue.enqueue(proposal(), None, "someone")
+        job = await finished(submission_queue, tracking_id)
+        await submission_queue.stop()
+        await storage_service.close()
+
+    assert job.status == SubmissionJobStatus.SUBMITTED
+    assert job.attempts == 3
+    assert server.requests == 3
+    assert submission_queue.stats().retries == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("service_token")
+async def test_submissions_fail_after_the_maximum_number_of_attempts(monkeypatch):
+    """A submission fails if all attempts fail."""
+    submission_queue = SubmissionQueue(workers=1, max_attempts=2, retry_delay=0.01)
+    async with StandInStorageServer(failures=10) as server:
+        storage_service = send_to(monkeypatch, server)
+        tracking_id = await submission_queue.enqueue(proposal(), None, "someone")
+        job = await finished(submission_queue, tracking_id)
+        await submission_queue.stop()
+        await storage_service.close()
+
+    assert job.status == SubmissionJobStatus.FAILED
+    assert job.error == "The storage service is unavailable."
+    assert job.attempts == 2
+    assert server.requests == 2
+    assert submission_queue.stats().failed == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("service_token")
+async def test_submissions_are_not_sent_again_after_a_read_timeout(monkeypatch):
+    """A submission which may have reached the storage service isn't retried."""
+    submission_queue = SubmissionQueue(workers=1, retry_delay=0.01)
+    async with StandInStorageServer(stall=True) as server:
+        storage_service = send_to(
+            monkeypatch, server, timeout=httpx.Timeout(5, read=0.05)
+        )
+        tracking_id = await submission_queue.enqueue(proposal(), None, "someone")
+        job = await finished(submission_queue, tracking_id)
+        await submission_queue.stop()
+        await storage_service.close()
+
+    assert job.status == SubmissionJobStatus.FAILED
+    assert job.attempts == 1
+    assert server.requests == 1
+    assert submission_queue.stats().retries == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("service_token")
+async def test_submissions_are_sent_again_if_no_connection_is_made(monkeypatch):
+    """A submission is retried if the storage service cannot be reached."""
+    submission_queue = SubmissionQueue(workers=1, max_attempts=2, retry_delay=0.01)
+    async with StandInStorageServer() as server:
+        url = server.url
+    storage_service = StorageServiceClient()
+    monkeypatch.setattr(submit, "storage_service", storage_service)
+    monkeypatch.setattr(submit, "proposal_submission_url", url)
+    tracking_id = await submission_queue.enqueue(proposal(), None, "someone")
+    job = await finished(submission_queue, tracking_id)
+    await submission_queue.stop()
+    await storage_service.close()
+
+    assert job.status == SubmissionJobStatus.FAILED
+    assert job.attempts == 2
+    assert submission_queue.stats().retries == 1
+
+
+@pytest.mark.asyncio
+async def test_rejected_submissions_are_not_retried():
+    """A submission rejected by the storage service fails at once."""
+
+    async def reject(*args):
+        raise StorageServiceError("The proposal is invalid.")
+
+    submission_queue = SubmissionQueue(workers=1, submit=reject)
+    tracking_id = await submission_queue.enqueue(proposal(), None, "someone")
+    job = await finished(submission_queue, tracking_id)
+    await submission_queue.stop()
+
+    assert job.status == SubmissionJobStatus.FAILED
+    assert job.error == "The proposal is invalid."
+    assert job.attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_submissions():
+    """Submissions are rejected if the queue stays full."""
+    storage_service_available = asyncio.Event()
+
+    async def wait_for_storage_service(*args):
+        await storage_service_available.wait()
+        return "abc"
+
+    submission_queue = SubmissionQueue(
+        workers=1, max_size=1, enqueue_timeout=0.01, submit=wait_for_storage_service
+    )
+    # the first submission is being sent, and the second one is queued
+    first = await submission_queue.enqueue(proposal(), None, "someone")
+    await asyncio.sleep(0)
+    await submission_queue.enqueue(proposal(), None, "someone")
+
+    with pytest.raises(UsageError) as excinfo:
+        await submission_queue.enqueue(proposal(), None, "someone")
+    assert excinfo.value.status_code == 503
+
+    stats = submission_queue.stats()
+    assert stats.queued == 1
+    assert stats.sending == 1
+    assert stats.rejected == 1
+
+    storage_service_available.set()
+    assert (await finished(submission_queue, first)).submission_id == "abc"
+    await submission_queue.stop()
+    assert submission_queue.stats().submitted == 2
+
+
+@pytest.mark.asyncio
+async def test_large_proposals_are_rejected_when_spooled(monkeypatch):
+    """A proposal larger than the maximum size is not queued."""
+    monkeypatch.setattr(submit, "MAX_PROPOSAL_SIZE", 4)
+    submission_queue = SubmissionQueue(workers=1)
+    large_proposal = UploadFile(filename="proposal.zip", file=BytesIO(b"12345"))
+
+    with pytest.raises(UsageError) as excinfo:
+        await submission_queue.enqueue(large_proposal, None, "someone")
+    await submission_queue.stop()
+
+    assert excinfo.value.status_code == 413
+    assert submission_queue.stats().queued == 0
+
+
+@pytest.mark.parametrize("attempt,bound", [(1, 1), (2, 2), (3, 4), (5, 10)])
+def test_retry_delay(attempt, bound):
+    """The retry delay is jittered below an exponentially growing bound."""
+    assert retry_delay(attempt, 1, 10, rng=lambda: 0.5) == bound / 2
+    assert retry_delay(attempt, 1, 10, rng=lambda: 0) == 0
+
+
+@pytest.mark.asyncio
+async def test_submission_jobs_are_only_returned_to_their_submitter(monkeypatch):
+    """Only the submitter of a proposal can query its submission."""
+
+    async def accept(*args):
+        return "abc"
+
+    submission_queue = SubmissionQueue(workers=1, submit=accept)
+    monkeypatch.setattr(resolvers, "submission_queue", submission_queue)
+    monkeypatch.setattr(resolvers, "username", lambda info: "someone")
+    unsubmitted_proposal = UploadFile(
+        filename="proposal.zip", file=create_zip("Unsubmitted-001")
+    )
+    tracking_id = await resolvers.resolve_submit_proposal(
+        {}, {}, proposal=unsubmitted_proposal
+    )
+    await finished(submission_queue, tracking_id)
+    await submission_queue.stop()
+
+    job = resolvers.resolve_proposal_submission({}, {}, trackingId=tracking_id)
+    assert job["status"] == "SUBMITTED"
+    assert job["submissionId"] == "abc"
+
+    monkeypatch.setattr(resolvers, "username", lambda info: "someone else")
+    assert resolvers.resolve_proposal_submission({}, {}, trackingId=tracking_id) is None
+    assert queue_module.submission_queue.job(tracking_id) is None
@@ -0,0 +1,221 @@
+"""Tests for the submission repository."""
+from datetime import datetime
+
+import pytest
+import pytz
+
+from saltapi.graphql.resolvers import log_entry_dicts
+from saltapi.repository import submission_repository
+from saltapi.repository.database import database
+from saltapi.repository.submission_repository import (
+    DATABASE_TIMEZONE,
+    LogMessageType,
+    SubmissionLog,
+    SubmissionLogEntry,
+    SubmissionStatus,
+    find_new_log_entries,
+    find_submission_progress,
+    find_submission_states,
+    localize,
+)
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    """Record the queries sent to the database."""
+    monkeypatch.setattr(submission_repository, "_submission_ids", {})
+    recorded = []
+
+    async def fetch_all(query):
+        values = query.compile().params
+        query = str(query)
+        recorded.append((query, values))
+        if "s.Identifier" in query and values["identifier"] == "unknown":
+            return []
+        return [
+            (17, "In Progress", 4, "Info", "Validated", datetime(2021, 3, 4, 5, 6, 7)),
+            (17, "In Progress", 5, "Warning", "Slow", datetime(2021, 3, 4, 5, 6, 8)),
+        ]
+
+    monkeypatch.setattr(database, "fetch_all", fetch_all)
+    return recorded
+
+
+@pytest.mark.asyncio
+async def test_find_submission_progress(queries):
+    """The status and log entries are returned from a single query."""
+    progress = await find_submission_progress("abc", 3)
+
+    assert len(queries) == 1
+    assert "SubmissionLogEntryNumber > :after_entry_number" in queries[0][0]
+    assert queries[0][1]["after_entry_number"] == 3
+    assert progress.status == SubmissionStatus.IN_PROGRESS
+    assert [le.entry_number for le in progress.log_entries] == [4, 5]
+    assert progress.log_entries[1].message_type == LogMessageType.WARNING
+    assert progress.log_entries[0].logged_at.tzinfo is not None
+
+
+@pytest.mark.asyncio
+async def test_find_submission_progress_limits_log_entries(queries):
+    """At most the maximum number of log entries are returned."""
+    progress = await find_submission_progress("abc", 3, max_log_entries=1)
+
+    assert queries[0][1]["row_limit"] == 2
+    assert [le.entry_number for le in progress.log_entries] == [4]
+    assert progress.more_log_entries
+
+    progress = await find_submission_progress("abc", 3, max_log_entries=2)
+    assert len(progress.log_entries) == 2
+    assert not progress.more_log_entries
+
+
+@pytest.mark.asyncio
+async def test_find_submission_progress_caches_submission_id(queries):
+    """The database id of the submission is used once it is known."""
+    await find_submission_progress("abc", 0)
+    await find_submission_progress("abc", 5)
+
+    assert "s.Identifier = :identifier" in queries[0][0]
+    assert "s.Submission_Id = :submission_id" in queries[1][0]
+    assert queries[1][1]["submission_id"] == 17
+
+
+@pytest.mark.asyncio
+async def test_find_submission_progress_for_unknown_submission(queries):
+    """An error is raised for an unknown submission identifier."""
+    with pytest.raises(ValueError) as excinfo:
+        await find_submission_progress("unknown", 0)
+    assert "Unknown submission identifier" in str(excinfo.value)
+
+
+def record_queries(monkeypatch, rows):
+    """Record the queries sent to the database, which returns the given rows."""
+    recorded = []
+
+    async def fetch_all(query):
+        recorded.append((str(query), query.compile().params))
+        return rows
+
+    monkeypatch.setattr(database, "fetch_all", fetch_all)
+    return recorded
+
+
+@pytest.mark.asyncio
+async def test_find_submission_states(monkeypatch):
+    """The states of several submissions are read with a single query."""
+    queries = record_queries(
+        monkeypatch, [("abc", "In Progress", 5), ("def", "Successful", None)]
+    )
+
+    states = await find_submission_states(["abc", "def", "unknown"])
+
+    assert len(queries) == 1
+    assert "s.Identifier IN :identifiers" in queries[0][0]
+    assert queries[0][1]["identifiers"] == ("abc", "def", "unknown")
+    assert states["abc"].status == SubmissionStatus.IN_PROGRESS
+    assert states["abc"].last_entry_number == 5
+    assert states["def"].last_entry_number == 0
+    assert "unknown" not in states
+
+
+@pytest.mark.asyncio
+async def test_find_new_log_entries(monkeypatch):
+    """The new log entries of several submissions are read with a single query."""
+    t = datetime(2021, 3, 4, 5, 6, 7)
+    queries = record_queries(
+        monkeypatch,
+        [
+            ("abc", 3, "Info", "abc 3", t),
+            ("abc", 4, "Info", "abc 4", t),
+            ("def", 20001, "Info", "def 20001", t),
+            ("def", 20002, "Error", "def 20002", t),
+        ],
+    )
+
+    logs = await find_new_log_entries({"abc": 2, "def": 20000, "ghi": 7}, 10)
+
+    assert len(queries) == 1
+    sql, params = queries[0]
+    assert sql.count("UNION ALL") == 3
+    assert params["row_limit"] == 10
+    # every submission is read from its own entry number
+    assert [
+        (params[f"identifier_{i}"], params[f"after_entry_number_{i}"]) for i in range(4)
+    ] == [
+        ("abc", 2),
+        ("def", 20000),
+        ("ghi", 7),
+        (None, 0),
+    ]
+    assert logs["abc"].entry_numbers == [3, 4]
+    assert logs["def"].entry_numbers == [20001, 20002]
+    assert logs["def"].message_types[1] == LogMessageType.ERROR
+    assert len(logs["ghi"]) == 0
+
+
+def _log():
+    log = SubmissionLog("abc")
+    for entry_number in (4, 5, 7):
+        log.append(
+            entry_number,
+            LogMessageType.INFO,
+            f"Entry {entry_number}",
+            datetime(2021, 3, 4, 5, 6, entry_number),
+        )
+    return log
+
+
+def test_submission_log_entries():
+    """Log entries are created from the columns when they are accessed."""
+    log = _log()
+    assert len(log) == 3
+    assert log.last_entry_number == 7
+    assert log[1] == SubmissionLogEntry(
+        submission_identifier="abc",
+        entry_number=5,
+        message_type=LogMessageType.INFO,
+        message="Entry 5",
+        logged_at=DATABASE_TIMEZONE.localize(datetime(2021, 3, 4, 5, 6, 5)),
+    )
+    assert [le.entry_number for le in log] == [4, 5, 7]
+
+
+def test_submission_log_selections():
+    """Log entries can be selected by entry number."""
+    log = _log()
+    assert log.after(4).entry_numbers == [5, 7]
+    assert log.after(7).entry_numbers == []
+    assert log.up_to(5).entry_numbers == [4, 5]
+    assert log.up_to(6).messages == ["Entry 4", "Entry 5"]
+    assert log[1:].submission_identifier == "abc"
+
+
+def test_log_entry_dicts():
+    """Log entries are converted directly to GraphQL dictionaries."""
+    assert log_entry_dicts(_log().after(5)) == [
+        {
+            "messageType": "INFO",
+            "message": "Entry 7",
+            "timestamp": DATABASE_TIMEZONE.localize(datetime(2021, 3, 4, 5, 6, 7)),
+        }
+    ]
+
+
+@pytest.mark.parametrize(
+    "t",
+    [
+        datetime(2021, 3, 14, 1, 59, 59),
+        datetime(2021, 3, 14, 3, 0, 1),
+        datetime(2021, 11, 7, 0, 59, 59, 999999),
+        datetime(2021, 11, 7, 2, 0, 0),
+    ],
+)
+def test_localize_across_timezone_transitions(t, monkeypatch):
+    """Localizing agrees with pytz on either side of a daylight saving change."""
+    new_york = pytz.timezone("America/New_York")
+    monkeypatch.setattr(submission_repository, "DATABASE_TIMEZONE", new_york)
+    submission_repository._database_tzinfo.cache_clear()
+    try:
+        assert localize(t).utcoffset() == new_york.localize(t).utcoffset()
+    finally:
+        submission_repository._database_tzinfo.cache_clear()
@@ -5,16 +5,18 @@ import pytest
 from pytest_httpx import HTTPXMock
 from starlette.datastructures import UploadFile
 
-from saltapi.graphql import resolvers
-from saltapi.submission.submit import proposal_submission_url
+from saltapi.submission.submit import (
+    StorageServiceError,
+    proposal_submission_url,
+    submit_proposal,
+)
 
 
 @pytest.mark.asyncio
 async def test_submit_proposal_with_response_that_cannot_be_parsed(
-    monkeypatch, httpx_mock: HTTPXMock
+    httpx_mock: HTTPXMock,
 ):
     """Test submitting a proposal with a response that cannot be parsed."""
-    monkeypatch.setattr(resolvers, "username", lambda info: "someone")
     httpx_mock.add_response(
         url=proposal_submission_url,
         method="POST",
@@ -22,15 +24,15 @@ async def test_submit_proposal_with_response_that_cannot_be_parsed(
         data="A field is missing.",
     )
     proposal = UploadFile(filename="proposal.zip", file=BytesIO())
-    with pytest.raises(Exception) as excinfo:
-        await resolvers.resolve_submit_proposal({}, {}, proposal=proposal)
+    with pytest.raises(StorageServiceError) as excinfo:
+        await submit_proposal(proposal, None, "someone")
     assert "storage service" in str(excinfo.value)
+    assert not excinfo.value.retryable
 
 
 @pytest.mark.asyncio
-async def test_submit_proposal_with_error_response(monkeypatch, httpx_mock: HTTPXMock):
+async def test_submit_proposal_with_error_response(httpx_mock: HTTPXMock):
     """Test submitting a proposal with an error response."""
-    monkeypatch.setattr(resolvers, "username", lambda info: "someone")
     error = "The server is having a tea break"
     httpx_mock.add_response(
         url=proposal_submission_url,
@@ -38,17 +40,15 @@ async def test_submit_proposal_with_error_response(monkeypatch, httpx_mock: HTTP
         json={"error": error},
     )
     proposal = UploadFile(filename="proposal.zip", file=BytesIO())
-    with pytest.raises(Exception) as excinfo:
-        await resolvers.resolve_submit_proposal({}, {}, proposal=proposal)
+    with pytest.raises(StorageServiceError) as excinfo:
+        await submit_proposal(proposal, None, "someone")
     assert str(excinfo.value) == error
+    assert not excinfo.value.retryable
 
 
 @pytest.mark.asyncio
-async def test_submit_proposal_with_submission_id_response(
-    monkeypatch, httpx_mock: HTTPXMock
-):
+async def test_submit_proposal_with_submission_id_response(httpx_mock: HTTPXMock):
     """Test submitting a proposal with a submission id response."""
-    monkeypatch.setattr(resolvers, "username", lambda info: "someone")
     submission_id = "67a7aded-758c-4e41-a9d3-2fd45e94c108"
     httpx_mock.add_response(
         url=proposal_submission_url,
@@ -56,5 +56,22 @@ async def test_submit_proposal_with_submission_id_response(
         json={"submission_id": submission_id},
     )
     proposal = UploadFile(filename="proposal.zip", file=BytesIO())
-    return_value = await resolvers.resolve_submit_proposal({}, {}, proposal=proposal)
+    return_value = await submit_proposal(proposal, None, "someone")
     assert return_value == submission_id
+
+
+@pytest.mark.asyncio
+async def test_submit_proposal_with_unavailable_storage_service(
+    httpx_mock: HTTPXMock,
+):
+    """Test that an unavailable storage service is a transient error."""
+    httpx_mock.add_response(
+        url=proposal_submission_url,
+        method="POST",
+        status_code=503,
+        json={"error": "The storage service is down for maintenance."},
+    )
+    proposal = UploadFile(filename="proposal.zip", file=BytesIO())
+    with pytest.raises(StorageServiceError) as excinfo:
+        await submit_proposal(proposal, None, "someone")
+    assert excinfo.value.retryable
@@ -0,0 +1,184 @@
+"""Tests for creating and parsing authentication tokens."""
+import asyncio
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from saltapi.auth import token as token_module
+from saltapi.auth.keys import KeyFile
+from saltapi.auth.token import (
+    ServiceTokenProvider,
+    create_token,
+    parse_token,
+    token_cache,
+)
+from saltapi.repository.user_repository import User
+from saltapi.util.error import UsageError
+
+USER = User(
+    id=42,
+    username="jane",
+    first_name="Jane",
+    last_name="Doe",
+    email="jane@example.com",
+    roles=["Admin"],
+    permissions=[],
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_token_cache():
+    """Make sure that no tokens are cached."""
+    token_cache.clear()
+
+
+def count_decode_calls(monkeypatch):
+    """Count the calls to jwt.decode."""
+    calls = {"count": 0}
+    decode = jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        calls["count"] += 1
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(jwt, "decode", counting_decode)
+    return calls
+
+
+def test_parsed_tokens_are_cached(monkeypatch):
+    """The signature of a token is only verified when it is first parsed."""
+    calls = count_decode_calls(monkeypatch)
+    token = create_token(USER)
+    for _ in range(3):
+        payload = parse_token(token)
+        assert payload.user_id == USER.id
+        assert payload.roles == USER.roles
+    assert calls["count"] == 1
+
+
+def test_invalid_tokens_are_not_cached(monkeypatch):
+    """Invalid tokens are rejected every time they are parsed."""
+    calls = count_decode_calls(monkeypatch)
+    for _ in range(2):
+        with pytest.raises(UsageError):
+            parse_token("abcd")
+    assert calls["count"] == 2
+    assert len(token_cache) == 0
+
+
+def test_expired_tokens_are_not_served_from_the_cache(monkeypatch):
+    """A cached token is rejected once it has expired."""
+    token = create_token(USER, expiry=60)
+    assert parse_token(token).user_id == USER.id
+
+    later = time.time() + 61
+    monkeypatch.setattr(token_module, "time", lambda: later)
+    with pytest.raises(UsageError) as excinfo:
+        parse_token(token)
+    assert "expired" in str(excinfo.value)
+    assert len(token_cache) == 0
+
+
+def test_cache_keys_include_the_algorithm():
+    """A token cached for one algorithm isn't used for another algorithm."""
+    token = create_token(USER)
+    parse_token(token)
+    with pytest.raises(UsageError):
+        parse_token(token, algorithm="RS256")
+
+
+def test_cached_tokens_are_rejected_after_a_key_change(tmp_path, monkeypatch):
+    """A token cached for a public key isn't accepted once the key is replaced."""
+
+    def generate_private_key():
+        return rsa.generate_private_key(
+            public_exponent=65537, key_size=2048, backend=default_backend()
+        )
+
+    def public_key_pem(private_key):
+        return private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+
+    private_key = generate_private_key()
+    path = tmp_path / "rs256_key.pub"
+    path.write_bytes(public_key_pem(private_key))
+    monkeypatch.setenv("TEST_PUBLIC_KEY_FILE", str(path))
+    public_key = KeyFile(
+        "TEST_PUBLIC_KEY_FILE",
+        lambda pem: serialization.load_pem_public_key(pem, backend=default_backend()),
+    )
+    monkeypatch.setattr(token_module, "rs256_public_key", public_key)
+    token = jwt.encode({"user_id": USER.id}, private_key, algorithm="RS256").decode(
+        "utf-8"
+    )
+    assert parse_token(token, algorithm="RS256").user_id == USER.id
+
+    path.write_bytes(public_key_pem(generate_private_key()))
+    public_key.reload()
+    with pytest.raises(UsageError):
+        parse_token(token, algorithm="RS256")
+
+
+class Clock:
+    """A clock which only moves when told to."""
+
+    def __init__(self) -> None:
+        self.now = time.time()
+
+    def __call__(self) -> float:
+        """Return the current time."""
+        return self.now
+
+
+def count_create_token_calls(monkeypatch):
+    """Count the calls to create_token."""
+    calls = {"count": 0}
+
+    def counting_create_token(*args, **kwargs):
+        calls["count"] += 1
+        return create_token(*args, **kwargs)
+
+    monkeypatch.setattr(token_module, "create_token", counting_create_token)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_service_tokens_are_reused(monkeypatch):
+    """A service token is reused until shortly before it expires."""
+    calls = count_create_token_calls(monkeypatch)
+    clock = Clock()
+    provider = ServiceTokenProvider(
+        USER, lifetime=300, refresh_margin=60, algorithm="HS256", clock=clock
+    )
+
+    token = await provider.token()
+    assert parse_token(token).user_id == USER.id
+    clock.now += 239
+    assert await provider.token() == token
+    assert calls["count"] == 1
+
+    clock.now += 1
+    await provider.token()
+    assert calls["count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_a_service_token(monkeypatch):
+    """Concurrent requests for a new service token share a single token."""
+    calls = count_create_token_calls(monkeypatch)
+    provider = ServiceTokenProvider(USER, algorithm="HS256")
+    tokens = await asyncio.gather(*(provider.token() for _ in range(5)))
+    assert len(set(tokens)) == 1
+    assert calls["count"] == 1
+
+
+def test_refresh_margin_must_be_less_than_lifetime():
+    """A service token must not need refreshing as soon as it is created."""
+    with pytest.raises(ValueError):
+        ServiceTokenProvider(USER, lifetime=60, refresh_margin=60)